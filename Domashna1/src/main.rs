@@ -1,6 +1,6 @@
 use chrono::{Local, NaiveDate};
 use mongodb::{
-    bson::{doc, to_bson, Document},
+    bson::{doc, to_bson, DateTime, Document},
     options::ClientOptions,
     Client as MongoClient,
 };
@@ -32,21 +32,38 @@ async fn main() -> Result<(), Box<dyn std::error::Error>> {
     let mongo_client = connect_to_mongodb(&mongo_uri).await?;
     let db = mongo_client.database("stock_data");
     let collection = db.collection::<Document>("stock_records");
+    let bars = db.collection::<Document>("stock_bars");
+    let catalog = db.collection::<Document>("stock_catalog");
 
     let sellers = get_sellers(&client).await?;
 
     for seller in &sellers {
         if let Ok(Some(_)) = collection.find_one(doc! { "_id": seller }, None).await {
-            if let Err(e) = update_seller_data(seller, &client, &collection).await {
+            if let Err(e) = update_seller_data(seller, &client, &collection, &bars, &catalog).await {
                 eprintln!("Error updating {}: {}", seller, e);
             }
         } else {
             if let Ok((_, data)) = scrape_seller_data(seller.clone(), &client).await {
-                save_to_mongodb(&collection, seller, &data).await?;
+                if let Err(e) = save_new_seller(seller, &data, &collection, &bars, &catalog).await {
+                    eprintln!("Error saving {}: {}", seller, e);
+                }
             }
         }
     }
 
+    // the API caches responses per ticker version, tell it to drop them right away
+    let api_url = env::var("API_URL").unwrap_or_else(|_| "http://localhost:8000".to_string());
+    let token = env::var("CACHE_TOKEN").unwrap_or_default();
+    if let Err(e) = client
+        .post(format!("{}/cache/invalidate", api_url))
+        .header("X-Cache-Token", token)
+        .send()
+        .await
+        .and_then(|response| response.error_for_status())
+    {
+        eprintln!("Error invalidating the API cache: {}", e);
+    }
+
     println!(
         "It took {:.3} seconds to scrape the data",
         start.elapsed().as_secs_f64()
@@ -85,6 +102,97 @@ async fn save_to_mongodb(
     Ok(())
 }
 
+// rejects malformed numbers like Data/parser.py does, instead of storing them as 0
+fn parse_number(value: &str) -> Result<f64, Box<dyn std::error::Error>> {
+    let number = value
+        .trim_end_matches(" ден.")
+        .replace('.', "")
+        .replace(',', ".")
+        .parse()
+        .map_err(|_| format!("Malformed MSE number: {:?}", value))?;
+    Ok(number)
+}
+
+fn to_bar(seller: &str, data: &StockData) -> Result<Document, Box<dyn std::error::Error>> {
+    let date = NaiveDate::parse_from_str(&data.date, "%d.%m.%Y")?;
+    let millis = date.and_hms_opt(0, 0, 0).unwrap().and_utc().timestamp_millis();
+    Ok(doc! {
+        "ticker": seller,
+        "date": DateTime::from_millis(millis),
+        "last_transaction": parse_number(&data.last_transaction)?,
+        "max_value": parse_number(&data.max_value)?,
+        "min_value": parse_number(&data.min_value)?,
+        "average": parse_number(&data.average)?,
+        "change": parse_number(&data.change)?,
+        "volume": parse_number(&data.volume)? as i64,
+        "best_sales": parse_number(&data.best_sales)?,
+        "all_sales": parse_number(&data.all_sales)?,
+    })
+}
+
+fn to_bars(seller: &str, data: &[StockData]) -> Result<Vec<Document>, Box<dyn std::error::Error>> {
+    data.iter().map(|item| to_bar(seller, item)).collect()
+}
+
+// stock_bars is the time-series layout, one numeric record per bar
+async fn insert_bars(
+    bars: &mongodb::Collection<Document>,
+    docs: Vec<Document>,
+) -> Result<(), Box<dyn std::error::Error>> {
+    if docs.is_empty() {
+        return Ok(());
+    }
+    bars.insert_many(docs, None).await?;
+    Ok(())
+}
+
+async fn replace_bars(
+    bars: &mongodb::Collection<Document>,
+    seller: &str,
+    docs: Vec<Document>,
+) -> Result<(), Box<dyn std::error::Error>> {
+    bars.delete_many(doc! { "ticker": seller }, None).await?;
+    insert_bars(bars, docs).await
+}
+
+async fn save_new_seller(
+    seller: &str,
+    data: &[StockData],
+    collection: &mongodb::Collection<Document>,
+    bars: &mongodb::Collection<Document>,
+    catalog: &mongodb::Collection<Document>,
+) -> Result<(), Box<dyn std::error::Error>> {
+    // converted before any write, so a malformed number leaves the seller as it was
+    let docs = to_bars(seller, data)?;
+    save_to_mongodb(collection, seller, data).await?;
+    replace_bars(bars, seller, docs).await?;
+    update_catalog(catalog, seller, data).await
+}
+
+// stock_catalog holds one small summary per ticker, so listing them does not read the histories
+async fn update_catalog(
+    catalog: &mongodb::Collection<Document>,
+    seller: &str,
+    data: &[StockData],
+) -> Result<(), Box<dyn std::error::Error>> {
+    let mut summary = doc! { "bars": data.len() as i64 };
+    if let Some(latest) = data.first() {
+        let bar = to_bar(seller, latest)?;
+        summary.insert("last_date", *bar.get_datetime("date")?);
+        summary.insert("last_price", bar.get_f64("last_transaction")?);
+    }
+
+    catalog
+        .update_one(
+            doc! { "_id": seller },
+            doc! { "$set": summary, "$setOnInsert": { "has_fundamentals": false } },
+            mongodb::options::UpdateOptions::builder().upsert(true).build(),
+        )
+        .await?;
+
+    Ok(())
+}
+
 async fn get_last_date(
     collection: &mongodb::Collection<Document>,
     seller: &str,
@@ -105,13 +213,14 @@ async fn update_seller_data(
     seller: &str,
     client: &Client,
     collection: &mongodb::Collection<Document>,
+    bars: &mongodb::Collection<Document>,
+    catalog: &mongodb::Collection<Document>,
 ) -> Result<(), Box<dyn std::error::Error>> {
     let last_date = match get_last_date(collection, seller).await? {
         Some(date) => date,
         None => {
             let (_, new_data) = scrape_seller_data(seller.to_string(), client).await?;
-            save_to_mongodb(collection, seller, &new_data).await?;
-            return Ok(());
+            return save_new_seller(seller, &new_data, collection, bars, catalog).await;
         }
     };
 
@@ -130,7 +239,18 @@ async fn update_seller_data(
         }
     }
 
+    // the first page starts on last_date itself once it is today, keep only the days not stored yet
+    new_data.retain(|item| {
+        NaiveDate::parse_from_str(&item.date, "%d.%m.%Y").map_or(false, |date| date > last_date)
+    });
+
     if !new_data.is_empty() {
+        let docs = to_bars(seller, &new_data)?;
+        // tickers not migrated to stock_bars yet get their full history from the migration
+        if bars.find_one(doc! { "ticker": seller }, None).await?.is_some() {
+            insert_bars(bars, docs).await?;
+        }
+
         let existing_doc = collection.find_one(doc! { "_id": seller }, None).await?;
         if let Some(doc) = existing_doc {
             if let Ok(mut existing_data) = doc.get_array("data").map(|arr| {
@@ -149,6 +269,7 @@ async fn update_seller_data(
         }
         
         save_to_mongodb(collection, seller, &new_data).await?;
+        update_catalog(catalog, seller, &new_data).await?;
     }
 
     Ok(())
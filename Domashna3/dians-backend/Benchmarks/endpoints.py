@@ -0,0 +1,57 @@
+import time
+import numpy as np
+from fastapi.testclient import TestClient
+from Benchmarks.stand_in import load_app
+
+# Latency and throughput of the API on the stand-in collections. "cold" runs drop
+# the response cache before every request so each one is computed, "warm" runs
+# serve repeat requests as a returning visitor would get them. Date ranges are
+# left out, mongomock does not implement the $substrBytes they filter with.
+
+
+def endpoints(stock_ids):
+    """The benchmarked requests as {name: [urls]}, one url per ticker."""
+    return {
+        "stocks": ["/stocks"],
+        "catalog": ["/catalog?prefix=B"],
+        "stock_data": [f"/stocks/{stock_id}" for stock_id in stock_ids],
+        "chart": [f"/stocks/{stock_id}/chart" for stock_id in stock_ids],
+        "chart_lttb_msgpack": [f"/stocks/{stock_id}/chart?max_points=500&format=msgpack" for stock_id in stock_ids],
+        "technical_analysis": [f"/technical_analysis/{stock_id}" for stock_id in stock_ids],
+        "technical_analysis_series": [f"/technical_analysis/{stock_id}/series" for stock_id in stock_ids],
+        "screener": ["/screener"],
+        "forecast_ar": [f"/lstm_predict/{stock_id}?budget_ms=10" for stock_id in stock_ids],
+    }
+
+
+def run_requests(client, main, urls, requests, cold):
+    """Latencies in seconds of requests GETs cycling over urls."""
+    latencies = []
+    for i in range(requests):
+        if cold:
+            main.response_cache.invalidate()
+            main.price_cache.invalidate()
+        start = time.perf_counter()
+        response = client.get(urls[i % len(urls)])
+        latencies.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            raise RuntimeError(f"{urls[i % len(urls)]} returned {response.status_code}")
+    return np.array(latencies)
+
+
+def run_endpoints(tickers=20, bars=2500, requests=50):
+    main, stock_ids = load_app(tickers, bars)
+    results = dict()
+    with TestClient(main.app) as client:
+        for name, urls in endpoints(stock_ids).items():
+            for mode in ["cold", "warm"]:
+                latencies = run_requests(client, main, urls, requests, mode == "cold")
+                key = f"endpoint.{name}.{mode}"
+                results[f"{key}.p50"] = float(np.percentile(latencies, 50))
+                results[f"{key}.p95"] = float(np.percentile(latencies, 95))
+                results[f"{key}.p99"] = float(np.percentile(latencies, 99))
+                print(f"{key}: p50 {results[f'{key}.p50'] * 1000:.2f}ms, "
+                      f"p95 {results[f'{key}.p95'] * 1000:.2f}ms, "
+                      f"p99 {results[f'{key}.p99'] * 1000:.2f}ms, "
+                      f"{len(latencies) / latencies.sum():.0f} req/s")
+    return results
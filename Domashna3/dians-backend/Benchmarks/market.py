@@ -0,0 +1,87 @@
+from datetime import date, timedelta
+import numpy as np
+
+# Synthetic stock_records and stock_fundamental documents in the format the
+# scrapers store: newest first, dd.mm.yyyy dates, prices like "1.234,00 ден."
+# and volumes like "1.234". The prices follow a random walk with drift and
+# volatility drawn per ticker, so indicators see trends, ranges and flat days.
+
+FILING_SENTENCES = [
+    "Нето добивката на друштвото во првиот квартал се зголеми во споредба со истиот период минатата година.",
+    "Приходите од продажба бележат пад поради намалената побарувачка на странските пазари.",
+    "Управниот одбор предлага исплата на дивиденда на акционерите.",
+    "Собранието на акционери ќе се одржи во седиштето на друштвото.",
+    "Трошоците за енергија ја намалија профитабилноста на производството.",
+]
+
+
+def format_number(value, decimals=True):
+    """An MSE number string, '.' between thousands and ',' before the decimals."""
+    text = f"{value:,.2f}" if decimals else f"{int(value):,}"
+    return text.replace(",", " ").replace(".", ",").replace(" ", ".")
+
+
+def format_price(value):
+    return f"{format_number(value)} ден."
+
+
+def generate_history(bars, seed=0, last_date=date(2024, 12, 31)):
+    """The data array of one ticker with bars trading days, newest first."""
+    rng = np.random.default_rng(seed)
+    drift = rng.normal(0, 0.0005)
+    volatility = rng.uniform(0.005, 0.03)
+    returns = rng.normal(drift, volatility, bars)
+    # some days nothing trades and the price stays
+    returns[rng.random(bars) < 0.1] = 0
+    closes = np.round(rng.uniform(100, 30000) * np.exp(np.cumsum(returns)))
+    spread = np.abs(rng.normal(0, volatility, (2, bars))) * closes
+    highs = closes + np.round(spread[0])
+    lows = np.maximum(closes - np.round(spread[1]), 1)
+    volumes = rng.poisson(rng.uniform(10, 2000), bars) * (returns != 0)
+
+    days = []
+    day = last_date
+    while len(days) < bars:
+        if day.weekday() < 5:
+            days.append(day)
+        day -= timedelta(days=1)
+    days.reverse()
+
+    data = []
+    for i in range(bars):
+        change = 0 if i == 0 else (closes[i] - closes[i - 1]) / closes[i - 1] * 100
+        data.append({
+            "date": days[i].strftime("%d.%m.%Y"),
+            "last_transaction": format_price(closes[i]),
+            "max_value": format_price(highs[i]),
+            "min_value": format_price(lows[i]),
+            "average": format_price(round((highs[i] + lows[i]) / 2)),
+            "change": format_number(abs(change)) if change >= 0 else f"-{format_number(-change)}",
+            "volume": format_number(volumes[i], decimals=False),
+            "best_sales": format_price(closes[i] * volumes[i]),
+            "all_sales": format_price(closes[i] * volumes[i]),
+        })
+    return data[::-1]
+
+
+def ticker_name(i):
+    letters = ""
+    i += 26 ** 3
+    while i:
+        i, letter = divmod(i, 26)
+        letters = chr(ord("A") + letter) + letters
+    return letters
+
+
+def generate_market(tickers=20, bars=2500, seed=0):
+    """stock_records documents of tickers tickers with bars bars each."""
+    return [{"_id": ticker_name(i), "data": generate_history(bars, seed + i)}
+            for i in range(tickers)]
+
+
+def generate_filings(stock_ids, sentences=40, seed=0):
+    """stock_fundamental documents with a filing of the given number of sentences per ticker."""
+    rng = np.random.default_rng(seed)
+    return [{"_id": stock_id, "document_id": str(i),
+             "file": " ".join(rng.choice(FILING_SENTENCES, sentences))}
+            for i, stock_id in enumerate(stock_ids)]
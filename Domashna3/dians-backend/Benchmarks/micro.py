@@ -0,0 +1,91 @@
+import statistics
+import time
+import numpy as np
+from Benchmarks.market import generate_history
+from Data.chart import downsample, encode_arrow, encode_msgpack
+from Data.parser import PRICE_FIELDS, parse_columns
+from LSTM.lstm_predictor import predictor
+from Technical import tech_analysis as ta
+from Technical.indicator_series import indicator_series, float_columns, series_results
+from Technical.indicator_state import IndicatorState
+from Technical.screener import screener
+
+WINDOW = 30
+
+
+def measure(function, repeat=5, min_time=0.05):
+    """Median seconds per call of function over repeat rounds of at least min_time each."""
+    function()
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        if time.perf_counter() - start >= min_time or number >= 1 << 20:
+            break
+        number *= 2
+    rounds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        rounds.append((time.perf_counter() - start) / number)
+    return statistics.median(rounds)
+
+
+def benchmarks(bars=2500, tickers=20, lstm=False):
+    """The micro-benchmarks as {name: function}, over one synthetic history of bars bars."""
+    data = generate_history(bars, seed=1)
+    parsed = ta.parse_data(data)
+    columns = parse_columns(data)
+    newest_first = {part: columns[part][::-1] for part in PRICE_FIELDS}
+    last = np.array([x["last_transaction"] for x in parsed])
+    window_data = parsed[:WINDOW]
+    window_last = last[:WINDOW]
+    floats = float_columns(columns)
+    market = [(f"T{i}", parse_columns(generate_history(WINDOW, seed=i))) for i in range(tickers)]
+    chart = {"date": columns["date"], "last_transaction": columns["last_transaction"]}
+
+    def state_update():
+        IndicatorState("T", [2, 7, WINDOW]).update(columns)
+
+    cases = {
+        "parse_columns": lambda: parse_columns(data),
+        "parse_data": lambda: ta.parse_data(data),
+        "rsi": lambda: ta.calculate_relative_strength_index(window_last, WINDOW),
+        "momentum": lambda: ta.calculate_momentum(window_last, WINDOW),
+        "williams_percent_range": lambda: ta.calculate_williams_percent_range(window_last, WINDOW),
+        "stochastic_oscillator": lambda: ta.calculate_stochastic_oscillator(window_last, WINDOW),
+        "ultimate_oscillator": lambda: ta.calculate_ultimate_oscillator(window_data),
+        "sma": lambda: ta.calculate_sma(window_last, 10),
+        "ema": lambda: ta.calculate_ema(window_last, 10),
+        "hull_moving_average": lambda: ta.hull_moving_average(window_last, 9),
+        "volume_weighted_moving_average": lambda: ta.volume_weighted_moving_average(window_data, WINDOW),
+        "ichimoku_base_line": lambda: ta.ichimoku_base_line(window_data, WINDOW),
+        "tech_results": lambda: ta.tech_results(data[:WINDOW], WINDOW),
+        "multi_window_columns": lambda: ta.multi_window_columns(newest_first, [2, 7, WINDOW]),
+        "indicator_series": lambda: indicator_series(floats, WINDOW),
+        "series_results": lambda: series_results(columns, WINDOW),
+        "screener": lambda: screener(market, WINDOW),
+        "indicator_state_update": state_update,
+        "lttb_1000": lambda: downsample(chart, 1000),
+        "encode_msgpack": lambda: encode_msgpack(chart),
+        "encode_arrow": lambda: encode_arrow(chart),
+        "predictor_last_price": lambda: predictor(columns, model="last_price"),
+        "predictor_ar": lambda: predictor(columns, model="ar"),
+    }
+    if lstm:
+        # trains a model from scratch, since no ticker is given
+        cases["predictor_lstm"] = lambda: predictor(columns, model="lstm")
+    return cases
+
+
+def run_micro(bars=2500, tickers=20, lstm=False, repeat=5):
+    results = dict()
+    for name, function in benchmarks(bars, tickers, lstm).items():
+        if name == "predictor_lstm":
+            results[f"micro.{name}"] = measure(function, repeat=1, min_time=0)
+        else:
+            results[f"micro.{name}"] = measure(function, repeat)
+        print(f"micro.{name}: {results[f'micro.{name}'] * 1e6:.1f}us")
+    return results
@@ -0,0 +1,76 @@
+import argparse
+import json
+import os
+import platform
+import sys
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+THRESHOLD = 0.25
+
+
+def compare(results, baseline, threshold=THRESHOLD):
+    """
+    The benchmarks that got more than threshold slower than the baseline, as
+    (name, baseline, current) tuples. The tail latencies of a few dozen
+    requests are too noisy to gate on, so only medians are compared.
+    """
+    regressions = []
+    for name, current in results.items():
+        if name.endswith((".p95", ".p99")) or name not in baseline:
+            continue
+        if current > baseline[name] * (1 + threshold):
+            regressions.append((name, baseline[name], current))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the indicators, parsing, forecasting and API on a synthetic market.")
+    parser.add_argument("--only", choices=["micro", "endpoints"],
+                        help="run only one of the suites")
+    parser.add_argument("--tickers", type=int, default=20,
+                        help="tickers in the synthetic market")
+    parser.add_argument("--bars", type=int, default=2500,
+                        help="bars of history per ticker")
+    parser.add_argument("--requests", type=int, default=50,
+                        help="requests per endpoint and mode")
+    parser.add_argument("--lstm", action="store_true",
+                        help="also time training and forecasting an LSTM, which takes a while")
+    parser.add_argument("--baseline", default=BASELINE,
+                        help="baseline file to compare with or save to")
+    parser.add_argument("--save", action="store_true",
+                        help="save the results as the new baseline instead of comparing")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help="fail when a benchmark is this much slower than the baseline, 0.25 for 25%%")
+    args = parser.parse_args()
+
+    results = dict()
+    if args.only != "endpoints":
+        from Benchmarks.micro import run_micro
+        results.update(run_micro(args.bars, args.tickers, args.lstm))
+    if args.only != "micro":
+        from Benchmarks.endpoints import run_endpoints
+        results.update(run_endpoints(args.tickers, args.bars, args.requests))
+
+    if args.save:
+        with open(args.baseline, "w") as f:
+            json.dump({"machine": platform.platform(), "tickers": args.tickers,
+                       "bars": args.bars, "results": results}, f, indent=2)
+        print(f"Saved {len(results)} results to {args.baseline}")
+        sys.exit(0)
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}, save one with --save")
+        sys.exit(0)
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if (baseline["tickers"], baseline["bars"]) != (args.tickers, args.bars):
+        print("The baseline was measured on a different market size, the results do not compare")
+        sys.exit(2)
+
+    regressions = compare(results, baseline["results"], args.threshold)
+    for name, before, after in regressions:
+        print(f"REGRESSION {name}: {before * 1000:.3f}ms -> {after * 1000:.3f}ms "
+              f"({after / before - 1:+.0%})")
+    print(f"{len(regressions)} of {len(results)} benchmarks regressed more than {args.threshold:.0%}")
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,43 @@
+import asyncio
+import mongomock
+import mongomock_motor
+import motor.motor_asyncio
+import pymongo
+from Benchmarks.market import generate_filings, generate_market
+
+# The API against in-memory mongomock collections filled with a synthetic market,
+# so the endpoints can be benchmarked without a MongoDB server. The clients are
+# replaced before main is imported, since it connects at import time.
+
+
+def install():
+    """Make every MongoClient and AsyncIOMotorClient created from now on an in-memory one."""
+    pymongo.MongoClient = mongomock.MongoClient
+    motor.motor_asyncio.AsyncIOMotorClient = mongomock_motor.AsyncMongoMockClient
+
+
+def load_app(tickers=20, bars=2500, seed=0):
+    """
+    Import the API on the stand-in collections and fill stock_records,
+    stock_fundamental and stock_catalog. The sentiment models are not loaded,
+    so the fundamental analysis is left out of the benchmarks.
+    """
+    install()
+    import main
+    from Data.catalog import CATALOG_COLLECTION, catalog_entry
+
+    main.sentiment_service.start = lambda: None
+    main.sentiment_service.stop = lambda: None
+
+    market = generate_market(tickers, bars, seed)
+    db = main.client["stock_data"]
+
+    async def fill():
+        await db["stock_records"].insert_many(market)
+        await db[CATALOG_COLLECTION].insert_many(
+            [catalog_entry(stock["_id"], stock["data"][0], len(stock["data"]), True) for stock in market])
+
+    asyncio.run(fill())
+    main.fundamental_collection.insert_many(
+        generate_filings([stock["_id"] for stock in market], seed=seed))
+    return main, [stock["_id"] for stock in market]
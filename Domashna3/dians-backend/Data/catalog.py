@@ -0,0 +1,115 @@
+import argparse
+import asyncio
+import bisect
+import os
+import time
+from datetime import datetime
+from pymongo import MongoClient, ReplaceOne
+from Data.parser import parse_decimals
+
+# stock_catalog holds one small document per ticker: its last date and price,
+# bar count and whether a filing was scraped for it. The Rust scraper updates it
+# with every write to stock_records and the filings scraper sets
+# has_fundamentals, so listing the tickers never reads their histories.
+
+MONGO_URI = os.environ.get("MONGODB_URI", "mongodb://localhost:27017")
+CATALOG_COLLECTION = "stock_catalog"
+CATALOG_TTL = float(os.environ.get("CATALOG_TTL", 60))
+
+
+def catalog_entry(stock_id, latest, bars, has_fundamentals=False):
+    """The catalog document of a ticker from its newest MSE bar and bar count."""
+    entry = {"_id": stock_id, "bars": bars, "has_fundamentals": has_fundamentals}
+    if latest is not None:
+        entry["last_date"] = datetime.strptime(latest["date"], "%d.%m.%Y")
+        entry["last_price"] = float(parse_decimals([latest["last_transaction"]])[0])
+    return entry
+
+
+def rebuild_catalog(db):
+    """Recreate the catalog of every ticker in stock_records, returning how many there are."""
+    fundamentals = set(db["stock_fundamental"].distinct("_id", {"file": {"$exists": True}}))
+    stocks = db["stock_records"].aggregate([
+        {"$project": {"bars": {"$size": "$data"},
+                      "latest": {"$arrayElemAt": ["$data", 0]}}},
+    ])
+    operations = [ReplaceOne({"_id": stock["_id"]},
+                             catalog_entry(stock["_id"], stock.get("latest"), stock["bars"],
+                                           stock["_id"] in fundamentals),
+                             upsert=True)
+                  for stock in stocks]
+    if operations:
+        db[CATALOG_COLLECTION].bulk_write(operations, ordered=False)
+    return len(operations)
+
+
+def mark_fundamentals(db, stock_ids):
+    db[CATALOG_COLLECTION].update_many({"_id": {"$in": list(stock_ids)}},
+                                       {"$set": {"has_fundamentals": True}})
+
+
+class StockCatalog:
+    """
+    Serves the catalog from memory, reloading it once it is older than ttl
+    seconds, and finds tickers by prefix with a binary search over the sorted
+    ids. Until the catalog is built the ids come from the repository.
+    """
+
+    def __init__(self, collection, repository, ttl=CATALOG_TTL):
+        self.collection = collection
+        self.repository = repository
+        self.ttl = ttl
+        self._ids = []
+        self._entries = []
+        self._loaded_at = None
+        self._lock = asyncio.Lock()
+
+    async def _load(self):
+        async with self._lock:
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl:
+                return
+            entries = []
+            async for entry in self.collection.find().sort("_id", 1):
+                last_date = entry.get("last_date")
+                entries.append({
+                    "stock_id": entry["_id"],
+                    "last_date": last_date.strftime("%d.%m.%Y") if last_date else None,
+                    "last_price": entry.get("last_price"),
+                    "bars": entry.get("bars", 0),
+                    "has_fundamentals": entry.get("has_fundamentals", False),
+                })
+            if not entries:
+                entries = [{"stock_id": stock_id} for stock_id in sorted(await self.repository.stock_ids())]
+            self._entries = entries
+            self._ids = [entry["stock_id"] for entry in entries]
+            self._loaded_at = time.monotonic()
+
+    def _range(self, prefix):
+        if not prefix:
+            return 0, len(self._ids)
+        start = bisect.bisect_left(self._ids, prefix)
+        return start, bisect.bisect_left(self._ids, prefix + "\uffff", start)
+
+    async def entries(self, prefix=None):
+        """The catalog entries of the tickers that start with prefix, sorted by ticker."""
+        await self._load()
+        start, end = self._range(prefix)
+        return self._entries[start:end]
+
+    async def stock_ids(self, prefix=None):
+        await self._load()
+        start, end = self._range(prefix)
+        return self._ids[start:end]
+
+    def invalidate(self):
+        self._loaded_at = None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Rebuild stock_catalog from stock_records and stock_fundamental.")
+    parser.parse_args()
+
+    client = MongoClient(MONGO_URI)
+    print(f"{rebuild_catalog(client['stock_data'])} tickers")
+    client.close()
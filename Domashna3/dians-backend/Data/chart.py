@@ -0,0 +1,76 @@
+import io
+import msgpack
+import numpy as np
+import pyarrow as pa
+
+# Chart payloads: the date and price columns of a ticker, optionally reduced to
+# the points a chart can show, as JSON lists or as typed columnar binaries.
+
+FORMATS = {
+    "json": "application/json",
+    "msgpack": "application/msgpack",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+
+def lttb(x, y, max_points):
+    """
+    Indices of the max_points that Largest-Triangle-Three-Buckets keeps of a
+    series. The first and last points stay, and every bucket in between keeps
+    the point spanning the largest triangle with the point kept before it and
+    the mean of the next bucket.
+    """
+    n = len(x)
+    if max_points >= n or max_points < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # bucket i holds the points edges[i]:edges[i + 1], the first and last are left out
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    sum_x = np.concatenate([[0.0], np.cumsum(x)])
+    sum_y = np.concatenate([[0.0], np.cumsum(y)])
+
+    indices = np.empty(max_points, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    kept = 0
+    for i in range(max_points - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_start, next_end = end, edges[i + 2]
+            next_x = (sum_x[next_end] - sum_x[next_start]) / (next_end - next_start)
+            next_y = (sum_y[next_end] - sum_y[next_start]) / (next_end - next_start)
+        else:
+            next_x, next_y = x[-1], y[-1]
+        areas = np.abs((x[kept] - next_x) * (y[start:end] - y[kept])
+                       - (x[kept] - x[start:end]) * (next_y - y[kept]))
+        kept = start + int(np.argmax(areas))
+        indices[i + 1] = kept
+    return indices
+
+
+def downsample(columns, max_points):
+    """The chart columns reduced to at most max_points with LTTB on the last price."""
+    indices = lttb(columns["date"].astype(np.int64), columns["last_transaction"], max_points)
+    return {part: column[indices] for part, column in columns.items()}
+
+
+def encode_msgpack(columns):
+    """MessagePack of the raw little-endian columns, days since 1970 as int32 and prices as int64."""
+    return msgpack.packb({
+        "date": {"type": "int32", "unit": "days",
+                 "data": columns["date"].astype("<i4").tobytes()},
+        "last_transaction": {"type": "int64",
+                             "data": columns["last_transaction"].astype("<i8").tobytes()},
+    })
+
+
+def encode_arrow(columns):
+    """An Arrow IPC stream with a date32 and an int64 column."""
+    table = pa.table({
+        "date": pa.array(columns["date"].astype("<i4"), pa.int32()).cast(pa.date32()),
+        "last_transaction": pa.array(columns["last_transaction"], pa.int64()),
+    })
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
@@ -0,0 +1,61 @@
+import argparse
+import os
+from pymongo import ASCENDING, DESCENDING, MongoClient
+from Data.parser import parse_dates, parse_decimals, parse_volumes
+from Data.queries import STOCK_FIELDS
+from Data.repository import BARS_COLLECTION
+
+
+MONGO_URI = os.environ.get("MONGODB_URI", "mongodb://localhost:27017")
+
+
+def create_bars_collection(db):
+    """Create stock_bars as a time-series collection with its (ticker, date) index."""
+    if BARS_COLLECTION not in db.list_collection_names():
+        db.create_collection(BARS_COLLECTION, timeseries={
+            "timeField": "date", "metaField": "ticker", "granularity": "hours"})
+    db[BARS_COLLECTION].create_index([("ticker", ASCENDING), ("date", DESCENDING)])
+
+
+def to_bars(ticker, data):
+    """Turn the MSE strings of a stock_records data array into numeric bar records."""
+    dates = parse_dates([x["date"] for x in data]).astype("datetime64[ms]").tolist()
+    columns = dict()
+    for field in STOCK_FIELDS[1:]:
+        values = [x[field] for x in data]
+        columns[field] = (parse_volumes(values) if field == "volume"
+                          else parse_decimals(values)).tolist()
+    return [{"ticker": ticker, "date": date, **{field: values[i] for field, values in columns.items()}}
+            for i, date in enumerate(dates)]
+
+
+def migrate_ticker(db, stock):
+    # converted before deleting, so a malformed number leaves the ticker's bars as they were
+    records = to_bars(stock["_id"], stock["data"])
+    bars = db[BARS_COLLECTION]
+    bars.delete_many({"ticker": stock["_id"]})
+    if records:
+        bars.insert_many(records, ordered=False)
+    return len(records)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Copy stock_records into the stock_bars time-series collection.")
+    parser.add_argument("tickers", nargs="*",
+                        help="tickers to migrate, all of them when omitted")
+    args = parser.parse_args()
+
+    client = MongoClient(MONGO_URI)
+    db = client["stock_data"]
+    create_bars_collection(db)
+
+    query = {"_id": {"$in": [t.upper() for t in args.tickers]}
+             } if args.tickers else {}
+    for stock in db["stock_records"].find(query):
+        try:
+            print(f"{stock['_id']}: {migrate_ticker(db, stock)} bars")
+        except ValueError as e:
+            print(f"{stock['_id']}: skipped, {e}")
+
+    client.close()
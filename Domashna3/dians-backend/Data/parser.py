@@ -0,0 +1,81 @@
+import numpy as np
+
+# Bulk parsing of the MSE strings the scraper stores: prices like "1.234,00 ден.",
+# volumes like "1.234" and dates like "31.12.2024". Whole columns are parsed at
+# once instead of one field of one bar at a time.
+
+PRICE_FIELDS = ["last_transaction", "max_value", "min_value", "volume"]
+
+
+def _parse_numbers(text, count, dtype):
+    values = np.fromstring(text, dtype=dtype, sep="\n")
+    if len(values) != count:
+        raise ValueError("Malformed MSE number in the parsed column")
+    return values
+
+
+def parse_decimals(values):
+    """Parse MSE decimal strings such as prices or changes, keeping the decimals, into float64."""
+    if len(values) == 0:
+        return np.array([], dtype=float)
+    text = "\n".join(values).replace(" ден.", "").replace(
+        ".", "").replace(",", ".")
+    return _parse_numbers(text, len(values), float)
+
+
+def parse_prices(values):
+    """Parse MSE price strings into int64, dropping the decimals like parse_singular."""
+    return parse_decimals(values).astype(np.int64)
+
+
+def parse_volumes(values):
+    """Parse MSE volume strings with '.' thousands separators into int64."""
+    if len(values) == 0:
+        return np.array([], dtype=np.int64)
+    return _parse_numbers("\n".join(values).replace(".", ""), len(values), np.int64)
+
+
+def parse_dates(values):
+    """Parse dd.mm.yyyy strings into datetime64[D] using their fixed layout."""
+    if len(values) == 0:
+        return np.array([], dtype="datetime64[D]")
+    digits = np.frombuffer("".join(values).encode("ascii"), dtype=np.uint8)
+    digits = digits.reshape(-1, 10).astype(np.int64) - ord("0")
+    days = digits[:, 0] * 10 + digits[:, 1]
+    months = digits[:, 3] * 10 + digits[:, 4]
+    years = digits[:, 6] * 1000 + digits[:, 7] * \
+        100 + digits[:, 8] * 10 + digits[:, 9]
+    month_start = ((years - 1970) * 12 + months - 1).astype("datetime64[M]")
+    return month_start.astype("datetime64[D]") + (days - 1)
+
+
+def format_price(value):
+    """Format a number as an MSE price string, 1234.5 -> '1.234,50 ден.'."""
+    return f"{format_decimal(value)} ден."
+
+
+def format_decimal(value):
+    return f"{value:,.2f}".replace(",", " ").replace(".", ",").replace(" ", ".")
+
+
+def format_volume(value):
+    return f"{int(value):,}".replace(",", ".")
+
+
+def format_dates(dates):
+    """Format datetime64 dates the way the MSE data stores them, dd.mm.yyyy."""
+    return [f"{d[8:10]}.{d[5:7]}.{d[:4]}" for d in np.datetime_as_string(dates, unit="D").tolist()]
+
+
+def parse_columns(data, fields=PRICE_FIELDS):
+    """
+    Turn the newest-first stock_records data into typed chronological columns:
+    dates as datetime64[D], prices and volume as int64.
+    """
+    data = data[::-1]
+    columns = {"date": parse_dates([x["date"] for x in data])}
+    for part in fields:
+        values = [x[part] for x in data]
+        columns[part] = parse_volumes(
+            values) if part == "volume" else parse_prices(values)
+    return columns
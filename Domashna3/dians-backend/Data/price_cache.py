@@ -0,0 +1,93 @@
+import os
+import threading
+from collections import OrderedDict
+from Monitoring.tracing import count_cache, span
+
+
+MAX_BYTES = int(os.environ.get("PRICE_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+
+def columns_size(columns):
+    return sum(column.nbytes for column in columns.values())
+
+
+class PriceCache:
+    """
+    Keeps the parsed history of recently used tickers in memory, evicting the
+    least recently used ones once the cached columns exceed max_bytes. An entry
+    is served only while the ticker's bar count and latest date in the
+    repository match the ones it was parsed from.
+    """
+
+    def __init__(self, repository, max_bytes=MAX_BYTES):
+        self.repository = repository
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def version(self, stock_id):
+        """Fetch only the bar count and latest date of a ticker, or None if it does not exist."""
+        with span("mongo.version"):
+            return await self.repository.version(stock_id)
+
+    async def peek(self, stock_id, version=None):
+        """
+        Return the cached columns of a ticker if still current, and whether the
+        ticker exists. A version the caller already fetched is not fetched again.
+        """
+        if version is None:
+            version = await self.version(stock_id)
+        if version is None:
+            self.invalidate(stock_id)
+            return None, False
+
+        with self._lock:
+            entry = self._entries.get(stock_id)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(stock_id)
+                count_cache("price", True)
+                return entry[1], True
+        count_cache("price", False)
+        return None, True
+
+    async def get(self, stock_id, version=None):
+        """Return the columns of a ticker, or None if it does not exist."""
+        if version is None:
+            version = await self.version(stock_id)
+        columns, exists = await self.peek(stock_id, version)
+        if columns is not None or not exists:
+            return columns
+
+        # the version was read first, so a write racing the load only causes a reload
+        with span("mongo.load_columns"):
+            columns = await self.repository.load_columns(stock_id)
+        if columns is None:
+            return None
+        self.put(stock_id, version, columns)
+        return columns
+
+    def put(self, stock_id, version, columns):
+        size = columns_size(columns)
+        with self._lock:
+            self._remove(stock_id)
+            if size > self.max_bytes:
+                return
+            self._entries[stock_id] = (version, columns, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self.size -= evicted_size
+
+    def invalidate(self, stock_id=None):
+        with self._lock:
+            if stock_id is None:
+                self._entries.clear()
+                self.size = 0
+            else:
+                self._remove(stock_id)
+
+    def _remove(self, stock_id):
+        entry = self._entries.pop(stock_id, None)
+        if entry is not None:
+            self.size -= entry[2]
@@ -0,0 +1,61 @@
+from datetime import datetime
+import numpy as np
+
+# Server-side selection of a ticker's bars. The data array is stored newest
+# first, so a limit keeps the most recent bars of the selected date range.
+
+STOCK_FIELDS = ["date", "last_transaction", "max_value", "min_value", "average",
+                "change", "volume", "best_sales", "all_sales"]
+
+
+def parse_date(value):
+    """Parse a dd.mm.yyyy query parameter, the format the stock data uses."""
+    return datetime.strptime(value, "%d.%m.%Y")
+
+
+def data_pipeline(stock_id, date_from=None, date_to=None, limit=None, fields=None):
+    """Aggregation that returns only the requested bars and fields of one ticker."""
+    data = "$data"
+    # dd.mm.yyyy reordered to yyyymmdd compares correctly as a string
+    bar_date = {"$concat": [{"$substrBytes": ["$$bar.date", 6, 4]},
+                            {"$substrBytes": ["$$bar.date", 3, 2]},
+                            {"$substrBytes": ["$$bar.date", 0, 2]}]}
+    conditions = []
+    if date_from is not None:
+        conditions.append({"$gte": [bar_date, date_from.strftime("%Y%m%d")]})
+    if date_to is not None:
+        conditions.append({"$lte": [bar_date, date_to.strftime("%Y%m%d")]})
+    if conditions:
+        data = {"$filter": {"input": data, "as": "bar",
+                            "cond": {"$and": conditions}}}
+    if limit is not None:
+        data = {"$slice": [data, limit]}
+    if fields is not None:
+        data = {"$map": {"input": data, "as": "bar",
+                         "in": {field: f"$$bar.{field}" for field in fields}}}
+    return [{"$match": {"_id": stock_id}}, {"$project": {"data": data}}]
+
+
+async def fetch_data(collection, stock_id, date_from=None, date_to=None, limit=None, fields=None):
+    """Return the selected bars of a ticker, or None if the ticker does not exist."""
+    if date_from is None and date_to is None and fields is None:
+        projection = {"data": {"$slice": limit}} if limit is not None else None
+        stock = await collection.find_one({"_id": stock_id}, projection)
+        return stock["data"] if stock else None
+    stocks = await collection.aggregate(data_pipeline(
+        stock_id, date_from, date_to, limit, fields)).to_list(None)
+    return stocks[0]["data"] if stocks else None
+
+
+def slice_columns(columns, date_from=None, date_to=None, limit=None):
+    """The same selection applied to chronological price columns already in memory."""
+    mask = np.ones(len(columns["date"]), dtype=bool)
+    if date_from is not None:
+        mask &= columns["date"] >= np.datetime64(date_from.date())
+    if date_to is not None:
+        mask &= columns["date"] <= np.datetime64(date_to.date())
+    if limit is not None:
+        selected = np.flatnonzero(mask)[-limit:] if limit > 0 else []
+        mask = np.zeros(len(mask), dtype=bool)
+        mask[selected] = True
+    return {name: column[mask] for name, column in columns.items()}
@@ -0,0 +1,191 @@
+import os
+import numpy as np
+from Data.catalog import CATALOG_COLLECTION
+from Data.parser import PRICE_FIELDS, format_decimal, format_price, format_volume, parse_columns
+from Data.queries import STOCK_FIELDS, fetch_data
+
+# The backend reads stock history through a repository so the storage layout can
+# change underneath it. DocumentStockRepository reads the original stock_records
+# layout, one document per ticker with MSE strings in its data array.
+# BarStockRepository reads stock_bars, a time-series collection with one numeric
+# record per bar. CutoverStockRepository serves tickers from stock_bars once they
+# are migrated and from stock_records until then. The bar layouts read a ticker's
+# version from stock_catalog, since counting its bars would read its history.
+
+STORAGE = os.environ.get("STOCK_STORAGE", "documents")
+BARS_COLLECTION = "stock_bars"
+DECIMAL_FIELDS = ["change"]
+VOLUME_FIELDS = ["volume"]
+
+
+class DocumentStockRepository:
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def stock_ids(self):
+        return await self.collection.distinct("_id")
+
+    async def version(self, stock_id):
+        """The bar count and latest date of a ticker, or None if it does not exist."""
+        versions = await self.collection.aggregate([
+            {"$match": {"_id": stock_id}},
+            {"$project": {"count": {"$size": "$data"},
+                          "last_date": {"$arrayElemAt": ["$data.date", 0]}}},
+        ]).to_list(None)
+        if not versions:
+            return None
+        return versions[0]["count"], versions[0].get("last_date")
+
+    async def load_data(self, stock_id, date_from=None, date_to=None, limit=None, fields=None):
+        """MSE formatted bars of a ticker, newest first, or None if it does not exist."""
+        return await fetch_data(self.collection, stock_id, date_from, date_to, limit, fields)
+
+    async def load_columns(self, stock_id, date_from=None, date_to=None, limit=None, fields=PRICE_FIELDS):
+        """Typed chronological columns of a ticker, or None if it does not exist."""
+        if date_from is None and date_to is None:
+            data = await fetch_data(self.collection, stock_id, limit=limit)
+        else:
+            data = await fetch_data(self.collection, stock_id, date_from,
+                              date_to, limit, ["date", *fields])
+        return None if data is None else parse_columns(data, fields)
+
+    async def recent_columns(self, limit):
+        """The newest limit bars of every ticker, as (stock_id, columns) pairs."""
+        async for stock in self.collection.find({}, {"data": {"$slice": limit}}):
+            yield stock["_id"], parse_columns(stock["data"])
+
+
+class BarStockRepository:
+
+    def __init__(self, collection, catalog):
+        self.collection = collection
+        self.catalog = catalog
+
+    async def stock_ids(self):
+        return await self.collection.distinct("ticker")
+
+    def _query(self, stock_id, date_from, date_to):
+        query = {"ticker": stock_id}
+        if date_from is not None or date_to is not None:
+            query["date"] = dict()
+            if date_from is not None:
+                query["date"]["$gte"] = date_from
+            if date_to is not None:
+                query["date"]["$lte"] = date_to
+        return query
+
+    async def has(self, stock_id):
+        """Whether a ticker has any bars, from a single indexed lookup."""
+        return await self.collection.find_one({"ticker": stock_id}, {"_id": 1}) is not None
+
+    async def version(self, stock_id):
+        """The bar count and latest date of a ticker from its catalog entry, or None if it does not exist."""
+        entry = await self.catalog.find_one({"_id": stock_id}, {"bars": 1, "last_date": 1})
+        if entry is not None and entry.get("last_date") is not None:
+            return entry["bars"], entry["last_date"].strftime("%d.%m.%Y")
+        # tickers missing from the catalog until it is built are counted
+        versions = await self.collection.aggregate([
+            {"$match": {"ticker": stock_id}},
+            {"$group": {"_id": None, "count": {"$sum": 1},
+                        "last_date": {"$max": "$date"}}},
+        ]).to_list(None)
+        if not versions or not versions[0]["count"]:
+            return None
+        return versions[0]["count"], versions[0]["last_date"].strftime("%d.%m.%Y")
+
+    async def _find(self, stock_id, date_from, date_to, limit, fields):
+        cursor = self.collection.find(self._query(stock_id, date_from, date_to),
+                                      {"_id": 0, "date": 1, **{field: 1 for field in fields}})
+        cursor = cursor.sort("date", -1)
+        if limit is not None:
+            cursor = cursor.limit(limit)
+        return await cursor.to_list(None)
+
+    async def load_data(self, stock_id, date_from=None, date_to=None, limit=None, fields=None):
+        bars = await self._find(stock_id, date_from, date_to, limit,
+                          STOCK_FIELDS if fields is None else fields)
+        if not bars and not await self.has(stock_id):
+            return None
+        data = []
+        for bar in bars:
+            entry = dict()
+            for field in STOCK_FIELDS if fields is None else fields:
+                if field == "date":
+                    entry[field] = bar["date"].strftime("%d.%m.%Y")
+                elif field in VOLUME_FIELDS:
+                    entry[field] = format_volume(bar[field])
+                elif field in DECIMAL_FIELDS:
+                    entry[field] = format_decimal(bar[field])
+                else:
+                    entry[field] = format_price(bar[field])
+            data.append(entry)
+        return data
+
+    async def load_columns(self, stock_id, date_from=None, date_to=None, limit=None, fields=PRICE_FIELDS):
+        bars = (await self._find(stock_id, date_from, date_to, limit, fields))[::-1]
+        if not bars and not await self.has(stock_id):
+            return None
+        columns = {"date": np.array([bar["date"] for bar in bars], dtype="datetime64[D]")}
+        for field in fields:
+            # prices keep their decimals in stock_bars, the columns drop them
+            columns[field] = np.array([bar[field] for bar in bars], dtype=float).astype(np.int64)
+        return columns
+
+    async def recent_columns(self, limit):
+        bars = self.collection.aggregate([
+            {"$group": {"_id": "$ticker", "bars": {"$topN": {
+                "n": limit, "sortBy": {"date": -1},
+                "output": ["$date", *[f"${field}" for field in PRICE_FIELDS]]}}}},
+        ])
+        async for stock in bars:
+            rows = stock["bars"][::-1]
+            columns = {"date": np.array([row[0] for row in rows], dtype="datetime64[D]")}
+            for i, field in enumerate(PRICE_FIELDS, start=1):
+                columns[field] = np.array([row[i] for row in rows], dtype=float).astype(np.int64)
+            yield stock["_id"], columns
+
+
+class CutoverStockRepository:
+
+    def __init__(self, bars, documents):
+        self.bars = bars
+        self.documents = documents
+
+    async def _source(self, stock_id):
+        return self.bars if await self.bars.has(stock_id) else self.documents
+
+    async def stock_ids(self):
+        return sorted(set(await self.bars.stock_ids()) | set(await self.documents.stock_ids()))
+
+    async def version(self, stock_id):
+        # the catalog covers both layouts, so this is one lookup once it is built
+        return await self.bars.version(stock_id) or await self.documents.version(stock_id)
+
+    async def load_data(self, stock_id, *args, **kwargs):
+        return await (await self._source(stock_id)).load_data(stock_id, *args, **kwargs)
+
+    async def load_columns(self, stock_id, *args, **kwargs):
+        return await (await self._source(stock_id)).load_columns(stock_id, *args, **kwargs)
+
+    async def recent_columns(self, limit):
+        migrated = set()
+        async for stock_id, columns in self.bars.recent_columns(limit):
+            migrated.add(stock_id)
+            yield stock_id, columns
+        async for stock_id, columns in self.documents.recent_columns(limit):
+            if stock_id not in migrated:
+                yield stock_id, columns
+
+
+def get_repository(db, storage=STORAGE):
+    """The stock repository of a motor database for the configured STOCK_STORAGE: documents, bars or cutover."""
+    documents = DocumentStockRepository(db["stock_records"])
+    if storage == "documents":
+        return documents
+    bars = BarStockRepository(db[BARS_COLLECTION], db[CATALOG_COLLECTION])
+    if storage == "bars":
+        return bars
+    if storage == "cutover":
+        return CutoverStockRepository(bars, documents)
+    raise ValueError(f"Unknown stock storage {storage}")
@@ -0,0 +1,75 @@
+import os
+import threading
+from collections import OrderedDict
+from Monitoring.tracing import count_cache
+
+
+MAX_BYTES = int(os.environ.get("RESPONSE_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+MAX_AGE = int(os.environ.get("RESPONSE_MAX_AGE", 0))
+
+
+def version_etag(stock_id, version):
+    """A weak ETag for a ticker's data, which only changes when a bar is added."""
+    count, last_date = version
+    return f'W/"{stock_id}-{count}-{last_date}"'
+
+
+def etag_matches(if_none_match, etag):
+    """Whether an If-None-Match header lists etag, comparing weakly as RFC 9110 asks for GETs."""
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+
+def cache_control(max_age=MAX_AGE):
+    return f"public, max-age={max_age}, must-revalidate"
+
+
+class ResponseCache:
+    """
+    Keeps the bodies of recent responses, each with the ETag of the data it was
+    built from, evicting the least recently used ones past max_bytes. A body is
+    only served while the ETag still matches, so new bars replace it on their own.
+    """
+
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, etag):
+        """The cached (body, headers) of a key if it was built from etag, otherwise None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != etag:
+                count_cache("response", False)
+                return None
+            self._entries.move_to_end(key)
+            count_cache("response", True)
+            return entry[1], entry[2]
+
+    def put(self, key, etag, body, headers):
+        size = len(body)
+        with self._lock:
+            self._remove(key)
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (etag, body, headers, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, _, _, evicted_size) = self._entries.popitem(last=False)
+                self.size -= evicted_size
+
+    def invalidate(self, stock_id=None):
+        """Drop the responses of one ticker, or every response."""
+        with self._lock:
+            for key in list(self._entries):
+                if stock_id is None or key[0] == stock_id:
+                    self._remove(key)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[3]
@@ -0,0 +1,6 @@
+import hashlib
+
+
+def text_hash(text):
+    """The hash that ties a filing's text to its analysis, kept apart from the models so the scraper can use it."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
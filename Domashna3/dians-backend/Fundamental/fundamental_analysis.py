@@ -1,23 +1,281 @@
-from transformers import AutoTokenizer, AutoModelForSequenceClassification, pipeline
+from transformers import AutoTokenizer, AutoModelForSeq2SeqLM, AutoModelForSequenceClassification, pipeline
+from collections import deque
+from concurrent.futures import Future
+import json
+import os
+import queue
+import re
+import threading
+import time
 import torch
+from Fundamental.filings import text_hash
+from Monitoring.tracing import count_cache, span, traced
 
-def get_fundamental_analysis(text):
-    model_name = "tabularisai/multilingual-sentiment-analysis"
-    tokenizer = AutoTokenizer.from_pretrained(model_name)
-    model = AutoModelForSequenceClassification.from_pretrained(model_name)
-    translator = pipeline("translation", model="Helsinki-NLP/opus-mt-mk-en")
 
-    def predict_sentiment(texts):
-        inputs = tokenizer(texts, return_tensors="pt", truncation=True, padding=True, max_length=512)
+SENTIMENT_MODEL = "tabularisai/multilingual-sentiment-analysis"
+TRANSLATION_MODEL = "Helsinki-NLP/opus-mt-mk-en"
+SENTIMENT_MAP = {0: "Very Negative", 1: "Negative",
+                 2: "Neutral", 3: "Positive", 4: "Very Positive"}
+
+MAX_BATCH_SIZE = int(os.environ.get("FUNDAMENTAL_MAX_BATCH_SIZE", 8))
+MAX_WAIT_MS = float(os.environ.get("FUNDAMENTAL_MAX_WAIT_MS", 20))
+# chunks of whole sentences stay well under the 512 token limit of both models
+CHUNK_CHARS = int(os.environ.get("FUNDAMENTAL_CHUNK_CHARS", 400))
+MAX_IN_FLIGHT = int(os.environ.get("FUNDAMENTAL_MAX_IN_FLIGHT", 16))
+QUANTIZE = os.environ.get("FUNDAMENTAL_QUANTIZE", "").lower() in ("1", "true", "yes")
+INTRA_OP_THREADS = int(os.environ.get("FUNDAMENTAL_INTRA_OP_THREADS", 0))
+INTER_OP_THREADS = int(os.environ.get("FUNDAMENTAL_INTER_OP_THREADS", 0))
+
+
+def configure_threads(intra_op=INTRA_OP_THREADS, inter_op=INTER_OP_THREADS):
+    """Set the torch CPU thread pools, leaving the defaults for counts of 0."""
+    if intra_op > 0:
+        torch.set_num_threads(intra_op)
+    if inter_op > 0:
+        try:
+            torch.set_num_interop_threads(inter_op)
+        except RuntimeError:
+            # torch only allows this before its first parallel work
+            pass
+
+
+def quantize(model):
+    """int8 dynamic quantization of the linear layers, which dominate both models on CPU."""
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class SentimentService:
+    """
+    Keeps the translation and sentiment models in memory and serves them from a
+    single worker thread that groups concurrent requests into micro-batches.
+    """
+
+    def __init__(self, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS, quantized=QUANTIZE):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.quantized = quantized
+        self.tokenizer = None
+        self.model = None
+        self.translator = None
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Load the models and start the batching worker, once."""
+        with self._lock:
+            if self._worker is not None:
+                return
+            self.load_models()
+            self._worker = threading.Thread(
+                target=self._run, name="sentiment-service", daemon=True)
+            self._worker.start()
+
+    def load_models(self):
+        configure_threads()
+        with span("model_load.sentiment"):
+            self.tokenizer = AutoTokenizer.from_pretrained(SENTIMENT_MODEL)
+            self.model = AutoModelForSequenceClassification.from_pretrained(
+                SENTIMENT_MODEL)
+            self.model.eval()
+            if self.quantized:
+                self.model = quantize(self.model)
+        with span("model_load.translation"):
+            translation_model = AutoModelForSeq2SeqLM.from_pretrained(
+                TRANSLATION_MODEL)
+            translation_model.eval()
+            if self.quantized:
+                translation_model = quantize(translation_model)
+            self.translator = pipeline(
+                "translation", model=translation_model,
+                tokenizer=AutoTokenizer.from_pretrained(TRANSLATION_MODEL))
+
+    def stop(self):
+        with self._lock:
+            if self._worker is None:
+                return
+            self._queue.put(None)
+            self._worker.join()
+            self._worker = None
+
+    def submit(self, text) -> Future:
+        """Queue a text for analysis and return a future with its sentiment."""
+        self.start()
+        future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def predict_sentiment(self, texts):
+        inputs = self.tokenizer(texts, return_tensors="pt", truncation=True,
+                                padding=True, max_length=512)
         with torch.no_grad():
-            outputs = model(**inputs)
+            outputs = self.model(**inputs)
         probabilities = torch.nn.functional.softmax(outputs.logits, dim=-1)
-        sentiment_map = {0: "Very Negative", 1: "Negative", 2: "Neutral", 3: "Positive", 4: "Very Positive"}
-        return [sentiment_map[p] for p in torch.argmax(probabilities, dim=-1).tolist()]
-    
-    text = translator(text)[0]["translation_text"]
-    sentiment = predict_sentiment(text)
-    
-    print(text, sentiment)
-    
-    return sentiment
+        return probabilities.tolist()
+
+    def analyze_batch(self, texts):
+        with span("fundamental.translate"):
+            translated = self.translator(texts, batch_size=len(texts))
+        translated = [t["translation_text"] for t in translated]
+        with span("fundamental.sentiment"):
+            scores = self.predict_sentiment(translated)
+        return [{"translation": translation, "sentiment": [sentiment_label(s)], "scores": s}
+                for translation, s in zip(translated, scores)]
+
+    def _collect_batch(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = self._collect_batch(first)
+            futures = [future for _, future in batch]
+            try:
+                results = self.analyze_batch([text for text, _ in batch])
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            for future, result in zip(futures, results):
+                future.set_result(result)
+
+
+service = SentimentService()
+
+
+def sentiment_label(scores):
+    return SENTIMENT_MAP[max(range(len(scores)), key=scores.__getitem__)]
+
+
+def sentences(text):
+    """Yield the sentences of a text, treating line breaks as ends of table rows."""
+    start = 0
+    for end in re.finditer(r"(?<=[.!?])\s+|\n+", text):
+        yield text[start:end.start()]
+        start = end.end()
+    yield text[start:]
+
+
+def split_chunks(text, max_chars=CHUNK_CHARS):
+    """Group the sentences of a text into chunks of at most max_chars, splitting overlong sentences on spaces."""
+    chunk = ""
+    for sentence in sentences(text):
+        sentence = " ".join(sentence.split())
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            if chunk:
+                yield chunk
+                chunk = ""
+            yield sentence[:cut]
+            sentence = sentence[cut:].strip()
+        if not sentence:
+            continue
+        if chunk and len(chunk) + 1 + len(sentence) > max_chars:
+            yield chunk
+            chunk = sentence
+        else:
+            chunk = f"{chunk} {sentence}" if chunk else sentence
+    if chunk:
+        yield chunk
+
+
+def iter_analysis(text, max_in_flight=MAX_IN_FLIGHT):
+    """
+    Translates and classifies a filing chunk by chunk, yielding the results in order.
+    At most max_in_flight chunks wait on the service, so the memory a document
+    holds does not grow with its length.
+    """
+    pending = deque()
+    for chunk in split_chunks(text):
+        pending.append((len(chunk), service.submit(chunk)))
+        if len(pending) >= max_in_flight:
+            size, future = pending.popleft()
+            yield {"chars": size, **future.result()}
+    while pending:
+        size, future = pending.popleft()
+        yield {"chars": size, **future.result()}
+
+
+def summarize(text, results):
+    """Combine the chunk results of a filing, weighting each chunk's sentiment scores by its length."""
+    total = sum(r["chars"] for r in results)
+    scores = [sum(r["scores"][i] * r["chars"] for r in results) / total
+              for i in range(len(SENTIMENT_MAP))] if total else None
+    return {"hash": text_hash(text),
+            "translation": " ".join(r["translation"] for r in results),
+            "sentiment": [sentiment_label(scores) if scores else SENTIMENT_MAP[2]],
+            "chunks": [r["sentiment"][0] for r in results]}
+
+
+@traced("fundamental.analyze_document")
+def analyze_document(text):
+    """Translate and classify a filing, returning the result keyed by its content hash."""
+    return summarize(text, list(iter_analysis(text)))
+
+
+def get_cached_analysis(collection, stock):
+    """
+    Returns the stored analysis of a stock_fundamental document, computing and
+    storing it first when the filing text changed since it was analysed.
+    """
+    analysis = stock.get("analysis")
+    if analysis and analysis.get("hash") == text_hash(stock["file"]):
+        count_cache("fundamental", True)
+        return analysis, True
+
+    count_cache("fundamental", False)
+    analysis = analyze_document(stock["file"])
+    store_analysis(collection, stock, analysis)
+    return analysis, False
+
+
+def store_analysis(collection, stock, analysis):
+    """
+    Store the analysis of a filing unless the scraper replaced the filing in the
+    meantime, matching it by file_hash instead of the whole text. Documents
+    scraped before file_hash was stored get it with their analysis.
+    """
+    collection.update_one({"_id": stock["_id"], "file_hash": {"$in": [analysis["hash"], None]}},
+                          {"$set": {"analysis": analysis, "file_hash": analysis["hash"]}})
+
+
+def stream_analysis(collection, stock):
+    """
+    Server-sent events with the result of every chunk of a filing as it is
+    analysed, ending with the stored analysis of the whole filing.
+    """
+    analysis = stock.get("analysis")
+    if not analysis or analysis.get("hash") != text_hash(stock["file"]):
+        results = []
+        for i, result in enumerate(iter_analysis(stock["file"])):
+            results.append(result)
+            yield _event("chunk", {"chunk": i, "translation": result["translation"],
+                                   "sentiment": result["sentiment"]})
+        analysis = summarize(stock["file"], results)
+        store_analysis(collection, stock, analysis)
+    yield _event("done", {"sentiment": analysis["sentiment"], "chunks": analysis.get("chunks")})
+
+
+def _event(name, data):
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+
+def get_fundamental_analysis(text):
+    return analyze_document(text)["sentiment"]
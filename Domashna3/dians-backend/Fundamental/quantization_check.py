@@ -0,0 +1,63 @@
+import argparse
+import sys
+import time
+from Fundamental.fundamental_analysis import SentimentService
+
+
+# A fixed set of filing-like Macedonian sentences, so results compare across runs
+SAMPLES = [
+    "Нето добивката на друштвото во првиот квартал се зголеми за 15% во споредба со истиот период минатата година.",
+    "Приходите од продажба бележат значителен пад поради намалената побарувачка на странските пазари.",
+    "Друштвото оствари загуба од 20 милиони денари во текот на годината.",
+    "Управниот одбор предлага исплата на дивиденда од 100 денари по акција.",
+    "Собранието на акционери ќе се одржи на 15 мај во седиштето на друштвото.",
+    "Кредитното задолжување на банката е намалено, а капиталната адекватност е стабилна.",
+    "Поради неповолните услови на пазарот, компанијата ги одложи инвестициите во нови капацитети.",
+    "Оперативниот профит е рекорден во историјата на друштвото.",
+    "Друштвото склучи нов договор за набавка на опрема со странски партнер.",
+    "Трошоците за енергија значително ја намалија профитабилноста на производството.",
+    "Бројот на вработени остана непроменет во однос на претходната година.",
+    "Акционерите се задоволни од резултатите и растот на цената на акциите.",
+]
+
+
+def run(quantized, repeat):
+    service = SentimentService(quantized=quantized)
+    service.load_models()
+    service.analyze_batch(SAMPLES[:1])
+    start = time.perf_counter()
+    for _ in range(repeat):
+        results = service.analyze_batch(SAMPLES)
+    return results, (time.perf_counter() - start) / repeat
+
+
+def word_overlap(a, b):
+    a, b = set(a.lower().split()), set(b.lower().split())
+    return len(a & b) / max(len(a | b), 1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare the int8 quantized models against fp32 on a fixed Macedonian sample set.")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="timed runs over the sample set per mode")
+    parser.add_argument("--min-agreement", type=float, default=0.9,
+                        help="fail when fewer sentiment labels than this match fp32")
+    args = parser.parse_args()
+
+    fp32, fp32_time = run(False, args.repeat)
+    int8, int8_time = run(True, args.repeat)
+
+    agreement = sum(a["sentiment"] == b["sentiment"]
+                    for a, b in zip(fp32, int8)) / len(SAMPLES)
+    overlap = sum(word_overlap(a["translation"], b["translation"])
+                  for a, b in zip(fp32, int8)) / len(SAMPLES)
+    for a, b in zip(fp32, int8):
+        marker = " " if a["sentiment"] == b["sentiment"] else "*"
+        print(f"{marker} {a['sentiment'][0]:>13} | {b['sentiment'][0]:>13} | {a['translation']}")
+    print(f"sentiment agreement: {agreement:.0%}")
+    print(f"translation word overlap: {overlap:.0%}")
+    print(f"fp32 {fp32_time * 1000:.0f}ms, int8 {int8_time * 1000:.0f}ms, "
+          f"speedup {fp32_time / int8_time:.2f}x")
+
+    sys.exit(0 if agreement >= args.min_agreement else 1)
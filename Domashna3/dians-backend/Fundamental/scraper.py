@@ -1,103 +1,291 @@
+import argparse
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
 import requests
-import io
 import bs4 as bs
 import PyPDF2
 import pandas as pd
 import docx
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from Data.catalog import mark_fundamentals
+from Fundamental.filings import text_hash
 
-def download_file(url):
-    """Download file from URL and return as bytes."""
-    response = requests.get(url)
-    if response.status_code == 200:
-        return io.BytesIO(response.content)
-    raise Exception(f"Failed to download file: {response.status_code}")
 
-def extract_text_from_pdf(file_bytes):
+MONGO_URI = os.environ.get("MONGODB_URI", "mongodb://localhost:27017")
+# the API the sellers are listed from, told to drop its cache after every crawl
+API_URL = os.environ.get("API_URL", "http://localhost:8000")
+WORKERS = int(os.environ.get("SCRAPER_WORKERS", 8))
+REQUESTS_PER_SECOND = float(os.environ.get("SCRAPER_REQUESTS_PER_SECOND", 5))
+TIMEOUT = 30
+BULK_SIZE = 50
+MAX_DOWNLOAD_BYTES = int(os.environ.get("SCRAPER_MAX_DOWNLOAD_MB", 50)) * 1024 * 1024
+EXTRACT_PROCESSES = int(os.environ.get("SCRAPER_EXTRACT_PROCESSES", os.cpu_count() or 1))
+EXTRACT_TIMEOUT = float(os.environ.get("SCRAPER_EXTRACT_TIMEOUT", 60))
+CHUNK_SIZE = 64 * 1024
+
+
+class RateLimiter:
+    """Spaces the requests to each host so that at most per_second of them start every second."""
+
+    def __init__(self, per_second=REQUESTS_PER_SECOND):
+        self.interval = 1 / per_second
+        self._next = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def wait(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next[host])
+            self._next[host] = start + self.interval
+        time.sleep(start - now)
+
+
+class Client:
+    """A pooled, rate limited HTTP session that retries failed requests with exponential backoff."""
+
+    def __init__(self, workers=WORKERS, limiter=None):
+        self.limiter = limiter or RateLimiter()
+        self.session = requests.Session()
+        retries = Retry(total=5, backoff_factor=0.5, allowed_methods=["GET"],
+                        status_forcelist=[429, 500, 502, 503, 504])
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=workers,
+                              max_retries=retries)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def get(self, url, stream=False):
+        self.limiter.wait(url)
+        response = self.session.get(url, timeout=TIMEOUT, stream=stream)
+        response.raise_for_status()
+        return response
+
+
+class ExtractionPool:
+    """
+    Extracts attachments in worker processes, giving up on a file after timeout
+    seconds. The pool is terminated and started again after a timeout, since a
+    stuck parser cannot be interrupted otherwise; extractions running at that
+    moment fail and are retried on the next crawl.
+    """
+
+    def __init__(self, processes=EXTRACT_PROCESSES, timeout=EXTRACT_TIMEOUT):
+        self.processes = processes
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._pool = self._start()
+
+    def _start(self):
+        # spawn, since the crawler threads make forking unsafe
+        return multiprocessing.get_context("spawn").Pool(self.processes)
+
+    def extract(self, path, file_type):
+        pool = self._pool
+        result = pool.apply_async(extract_text, (path, file_type))
+        try:
+            return result.get(timeout=self.timeout)
+        except multiprocessing.TimeoutError:
+            self._restart(pool)
+            raise Exception(f"Extraction took longer than {self.timeout} seconds")
+
+    def _restart(self, pool):
+        with self._lock:
+            if self._pool is not pool:
+                return
+            self._pool = self._start()
+        # terminate kills the workers, including the stuck one
+        pool.terminate()
+
+    def close(self):
+        self._pool.close()
+        self._pool.join()
+
+
+def download_file(url, client=requests, max_bytes=MAX_DOWNLOAD_BYTES):
+    """Stream a file from URL into a temporary file of at most max_bytes and return its path."""
+    response = client.get(url, stream=True)
+    if response.status_code != 200:
+        raise Exception(f"Failed to download file: {response.status_code}")
+    with response:
+        if int(response.headers.get("Content-Length") or 0) > max_bytes:
+            raise Exception(f"File is larger than {max_bytes} bytes")
+        size = 0
+        f = tempfile.NamedTemporaryFile(delete=False)
+        try:
+            with f:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise Exception(f"File is larger than {max_bytes} bytes")
+                    f.write(chunk)
+        except BaseException:
+            # removed once closed, since Windows cannot remove an open file
+            os.remove(f.name)
+            raise
+    return f.name
+
+def extract_text_from_pdf(file):
     """Extract text from PDF file."""
-    pdf_reader = PyPDF2.PdfReader(file_bytes)
-    text = ""
-    for page in pdf_reader.pages:
-        text += page.extract_text() + "\n"
-    return text
+    pdf_reader = PyPDF2.PdfReader(file)
+    return "".join(f"{page.extract_text()}\n" for page in pdf_reader.pages)
 
-def extract_text_from_excel(file_bytes):
+def extract_text_from_excel(file):
     """Extract text from Excel file."""
-    df = pd.read_excel(file_bytes)
+    df = pd.read_excel(file)
     return df.to_string()
 
-def extract_text_from_docx(file_bytes):
+def extract_text_from_docx(file):
     """Extract text from DOCX file."""
-    doc = docx.Document(file_bytes)
-    text = ""
-    for paragraph in doc.paragraphs:
-        text += paragraph.text + "\n"
-    return text
-
-def save_to_database(seller, file_content):
-    """Save the extracted text to MongoDB database."""
-    client = MongoClient('localhost', 27017)
-    db = client.stock_data
-    collection = db.stock_fundamental
-    
+    doc = docx.Document(file)
+    return "".join(f"{paragraph.text}\n" for paragraph in doc.paragraphs)
+
+EXTRACTORS = {
+    'pdf': extract_text_from_pdf,
+    'xls': extract_text_from_excel,
+    'xlsx': extract_text_from_excel,
+    'doc': extract_text_from_docx,
+    'docx': extract_text_from_docx,
+}
+
+def extract_text(file, file_type):
+    return EXTRACTORS[file_type](file)
+
+def save_operation(seller, document_id, file_content, analysis=None):
+    """The bulk upsert that saves the extracted text, and optionally its sentiment analysis, of a seller."""
     document = {
-        "_id": seller,  
+        "_id": seller,
+        "document_id": document_id,
         "file": file_content,
+        "file_hash": text_hash(file_content),
     }
-    
-    collection.update_one(
-        {"_id": seller},
-        {"$set": document},
-        upsert=True
-    )
-    
-    client.close()
+    if analysis is not None:
+        document["analysis"] = analysis
+    return UpdateOne({"_id": seller}, {"$set": document}, upsert=True)
 
-def process_file(url, seller, file_type):
+def seen_operation(seller, document_id):
+    """The bulk upsert that only records the id of a filing without text, so it is not downloaded again."""
+    return UpdateOne({"_id": seller}, {"$set": {"document_id": document_id}}, upsert=True)
+
+def process_file(url, seller, file_type, client=requests, pool=None):
     """Main function to process the file."""
     try:
-        file_bytes = download_file(url)
-        
-        if file_type == 'pdf':
-            text = extract_text_from_pdf(file_bytes)
-        elif file_type in ['xls', 'xlsx']:
-            text = extract_text_from_excel(file_bytes)
-        elif file_type in ['doc', 'docx']:
-            text = extract_text_from_docx(file_bytes)
-        else:
+        if file_type not in EXTRACTORS:
             raise Exception(f"Unsupported file type: {file_type}")
-        
-        return text
-        
+
+        path = download_file(url, client)
+        try:
+            return pool.extract(path, file_type) if pool else extract_text(path, file_type)
+        finally:
+            os.remove(path)
+
     except Exception as e:
         print(f"Error processing file for {seller}: {str(e)}")
         return False
 
+def latest_document_id(client, seller):
+    """The seinet id of the latest filing linked from a seller's MSE page, or None."""
+    response = client.get(f'https://www.mse.mk/mk/symbol/{seller}')
+    soup = bs.BeautifulSoup(response.text, 'html.parser')
+    links = [a['href'] for a in soup.select('div#seiNetIssuerLatestNews a') if 'href' in a.attrs]
+    return links[0].split('/')[-1] if links else None
+
+def scrape_seller(client, seller, known_id, analyze=None, pool=None):
+    """
+    Scrape the latest filing of a seller and return its save operation and
+    whether it saves any text. The operation is None when there is no filing,
+    it is the one already stored or its attachment could not be processed.
+    """
+    document_id = latest_document_id(client, seller)
+    if document_id is None:
+        print(f"No files found for seller {seller}")
+        return None, False
+    if document_id == known_id:
+        print(f"Filing of seller {seller} is unchanged")
+        return None, False
+
+    data = client.get(f'https://api.seinet.com.mk/public/documents/single/{document_id}').json()['data']
+    content, text = None, None
+    if 'content' in data:
+        content = bs.BeautifulSoup(data['content'], 'html.parser').get_text()
+    if data.get('attachments'):
+        attachment = data['attachments'][0]
+        url_file = f"https://api.seinet.com.mk/public/documents/attachment/{attachment['attachmentId']}"
+        text = process_file(url_file, seller, attachment['fileName'].split('.')[-1].lower(), client, pool)
+        if text is False and not content:
+            # retried on the next crawl
+            return None, False
+    text_full = content + text if content and text else content or text
+    if not text_full:
+        print(f"Filing of seller {seller} has no text")
+        return seen_operation(seller, document_id), False
+    print(f"Successfully processed file for seller {seller}")
+    return save_operation(seller, document_id, text_full,
+                          analyze(text_full) if analyze else None), True
+
+def crawl(sellers, collection, analyze=None, workers=WORKERS):
+    """Scrape many sellers concurrently, writing the changed filings in bulk."""
+    known = {d["_id"]: d.get("document_id")
+             for d in collection.find({}, {"document_id": 1})}
+    client = Client(workers)
+    pool = ExtractionPool()
+
+    def scrape(seller):
+        try:
+            return scrape_seller(client, seller, known.get(seller), analyze, pool)
+        except Exception as e:
+            print(f"Error scraping seller {seller}: {str(e)}")
+            return None, False
+
+    operations, saved = [], []
+
+    def flush():
+        collection.bulk_write(operations, ordered=False)
+        mark_fundamentals(collection.database, saved)
+        operations.clear()
+        saved.clear()
+
+    with ThreadPoolExecutor(workers) as executor:
+        for seller, (operation, has_text) in zip(sellers, executor.map(scrape, sellers)):
+            if operation is not None:
+                operations.append(operation)
+            if has_text:
+                saved.append(seller)
+            if len(operations) >= BULK_SIZE:
+                flush()
+    pool.close()
+    if operations:
+        flush()
+
+def invalidate_api_cache():
+    """Ask the API to drop its cached responses, warning instead of failing when it is not running."""
+    try:
+        response = requests.post(f'{API_URL}/cache/invalidate', timeout=TIMEOUT,
+                                 headers={"X-Cache-Token": os.environ.get("CACHE_TOKEN", "")})
+        response.raise_for_status()
+    except requests.RequestException as e:
+        print(f"Warning: could not invalidate the API cache: {str(e)}")
+
 if __name__ == "__main__":
-    sellers = requests.get('http://localhost:8000/stocks').json()
-    
-    for seller in sellers:
-        url = f'https://www.mse.mk/mk/symbol/{seller}'
-        response = requests.get(url)
-        soup = bs.BeautifulSoup(response.text, 'html.parser')
-        li_elements = soup.select('div#seiNetIssuerLatestNews a')
-        if not li_elements:
-            print(f"No files found for seller {seller}")
-            continue
-        link = [a['href'] for a in li_elements if 'href' in a.attrs][0]
-        id = link.split('/')[-1]
-        url_link = f'https://api.seinet.com.mk/public/documents/single/{id}'
-        json = requests.get(url_link).json()
-        if 'content' in json['data']:
-            content = json['data']['content']
-            content = bs.BeautifulSoup(content, 'html.parser').get_text()
-        if 'attachments' in json['data'] and len(json['data']['attachments']) > 0:
-            file = json['data']['attachments'][0]['attachmentId']
-            url_file = f'https://api.seinet.com.mk/public/documents/attachment/{file}'
-            file_type = json['data']['attachments'][0]['fileName'].split('.')[-1]
-            text = process_file(url_file, seller, file_type)
-        text_full = content + text if content and text else content or text
-        if text_full:
-            save_to_database(seller, text_full)
-        if text or content:
-            print(f"Successfully processed file for seller {seller}")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Scrape the latest issuer filings.")
+    parser.add_argument("--analyze", action="store_true",
+                        help="run the sentiment analysis at scrape time and store it with the filing")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help="sellers scraped at the same time")
+    args = parser.parse_args()
+    analyze = None
+    if args.analyze:
+        from Fundamental.fundamental_analysis import analyze_document as analyze
+
+    sellers = requests.get(f'{API_URL}/stocks').json()
+    client = MongoClient(MONGO_URI)
+    crawl(sellers, client.stock_data.stock_fundamental, analyze, args.workers)
+    client.close()
+    invalidate_api_cache()
@@ -0,0 +1,124 @@
+import asyncio
+import json
+import os
+import uuid
+from collections import OrderedDict
+
+
+WORKERS = int(os.environ.get("FORECAST_WORKERS", 2))
+MAX_QUEUE = int(os.environ.get("FORECAST_MAX_QUEUE", 32))
+MAX_FINISHED = int(os.environ.get("FORECAST_MAX_FINISHED", 256))
+
+
+class QueueFull(Exception):
+    pass
+
+
+class ForecastJob:
+
+    def __init__(self, stock_id, version, model=None):
+        self.id = uuid.uuid4().hex
+        self.stock_id = stock_id
+        self.version = version
+        self.model = model
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.started = asyncio.Event()
+        self.finished = asyncio.Event()
+
+    def to_json(self):
+        job = {"job_id": self.id, "stock_id": self.stock_id, "status": self.status}
+        if self.status == "done":
+            job["result"] = self.result
+        if self.status == "failed":
+            job["error"] = self.error
+        return job
+
+    async def events(self):
+        """Server-sent events with the job's status, ending with its result or error."""
+        if not self.started.is_set():
+            yield self._event()
+            await self.started.wait()
+        if not self.finished.is_set():
+            yield self._event()
+            await self.finished.wait()
+        yield self._event()
+
+    def _event(self):
+        return f"event: {self.status}\ndata: {json.dumps(self.to_json())}\n\n"
+
+
+class ForecastQueue:
+    """
+    Runs forecasts as jobs on a fixed number of workers. Requests for a ticker,
+    data version and model that already have a job share it, and new jobs are
+    refused once max_queue of them are waiting. Finished jobs are kept for
+    polling until max_finished newer ones replace them.
+    """
+
+    def __init__(self, run, workers=WORKERS, max_queue=MAX_QUEUE, max_finished=MAX_FINISHED):
+        self.run = run
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_finished = max_finished
+        self.jobs = OrderedDict()
+        self._by_version = dict()
+        self._queue = None
+        self._tasks = []
+
+    def start(self):
+        self._queue = asyncio.Queue(self.max_queue)
+        self._tasks = [asyncio.create_task(self._work())
+                       for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, stock_id, version, model=None):
+        """Return the job forecasting this version of a ticker, queueing a new one if there is none."""
+        job = self._by_version.get((stock_id, version, model))
+        if job is not None:
+            return job
+        job = ForecastJob(stock_id, version, model)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFull(f"{self.max_queue} forecasts are already queued")
+        self._by_version[(stock_id, version, model)] = job
+        self.jobs[job.id] = job
+        self._trim()
+        return job
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    async def _work(self):
+        while True:
+            job = await self._queue.get()
+            job.status = "running"
+            job.started.set()
+            try:
+                job.result = await self.run(job.stock_id, job.model)
+                job.status = "done"
+            except Exception as e:
+                job.status = "failed"
+                job.error = str(e)
+                self._forget(job)
+            finally:
+                job.finished.set()
+                self._queue.task_done()
+
+    def _trim(self):
+        finished = [job for job in self.jobs.values() if job.finished.is_set()]
+        for job in finished[:max(0, len(finished) - self.max_finished)]:
+            del self.jobs[job.id]
+            self._forget(job)
+
+    def _forget(self, job):
+        key = (job.stock_id, job.version, job.model)
+        if self._by_version.get(key) is job:
+            del self._by_version[key]
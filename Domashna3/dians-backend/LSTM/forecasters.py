@@ -0,0 +1,64 @@
+import os
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+# Every forecaster returns the last known price followed by num_prediction
+# forecast prices, so the models can be swapped behind predictor.
+
+NUM_PREDICTION = 9
+AR_ORDER = int(os.environ.get("AR_ORDER", 5))
+AR_HISTORY = int(os.environ.get("AR_HISTORY", 500))
+AR_MS = float(os.environ.get("AR_MS", 2))
+
+
+class Forecaster:
+    """
+    A forecasting model. estimate_ms is what a forecast is expected to cost, so a
+    caller with a latency budget can pick the best model that fits it.
+    """
+    name = None
+    min_rows = 1
+
+    def estimate_ms(self, data, ticker=None):
+        raise NotImplementedError
+
+    def forecast(self, data, ticker=None, num_prediction=NUM_PREDICTION):
+        raise NotImplementedError
+
+
+class LastPriceForecaster(Forecaster):
+    """Repeats the last price, the fallback for tickers with too little history."""
+    name = "last_price"
+
+    def estimate_ms(self, data, ticker=None):
+        return 0
+
+    def forecast(self, data, ticker=None, num_prediction=NUM_PREDICTION):
+        return [int(data['last_transaction'].iloc[-1])] * (num_prediction + 1)
+
+
+class AutoregressiveForecaster(Forecaster):
+    """AR(p) with an intercept, fit by least squares on the recent prices and rolled forward."""
+    name = "ar"
+
+    def __init__(self, order=AR_ORDER, history=AR_HISTORY):
+        self.order = order
+        self.history = history
+        self.min_rows = 2 * order + 1
+
+    def estimate_ms(self, data, ticker=None):
+        return AR_MS
+
+    def forecast(self, data, ticker=None, num_prediction=NUM_PREDICTION):
+        prices = data['last_transaction'].to_numpy(dtype=float)[-self.history:]
+        design = sliding_window_view(prices[:-1], self.order)
+        design = np.column_stack([design, np.ones(len(design))])
+        coefficients = np.linalg.lstsq(
+            design, prices[self.order:], rcond=None)[0]
+
+        values = list(prices[-self.order:])
+        for _ in range(num_prediction):
+            values.append(
+                np.dot(coefficients[:-1], values[-self.order:]) + coefficients[-1])
+        return [int(x) for x in values[self.order - 1:]]
@@ -1,89 +1,397 @@
-from Technical.tech_analysis import parse_data
+from LSTM import model_registry
+from LSTM.forecasters import NUM_PREDICTION, AutoregressiveForecaster, Forecaster, LastPriceForecaster
+from Monitoring.tracing import span, traced
+from collections import OrderedDict
 from datetime import datetime
+import math
+import os
 import numpy as np
 import pandas as pd
-from sklearn.model_selection import train_test_split
+import tensorflow as tf
 from keras.api.models import Sequential
 from keras.api.layers import LSTM, Dense
 import keras
 
 
-def predictor(data):
-    data = parse_data(data)
-    data = pd.DataFrame(data=data)
-    
-    data.drop(columns=['min_value', 'max_value', 'volume'], inplace=True)
+LAG = 5
+MIN_ROWS = 50
+BATCH_SIZE = 16
+FINE_TUNE_EPOCHS = int(os.environ.get("LSTM_FINE_TUNE_EPOCHS", 2))
+REPLAY_SIZE = int(os.environ.get("LSTM_REPLAY_SIZE", 256))
+# after this many fine-tunes a model is trained from scratch again
+MAX_FINE_TUNES = int(os.environ.get("LSTM_MAX_FINE_TUNES", 30))
+# expected cost of an LSTM forecast, depending on what the registry already holds
+LSTM_CACHED_MS = float(os.environ.get("LSTM_CACHED_MS", 5))
+LSTM_LOAD_MS = float(os.environ.get("LSTM_LOAD_MS", 1500))
+LSTM_FINE_TUNE_MS = float(os.environ.get("LSTM_FINE_TUNE_MS", 5000))
+LSTM_TRAIN_MS = float(os.environ.get("LSTM_TRAIN_MS", 30000))
+# loaded models kept per process, so a forecast does not read its model from disk
+MODEL_CACHE_SIZE = int(os.environ.get("LSTM_MODEL_CACHE_SIZE", 16))
 
-    data['date'] = pd.to_datetime(data['date'], dayfirst=True)
-    data = data[::-1]
-    data.set_index('date', inplace=True)
+_models = OrderedDict()
 
-    if len(data) < 50:
-        forecast = [int(data['last_transaction'][-1])] * 10
-        forecast_start_date = datetime.today()
-        forecast_dates = [date.strftime("%d.%m.%Y") for date in pd.date_range(
-            start=forecast_start_date, periods=10).tolist()]
-        return {"forecast": forecast, "forecast_dates": forecast_dates, "dates": [datetime.strftime(date, "%d.%m.%Y") for date in data.index],
-                "prices": data['last_transaction'].tolist()}
 
-    lag = 5
-    periods = range(lag, 0, -1)
-    data = pd.concat([data, data.shift(periods=periods)], axis=1)
+def prepare_data(columns):
+    """Price frame indexed by date, oldest first, from a ticker's typed price columns."""
+    return pd.DataFrame({"last_transaction": columns["last_transaction"]},
+                        index=pd.DatetimeIndex(columns["date"], name="date"))
 
-    data.dropna(axis=0, inplace=True)
 
-    x, y = data.drop(columns=['last_transaction']), data['last_transaction']
-    train_x, test_x, train_y, test_y = train_test_split(
-        x, y, test_size=0.3, shuffle=False)
+def scale(values, scaler):
+    price_range = scaler["max"] - scaler["min"]
+    return (values - scaler["min"]) / (price_range if price_range != 0 else 1)
 
-    train_x = train_x.values.reshape(
-        train_x.shape[0], lag, (train_x.shape[1] // lag))
-    test_x = test_x.values.reshape(
-        test_x.shape[0], lag, (test_x.shape[1] // lag))
+
+def unscale(values, scaler):
+    price_range = scaler["max"] - scaler["min"]
+    return values * (price_range if price_range != 0 else 1) + scaler["min"]
+
+
+def out_of_range(metadata, data):
+    """Whether prices left the range a model's scaler was fitted on, which fine-tuning cannot learn."""
+    prices = data['last_transaction'].to_numpy(dtype=float)
+    scaler = metadata["scaler"]
+    return bool(prices.min() < scaler["min"] or prices.max() > scaler["max"])
+
+
+def windows_dataset(prices, targets, lag, shuffle=False):
+    """
+    Streams (previous lag prices, price) training pairs for the target positions
+    of a scaled price array, slicing each window on the fly.
+    """
+    prices = tf.constant(prices, dtype=tf.float32)
+    dataset = tf.data.Dataset.from_tensor_slices(np.asarray(targets, dtype=np.int64))
+    if shuffle:
+        dataset = dataset.shuffle(len(targets))
+    dataset = dataset.map(lambda t: (prices[t - lag:t, None], prices[t]),
+                          num_parallel_calls=tf.data.AUTOTUNE)
+    return dataset.batch(BATCH_SIZE).prefetch(tf.data.AUTOTUNE)
+
+
+def train_model(data):
+    """Train a new LSTM on a prepared price frame and return it with its metadata."""
+    prices = data['last_transaction'].to_numpy(dtype=float)
+    scaler = {"min": float(prices.min()), "max": float(prices.max())}
+    prices = scale(prices, scaler)
+
+    lag = LAG
+    # the oldest 70% of the windows are used, the newest 20% of those for validation
+    targets = np.arange(lag, len(prices))
+    train_count = len(targets) - math.ceil(len(targets) * 0.3)
+    fit_count = math.ceil(train_count * 0.8)
 
     model = Sequential()
     model.add(LSTM(100,  activation='relu', input_shape=(
-        train_x.shape[1], train_x.shape[2]), return_sequences=True))
+        lag, 1), return_sequences=True))
     model.add(LSTM(50,  activation='relu'))
     model.add(Dense(1, activation='linear'))
 
     model.compile(loss=keras.losses.MeanSquaredError(), optimizer=keras.optimizers.Adam(
     ), metrics=[keras.metrics.MeanSquaredError(), keras.metrics.MeanAbsoluteError()])
 
-    history = model.fit(train_x, train_y, batch_size=16,
-                        validation_split=0.2, epochs=5, shuffle=False)
+    with span("lstm.fit"):
+        model.fit(windows_dataset(prices, targets[:fit_count], lag),
+                  validation_data=windows_dataset(
+                      prices, targets[fit_count:train_count], lag),
+                  epochs=5)
+
+    metadata = {
+        "last_date": datetime.strftime(data.index[-1], "%d.%m.%Y"),
+        "rows": len(data),
+        "lag": lag,
+        "scaler": scaler,
+        "trained_at": datetime.now().isoformat(timespec="seconds"),
+        "fine_tunes": 0,
+    }
+    return model, metadata
+
+
+def fine_tune_model(model, metadata, data):
+    """
+    Continue training a model on the windows that end after its last_date, mixed
+    with a random replay sample of the older windows so it keeps what it learned.
+    """
+    lag = metadata["lag"]
+    prices = scale(data['last_transaction'].to_numpy(dtype=float), metadata["scaler"])
+    known = int(np.searchsorted(data.index.values, np.datetime64(
+        datetime.strptime(metadata["last_date"], "%d.%m.%Y")), side="right"))
+    new_targets = np.arange(max(known, lag), len(prices))
+    old_targets = np.arange(lag, max(known, lag))
+    replay = np.random.default_rng().choice(
+        old_targets, min(REPLAY_SIZE, len(old_targets)), replace=False)
+
+    with span("lstm.fine_tune"):
+        model.fit(windows_dataset(prices, np.concatenate([new_targets, replay]), lag, shuffle=True),
+                  epochs=FINE_TUNE_EPOCHS, verbose=0)
+
+    metadata = {key: value for key, value in metadata.items() if key != "forecast"}
+    metadata.update({
+        "last_date": datetime.strftime(data.index[-1], "%d.%m.%Y"),
+        "rows": len(data),
+        "tuned_at": datetime.now().isoformat(timespec="seconds"),
+        "fine_tunes": metadata.get("fine_tunes", 0) + 1,
+    })
+    return model, metadata
+
+
+def update_model(model, metadata, data):
+    """
+    Fine-tune the previous model on the new bars, or train a new one when there
+    is none to build on or the prices left the range of its scaler.
+    """
+    if (model is None or metadata["lag"] != LAG or metadata.get("fine_tunes", 0) >= MAX_FINE_TUNES
+            or out_of_range(metadata, data)):
+        return train_model(data)
+    return fine_tune_model(model, metadata, data)
+
+
+def _remember(ticker, version, model, metadata):
+    _models[ticker] = (version, model, metadata)
+    _models.move_to_end(ticker)
+    while len(_models) > MODEL_CACHE_SIZE:
+        _models.popitem(last=False)
+
+
+def load_model(ticker):
+    """
+    The registry model of a ticker, loaded once per process and loaded again
+    only when its registry entry was saved since.
+    """
+    version = model_registry.entry_version(ticker)
+    cached = _models.get(ticker)
+    if cached is not None and cached[0] == version:
+        _models.move_to_end(ticker)
+        return cached[1], cached[2]
+    with span("model_load.lstm"):
+        model, metadata = model_registry.load_model(ticker)
+    if model is not None:
+        _remember(ticker, version, model, metadata)
+    return model, metadata
+
+
+def get_model(ticker, data):
+    """Return the registry model for a ticker, fine-tuning it if the data is newer."""
+    last_date = datetime.strftime(data.index[-1], "%d.%m.%Y")
+    model, metadata = load_model(ticker)
+    if model is None or model_registry.is_stale(metadata, last_date):
+        model, metadata = update_model(model, metadata, data)
+        model_registry.save_model(ticker, model, metadata)
+        _remember(ticker, model_registry.entry_version(ticker), model, metadata)
+    return model, metadata
+
+
+def architecture(model):
+    """
+    The layer types, activations and weight shapes of a model, or None when it
+    has a layer the stacked rollout cannot run. Models with equal architectures
+    can be forecast together.
+    """
+    layers = []
+    for layer in model.layers:
+        config = layer.get_config()
+        shapes = tuple(tuple(weight.shape) for weight in layer.weights)
+        if isinstance(layer, LSTM) and config["use_bias"] and not config["go_backwards"] and not config["stateful"]:
+            layers.append(("lstm", config["activation"], config["recurrent_activation"],
+                           config["return_sequences"], shapes))
+        elif isinstance(layer, Dense) and config["use_bias"]:
+            layers.append(("dense", config["activation"], shapes))
+        else:
+            return None
+    return tuple(layers)
+
+
+def _forward(layers, weights, windows):
+    """
+    One step of every model in a stack: row m of the (models, lag) windows goes
+    through the weights of model m, written out as LSTM cells over the stacked
+    (models, ...) weights so that all models run in the same operations.
+    """
+    x = windows[:, :, None]
+    weights = iter(weights)
+    for layer in layers:
+        activation = keras.activations.get(layer[1])
+        if layer[0] == "dense":
+            kernel, bias = next(weights), next(weights)
+            x = activation(tf.einsum("mf,mfk->mk", x, kernel) + bias)
+            continue
+        kernel, recurrent, bias = next(weights), next(weights), next(weights)
+        recurrent_activation = keras.activations.get(layer[2])
+        h = c = tf.zeros([tf.shape(x)[0], recurrent.shape[1]])
+        outputs = []
+        for t in range(x.shape[1]):
+            z = tf.einsum("mf,mfk->mk", x[:, t], kernel) + tf.einsum("mu,muk->mk", h, recurrent) + bias
+            # keras orders the gates input, forget, cell, output
+            i, f, g, o = tf.split(z, 4, axis=-1)
+            c = recurrent_activation(f) * c + recurrent_activation(i) * activation(g)
+            h = recurrent_activation(o) * activation(c)
+            outputs.append(h)
+        x = tf.stack(outputs, axis=1) if layer[3] else h
+    return x
+
+
+@tf.function
+def _stacked_rollout(layers, weights, windows, num_prediction):
+    # the weights are arguments rather than captured, so no model is kept alive
+    # by the trace and every model of an architecture reuses it
+    outputs = []
+    for _ in range(num_prediction):
+        out = _forward(layers, weights, windows)
+        outputs.append(out)
+        windows = tf.concat([windows[:, 1:], out], axis=1)
+    return tf.concat(outputs, axis=1)
+
+
+def rollout(models, windows, num_prediction=NUM_PREDICTION):
+    """
+    Feeds row m of a (len(models), lag) array of scaled prices back through
+    models[m] for num_prediction steps and returns the (len(models), num_prediction)
+    steps. The models must share an architecture, and run as one compiled call.
+    """
+    layers = architecture(models[0])
+    weights = [tf.constant(np.stack(stacked), dtype=tf.float32)
+               for stacked in zip(*[model.get_weights() for model in models])]
+    with span("lstm.predict"):
+        return _stacked_rollout(layers, weights, tf.constant(windows, dtype=tf.float32),
+                                num_prediction).numpy()
+
+
+def _eager_rollout(model, windows, num_prediction):
+    outputs = []
+    for _ in range(num_prediction):
+        out = model(windows[:, :, None], training=False).numpy()
+        outputs.append(out)
+        windows = np.concatenate([windows[:, 1:], out], axis=1)
+    return np.concatenate(outputs, axis=1)
+
+
+def forecast_batch(entries, num_prediction=NUM_PREDICTION):
+    """
+    Forecasts a list of (model, metadata, data) entries. The models of entries
+    that share an architecture are stacked and forecast in one rollout; a model
+    the rollout cannot run is called step by step on its own.
+    """
+    windows = []
+    groups = dict()
+    for i, (model, metadata, data) in enumerate(entries):
+        prices = data['last_transaction'].to_numpy(dtype=float)
+        windows.append(scale(prices[-metadata["lag"]:], metadata["scaler"]))
+        key = architecture(model)
+        groups.setdefault(key if key is not None else ("model", i), []).append(i)
+
+    results = [None] * len(entries)
+    for key, indices in groups.items():
+        stacked = np.stack([windows[i] for i in indices])
+        if key[0] == "model":
+            steps = _eager_rollout(entries[indices[0]][0], stacked, num_prediction)
+        else:
+            steps = rollout([entries[i][0] for i in indices], stacked, num_prediction)
+        for i, step in zip(indices, steps):
+            # the forecast starts at the last known price like the original loop did
+            values = unscale(np.append(windows[i][-1], step), entries[i][1]["scaler"])
+            results[i] = [int(x) for x in values]
+    return results
+
+
+def forecast(model, metadata, data, num_prediction=NUM_PREDICTION):
+    return forecast_batch([(model, metadata, data)], num_prediction)[0]
+
+
+def precomputed_forecast(ticker, data):
+    """The forecast stored by the nightly precomputation, if it was made from the same data."""
+    metadata = model_registry.load_metadata(ticker)
+    last_date = datetime.strftime(data.index[-1], "%d.%m.%Y")
+    if metadata is None or metadata["last_date"] != last_date:
+        return None
+    return metadata.get("forecast")
+
+
+def predict_dates(num_prediction):
+    last_date = datetime.today()
+    prediction_dates = pd.date_range(
+        last_date, periods=num_prediction+1).tolist()
+    return [datetime.strftime(pd.to_datetime(
+        date), "%d.%m.%Y") for date in prediction_dates]
+
+
+class LstmForecaster(Forecaster):
+    """The registry LSTM, served from the precomputed forecast when there is one."""
+    name = "lstm"
+    min_rows = MIN_ROWS
+
+    def estimate_ms(self, data, ticker=None):
+        if ticker is None:
+            return LSTM_TRAIN_MS
+        metadata = model_registry.load_metadata(ticker)
+        last_date = datetime.strftime(data.index[-1], "%d.%m.%Y")
+        if metadata is None:
+            return LSTM_TRAIN_MS
+        if model_registry.is_stale(metadata, last_date):
+            return LSTM_TRAIN_MS if out_of_range(metadata, data) else LSTM_FINE_TUNE_MS
+        if metadata["last_date"] == last_date and "forecast" in metadata:
+            return LSTM_CACHED_MS
+        return LSTM_LOAD_MS
+
+    def forecast(self, data, ticker=None, num_prediction=NUM_PREDICTION):
+        if ticker is not None and num_prediction == NUM_PREDICTION:
+            values = precomputed_forecast(ticker, data)
+            if values is not None:
+                return values
+        if ticker is None:
+            model, metadata = train_model(data)
+        else:
+            model, metadata = get_model(ticker, data)
+        return forecast(model, metadata, data, num_prediction)
+
+
+# best first, the last one always fits
+FORECASTERS = {forecaster.name: forecaster for forecaster in [
+    LstmForecaster(), AutoregressiveForecaster(), LastPriceForecaster()]}
 
-    preds = model.predict(test_x)
 
-    look_back = lag
-    to_predict = test_x[-look_back]
+def forecaster_for_rows(rows):
+    """The best forecaster with enough rows, which select_forecaster picks when there is no budget."""
+    return next(forecaster for forecaster in FORECASTERS.values() if rows >= forecaster.min_rows)
 
-    def predict(num_prediction, model):
-        prediction_list = to_predict[-look_back:]
 
-        for _ in range(num_prediction):
-            pred = prediction_list[-look_back:]
-            pred = pred.reshape((1, look_back, 1))
-            out = model.predict(pred)[0][0]
-            prediction_list = np.append(prediction_list, out)
-        prediction_list = prediction_list[look_back-1:]
+def select_forecaster(data, ticker=None, budget_ms=None):
+    """The best forecaster that has enough rows and is expected to fit in budget_ms."""
+    if budget_ms is None:
+        return forecaster_for_rows(len(data))
+    for forecaster in FORECASTERS.values():
+        if len(data) < forecaster.min_rows:
+            continue
+        if forecaster.estimate_ms(data, ticker) <= budget_ms:
+            return forecaster
+    return FORECASTERS["last_price"]
 
-        return prediction_list
 
-    def predict_dates(num_prediction):
-        last_date = datetime.today()
-        prediction_dates = pd.date_range(
-            last_date, periods=num_prediction+1).tolist()
-        return prediction_dates
+@traced("lstm.predictor")
+def predictor(columns, ticker=None, model=None, budget_ms=None):
+    """
+    Forecasts the next prices from a ticker's price columns with the named model,
+    or with the best one that fits budget_ms. When a ticker is given the LSTM is
+    served from the registry and only fine-tuned when newer bars are available.
+    """
+    data = prepare_data(columns)
+    forecaster = FORECASTERS[model] if model else select_forecaster(
+        data, ticker, budget_ms)
+    if len(data) < forecaster.min_rows:
+        forecaster = select_forecaster(data, ticker, budget_ms)
 
-    num_prediction = 9
-    forecast = predict(num_prediction, model)
-    forecast_dates = predict_dates(num_prediction)
+    forecast_values = forecaster.forecast(data, ticker)
+    forecast_dates = predict_dates(NUM_PREDICTION)
 
-    forecast = [int(x) for x in forecast]
+    history = data.iloc[LAG:] if len(data) >= MIN_ROWS else data
+    return {"model": forecaster.name, "forecast": forecast_values, "forecast_dates": forecast_dates, "dates": [datetime.strftime(date, "%d.%m.%Y") for date in history.index[-min(500, len(history.index)):]],
+            "prices": history['last_transaction'].tolist()[-min(500, len(history['last_transaction'])):]}
 
-    forecast_dates = [datetime.strftime(pd.to_datetime(
-        date), "%d.%m.%Y") for date in forecast_dates]
 
-    return {"forecast": forecast, "forecast_dates": forecast_dates, "dates": [datetime.strftime(date, "%d.%m.%Y") for date in data.index[-min(500, len(data.index)):]],
-            "prices": data['last_transaction'].tolist()[-min(500, len(data['last_transaction'])):]}
+def budget_predictor(columns, ticker, budget_ms):
+    """
+    The prediction of the best model expected to fit budget_ms, or None when
+    that is the LSTM, which the caller runs on the forecast queue instead.
+    """
+    forecaster = select_forecaster(prepare_data(columns), ticker, budget_ms)
+    if forecaster.name == "lstm":
+        return None
+    return predictor(columns, ticker, forecaster.name)
@@ -0,0 +1,69 @@
+import json
+import os
+from datetime import datetime
+import keras
+
+
+REGISTRY_DIR = os.environ.get(
+    "LSTM_REGISTRY_DIR", os.path.join(os.path.dirname(__file__), "models"))
+
+
+def _entry_dir(ticker: str):
+    return os.path.join(REGISTRY_DIR, ticker.upper())
+
+
+def load_metadata(ticker: str):
+    """Return the stored metadata for a ticker, or None if it was never trained."""
+    path = os.path.join(_entry_dir(ticker), "metadata.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def entry_version(ticker: str):
+    """The modification time of a ticker's metadata, which changes with every save, or None."""
+    try:
+        return os.stat(os.path.join(_entry_dir(ticker), "metadata.json")).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def load_model(ticker: str):
+    """Load the cached model and its metadata for a ticker."""
+    metadata = load_metadata(ticker)
+    if metadata is None:
+        return None, None
+    path = os.path.join(_entry_dir(ticker), "model.keras")
+    if not os.path.exists(path):
+        return None, None
+    return keras.models.load_model(path), metadata
+
+
+def save_model(ticker: str, model, metadata: dict):
+    """Store the model weights and metadata for a ticker."""
+    directory = _entry_dir(ticker)
+    os.makedirs(directory, exist_ok=True)
+    # keras only saves to a .keras path, the rename keeps a reader from loading a half-written model
+    tmp_path = os.path.join(directory, "model.tmp.keras")
+    model.save(tmp_path)
+    os.replace(tmp_path, os.path.join(directory, "model.keras"))
+    # metadata is written last so a half-written entry is never picked up
+    save_metadata(ticker, metadata)
+
+
+def save_metadata(ticker: str, metadata: dict):
+    """Atomically replace the stored metadata of a ticker."""
+    directory = _entry_dir(ticker)
+    tmp_path = os.path.join(directory, "metadata.json.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(metadata, f)
+    os.replace(tmp_path, os.path.join(directory, "metadata.json"))
+
+
+def is_stale(metadata, last_date: str):
+    """Check whether a stored model was trained on data older than last_date."""
+    if metadata is None:
+        return True
+    trained_on = datetime.strptime(metadata["last_date"], "%d.%m.%Y")
+    return trained_on < datetime.strptime(last_date, "%d.%m.%Y")
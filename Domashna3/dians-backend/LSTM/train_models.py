@@ -0,0 +1,87 @@
+import argparse
+import asyncio
+import os
+from datetime import datetime
+from motor.motor_asyncio import AsyncIOMotorClient
+from Data.repository import get_repository
+from LSTM import model_registry
+from LSTM.lstm_predictor import forecast_batch, prepare_data, train_model, update_model
+
+
+MONGO_URI = os.environ.get("MONGODB_URI", "mongodb://localhost:27017")
+# tickers loaded and forecast together by the precomputation
+PRECOMPUTE_BATCH = int(os.environ.get("LSTM_PRECOMPUTE_BATCH", 32))
+
+
+def train_ticker(ticker, columns, force=False):
+    """Train or fine-tune and store the model for one ticker if the registry entry is missing or stale."""
+    data = prepare_data(columns)
+    if len(data) < 50:
+        return "skipped"
+    last_date = datetime.strftime(data.index[-1], "%d.%m.%Y")
+    metadata = model_registry.load_metadata(ticker)
+    if not force and not model_registry.is_stale(metadata, last_date):
+        return "up to date"
+    if force:
+        model, metadata = train_model(data)
+    else:
+        model, metadata = update_model(*model_registry.load_model(ticker), data)
+    model_registry.save_model(ticker, model, metadata)
+    return "fine-tuned" if metadata["fine_tunes"] else "trained"
+
+
+def precompute_forecasts(frames, batch_size=PRECOMPUTE_BATCH):
+    """
+    Forecast every trained ticker of a {ticker: prepared data} dict and store the
+    results. The models are loaded batch_size at a time and each batch is forecast
+    together, so only one batch is held in memory.
+    """
+    count = 0
+    tickers = list(frames)
+    for start in range(0, len(tickers), batch_size):
+        entries = []
+        for ticker in tickers[start:start + batch_size]:
+            model, metadata = model_registry.load_model(ticker)
+            if model is not None:
+                entries.append((ticker, model, metadata, frames[ticker]))
+        forecasts = forecast_batch([entry[1:] for entry in entries])
+        for (ticker, _, metadata, _), values in zip(entries, forecasts):
+            metadata["forecast"] = values
+            model_registry.save_metadata(ticker, metadata)
+        count += len(entries)
+    return count
+
+
+async def train_all(tickers, force=False, forecast=False):
+    client = AsyncIOMotorClient(MONGO_URI)
+    repository = get_repository(client["stock_data"])
+
+    frames = dict()
+    for ticker in tickers or await repository.stock_ids():
+        columns = await repository.load_columns(ticker)
+        if columns is None or not len(columns["date"]):
+            continue
+        status = train_ticker(ticker, columns, force)
+        print(f"{ticker}: {status}")
+        if status != "skipped":
+            frames[ticker] = prepare_data(columns)
+
+    if forecast:
+        print(f"Precomputed {precompute_forecasts(frames)} forecasts")
+
+    client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Fill the LSTM model registry for the stored tickers.")
+    parser.add_argument("tickers", nargs="*",
+                        help="tickers to train, all of them when omitted")
+    parser.add_argument("--force", action="store_true",
+                        help="retrain even if the stored model is up to date")
+    parser.add_argument("--forecast", action="store_true",
+                        help="precompute the forecasts of the trained tickers")
+    args = parser.parse_args()
+
+    asyncio.run(train_all([t.upper() for t in args.tickers],
+                          args.force, args.forecast))
@@ -0,0 +1,107 @@
+import functools
+import inspect
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+
+# Named spans time the stages of a request. Every span is observed in the
+# stage histogram, and when the request is profiled it is also appended to
+# its stage list, which the API returns as a Server-Timing header. Work in the
+# process pool runs through call_traced, which sends its spans back with the
+# result so they are recorded in the API process. Spans named model_load.<model>
+# are model loads and also go to the model load histogram.
+
+STAGE_SECONDS = Histogram(
+    "stage_duration_seconds", "Time spent in a named stage of a request", ["stage"],
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60))
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Latency of the API requests", ["method", "route", "status"])
+RESPONSE_BYTES = Histogram(
+    "http_response_size_bytes", "Size of the API response bodies", ["route"],
+    buckets=(100, 1000, 10_000, 50_000, 100_000, 500_000, 1_000_000, 5_000_000))
+CACHE_REQUESTS = Counter(
+    "cache_requests_total", "Lookups of the caches, by cache and result", ["cache", "result"])
+MODEL_LOAD_SECONDS = Histogram(
+    "model_load_seconds", "Time spent loading a model", ["model"],
+    buckets=(.01, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60, 120))
+
+_stages = ContextVar("stages", default=None)
+
+
+def record(name, seconds):
+    STAGE_SECONDS.labels(name).observe(seconds)
+    if name.startswith("model_load."):
+        MODEL_LOAD_SECONDS.labels(name.removeprefix("model_load.")).observe(seconds)
+    stages = _stages.get()
+    if stages is not None:
+        stages.append((name, seconds))
+
+
+@contextmanager
+def span(name):
+    """Time the enclosed block as the stage name."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+def traced(name):
+    """Decorator that times every call of a function, sync or async, as the stage name."""
+    def decorator(function):
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await function(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count_cache(cache, hit):
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def start_profile():
+    """Collect the spans of the current context from now on, returning the token to stop with."""
+    return _stages.set([])
+
+
+def stop_profile(token):
+    """The (stage, seconds) spans collected since start_profile."""
+    stages = _stages.get()
+    _stages.reset(token)
+    return stages
+
+
+def call_traced(function, *args):
+    """Run function in a worker process and return its result with the spans it recorded."""
+    token = start_profile()
+    try:
+        return function(*args), _stages.get()
+    finally:
+        _stages.reset(token)
+
+
+def record_all(stages):
+    for name, seconds in stages:
+        record(name, seconds)
+
+
+def server_timing(stages):
+    """A Server-Timing header of the spans, in milliseconds, in the order they ended."""
+    return ", ".join(f"{name};dur={seconds * 1000:.2f}"
+                     for name, seconds in stages)
+
+
+def metrics():
+    """The metrics in the Prometheus text format, with its content type."""
+    return generate_latest(), CONTENT_TYPE_LATEST
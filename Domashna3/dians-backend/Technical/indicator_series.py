@@ -0,0 +1,322 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from Data.parser import format_dates, PRICE_FIELDS
+from Technical.tech_analysis import (ICHIMOKU_NEUTRAL_PERCENT, ICHIMOKU_STRONG_PERCENT, MOMENTUM_LABELS,
+                                     MOMENTUM_THRESHOLDS, OSCILLATOR_LABELS, OSCILLATOR_THRESHOLDS,
+                                     ULTIMATE_THRESHOLDS, WILLIAMS_THRESHOLDS)
+
+# The functions in this module take chronological arrays (oldest bar first) and
+# return one value per bar. The value at bar t equals what tech_results returns
+# for the window of bars ending at t, so the last point of every series matches
+# /technical_analysis. Bars without enough history are NaN.
+
+
+def float_columns(columns):
+    """Float copies of typed price columns, with the dates formatted as strings."""
+    result = {"date": format_dates(columns["date"])}
+    for part in PRICE_FIELDS:
+        result[part] = columns[part].astype(float)
+    return result
+
+
+def _aligned(values, window, n):
+    """Place the values of windows ending at bars window-1..n-1 into an n-length series."""
+    out = np.full(n, np.nan)
+    out[window - 1:] = values
+    return out
+
+
+def rolling_sum(values, window):
+    cumsum = np.concatenate(([0.0], np.cumsum(values, dtype=float)))
+    return _aligned(cumsum[window:] - cumsum[:-window], window, len(values))
+
+
+def _rolling_extreme(values, window, combine, fill):
+    # van Herk / Gil-Werman: prefix and suffix extremes inside blocks of length
+    # window give the extreme of any window from two lookups, in O(n)
+    n = len(values)
+    padded_length = -(-n // window) * window
+    padded = np.full(padded_length, fill, dtype=float)
+    padded[:n] = values
+    blocks = padded.reshape(-1, window)
+    prefix = combine.accumulate(blocks, axis=1).ravel()
+    suffix = combine.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+    starts = np.arange(n - window + 1)
+    extreme = combine(suffix[starts], prefix[starts + window - 1])
+    return _aligned(extreme, window, n)
+
+
+def rolling_max(values, window):
+    return _rolling_extreme(values, window, np.maximum, -np.inf)
+
+
+def rolling_min(values, window):
+    return _rolling_extreme(values, window, np.minimum, np.inf)
+
+
+def classify(values, thresholds, labels):
+    """
+    Maps indicator values to signals the way classify_signal does: 0 is
+    neutral, otherwise the first threshold the value is at or below wins.
+    """
+    conditions = [values == 0] + [values <= t for t in thresholds]
+    signals = np.select(conditions, ["neutral"] + labels[:-1], labels[-1])
+    signals = signals.astype(object)
+    signals[np.isnan(values)] = None
+    return signals
+
+
+def rsi_series(prices, window):
+    n = len(prices)
+    if window < 2 or n < window:
+        values = np.zeros(n) if window < 2 else np.full(n, np.nan)
+        return values, classify(values, OSCILLATOR_THRESHOLDS, OSCILLATOR_LABELS)
+    # the point indicator diffs newest-first prices, so its gains are the drops
+    changes = np.diff(prices, prepend=prices[0])
+    gains = rolling_sum(np.where(changes < 0, -changes, 0), window - 1)
+    losses = rolling_sum(np.where(changes > 0, changes, 0), window - 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = 100 - (100 / (1 + gains / losses))
+    rsi = np.where(losses == 0, 0, np.round(rsi, 3))
+    rsi[:window - 1] = np.nan
+    return rsi, classify(rsi, OSCILLATOR_THRESHOLDS, OSCILLATOR_LABELS)
+
+
+def momentum_series(prices, window):
+    n = len(prices)
+    values = np.full(n, np.nan)
+    past = prices[:n - window + 1]
+    values[window - 1:] = np.round((prices[window - 1:] - past) / past * 100, 3)
+    return values, classify(values, MOMENTUM_THRESHOLDS, MOMENTUM_LABELS)
+
+
+def williams_percent_range_series(prices, window):
+    # the point indicator always looks at a single bar, which yields 0
+    values = np.where(np.arange(len(prices)) >= window - 1, 0.0, np.nan)
+    return values, classify(values, WILLIAMS_THRESHOLDS, OSCILLATOR_LABELS)
+
+
+def stochastic_oscillator_series(prices, window):
+    highest_high = rolling_max(prices, window)
+    lowest_low = rolling_min(prices, window)
+    span = highest_high - lowest_low
+    with np.errstate(divide="ignore", invalid="ignore"):
+        values = np.round(100 * (prices - lowest_low) / span, 3)
+    values = np.where(span == 0, 0, values)
+    return values, classify(values, OSCILLATOR_THRESHOLDS, OSCILLATOR_LABELS)
+
+
+def ultimate_oscillator_series(last, low, high, window):
+    n = len(last)
+    buying_pressure = np.concatenate(([0.0], np.cumsum(last - low)))
+    true_range = np.concatenate(([0.0], np.cumsum(high - low)))
+    starts = np.arange(n - window + 1)
+    averages = []
+    for period in [7, 14, 28]:
+        if window < period:
+            averages.append(np.zeros(len(starts)))
+            continue
+        # the point indicator sums the oldest bars of its window
+        bp_sum = buying_pressure[starts + period] - buying_pressure[starts]
+        tr_sum = true_range[starts + period] - true_range[starts]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            averages.append(np.where(tr_sum != 0, bp_sum / tr_sum, 0))
+    values = np.round(
+        100 * ((4 * averages[0]) + (2 * averages[1]) + averages[2]) / 7, 3)
+    values = _aligned(values, window, n)
+    return values, classify(values, ULTIMATE_THRESHOLDS, OSCILLATOR_LABELS)
+
+
+def sma_series(prices, window):
+    return np.round(rolling_sum(prices, window) / window, 3)
+
+
+def ema_series(prices, window, span):
+    """
+    EMA seeded on the oldest bar of each window and advanced for span bars,
+    which is what calculate_ema returns for a window of prices. Works along
+    the last axis, so a (tickers, bars) batch gives one series per ticker.
+    """
+    n = prices.shape[-1]
+    alpha = 2 / (span + 1.0)
+    weights = alpha * (1 - alpha) ** np.arange(span - 1, -1, -1)
+    weights[0] = (1 - alpha) ** (span - 1)
+    values = np.full(prices.shape, np.nan)
+    if n >= window:
+        ema = sliding_window_view(prices[..., :n - window + span], span, axis=-1) @ weights
+        values[..., window - 1:] = np.round(ema, 3)
+    return values
+
+
+def _reversed_wma(values, period):
+    # tech_analysis.weighted_moving_average convolves, which flips the kernel,
+    # so the largest weight is on the oldest bar
+    weights = np.arange(1, period + 1)
+    return sliding_window_view(values, period, axis=-1) @ (weights / weights.sum())[::-1]
+
+
+def hull_moving_average_series(prices, period, window):
+    """hull_moving_average of the window ending at every bar, along the last axis like ema_series."""
+    n = prices.shape[-1]
+    half_period = period // 2
+    sqrt_period = int(np.sqrt(period))
+    # with a window too short for the full look-back, the point indicator's
+    # final convolution only sees the last window - period + 1 differences
+    look_back = min(window - period + 1, sqrt_period)
+    values = np.full(prices.shape, np.nan)
+    if n < window:
+        return values
+    wma_half = _reversed_wma(prices, half_period)
+    wma_full = _reversed_wma(prices, period)
+    diff = 2 * wma_half[..., wma_half.shape[-1] - wma_full.shape[-1]:] - wma_full
+    weights = np.arange(1, sqrt_period + 1)
+    weights = (weights / weights.sum())[::-1][:look_back]
+    hma = sliding_window_view(diff, look_back, axis=-1) @ weights
+    values[..., period + look_back - 2:] = np.round(hma, 3)
+    values[..., :window - 1] = np.nan
+    return values
+
+
+def volume_weighted_moving_average_series(prices, volume, window):
+    weighted = rolling_sum(prices * volume, window)
+    volume_sum = rolling_sum(volume, window)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        values = np.where(volume_sum != 0, weighted / volume_sum, 0)
+    values = np.round(values, 3)
+    values[np.isnan(volume_sum)] = np.nan
+    return values
+
+
+def ichimoku_signals(current_price, base_line):
+    """ichimoku_signal for arrays of prices and base lines, None where the base line is NaN."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        percent_diff = (current_price - base_line) / base_line * 100
+    signals = np.select(
+        [np.abs(percent_diff) < ICHIMOKU_NEUTRAL_PERCENT, percent_diff <= -ICHIMOKU_STRONG_PERCENT,
+         percent_diff < 0, percent_diff <= ICHIMOKU_STRONG_PERCENT],
+        ["neutral", "strong_sell", "sell", "buy"], "strong_buy").astype(object)
+    signals[base_line == 0] = "neutral"
+    signals[np.isnan(base_line)] = None
+    values = np.where(base_line == 0, 0, np.round(base_line, 3))
+    return values, signals
+
+
+def ichimoku_base_line_series(last, low, high, window):
+    n = len(last)
+    base_line = (rolling_max(high, window) + rolling_min(low, window)) / 2
+    # the point indicator compares against the oldest price of its window
+    current_price = np.full(n, np.nan)
+    current_price[window - 1:] = last[:n - window + 1]
+    return ichimoku_signals(current_price, base_line)
+
+
+def compare_moving_averages_series(price, sma, ema, hma, vwma):
+    above_count = ((price > sma).astype(int) + (price > ema) +
+                   (price > hma) + (price > vwma))
+    trending_up = (hma > ema) & (ema > sma)
+    trending_down = (hma < ema) & (ema < sma)
+    signals = np.select(
+        [(price == 0) | (sma == 0),
+         (above_count >= 3) & trending_up,
+         above_count >= 2,
+         above_count == 1,
+         (above_count == 0) & trending_down],
+        ["neutral", "strong_buy", "buy", "sell", "strong_sell"], "sell").astype(object)
+    signals[np.isnan(sma) | np.isnan(ema) | np.isnan(hma) | np.isnan(vwma)] = None
+    return signals
+
+
+def overall_signal_series(signal_columns):
+    """Majority vote over the per-indicator signals, neutral on ties."""
+    labels = ["strong_sell", "sell", "neutral", "buy", "strong_buy"]
+    stacked = np.array(signal_columns, dtype=object)
+    counts = np.stack([(stacked == label).sum(axis=0) for label in labels])
+    best = counts.max(axis=0)
+    ties = (counts == best).sum(axis=0) > 1
+    overall = np.array(labels, dtype=object)[counts.argmax(axis=0)]
+    overall[ties] = "neutral"
+    overall[np.any(stacked == None, axis=0)] = None
+    return overall
+
+
+def indicator_series(columns, window):
+    """
+    Computes every indicator of tech_results over the whole history for one
+    window size, returning chronological value and signal series.
+    """
+    last = columns["last_transaction"]
+    low = columns["min_value"]
+    high = columns["max_value"]
+    volume = columns["volume"]
+    window = max(2, min(window, len(last)))
+    ma_window = min(window, 10)
+
+    result = dict()
+    result["rsi"] = rsi_series(last, window)
+    result["momentum"] = momentum_series(last, window)
+    result["williams_percent_range"] = williams_percent_range_series(
+        last, window)
+    result["stochastic_oscillator"] = stochastic_oscillator_series(
+        last, window)
+    result["ultimate_oscillator"] = ultimate_oscillator_series(
+        last, low, high, window)
+    sma = sma_series(last, ma_window)
+    sma[:window - 1] = np.nan
+    ema = ema_series(last, window, ma_window)
+    hma = hull_moving_average_series(last, min(9, window), window)
+    vwma = volume_weighted_moving_average_series(last, volume, window)
+    result["sma"] = sma
+    result["ema"] = ema
+    result["hull_moving_average"] = hma
+    result["volume_weighted_average_price"] = vwma
+    result["ma_comparison"] = compare_moving_averages_series(
+        last, sma, ema, hma, vwma)
+    result["ichimoku_base_line"] = ichimoku_base_line_series(
+        last, low, high, window)
+    result["overall_signal"] = overall_signal_series([
+        result["rsi"][1],
+        result["momentum"][1],
+        result["williams_percent_range"][1],
+        result["stochastic_oscillator"][1],
+        result["ultimate_oscillator"][1],
+        # get_overall_signal compares the averages against the sma itself
+        compare_moving_averages_series(sma, sma, ema, hma, vwma),
+        result["ichimoku_base_line"][1],
+    ])
+    return result
+
+
+def _to_json(values):
+    if values.dtype == object:
+        return values.tolist()
+    return [None if np.isnan(x) else float(x) for x in values]
+
+
+def series_results(columns, window, date_from=None, limit=None):
+    """
+    Indicator series for a ticker's typed price columns, ready for JSON.
+    date_from and limit keep only the bars from that date on and the last limit
+    bars, and only the window - 1 bars before those are computed to warm up.
+    """
+    n = len(columns["date"])
+    start = 0
+    if date_from is not None:
+        start = int(np.searchsorted(columns["date"], np.datetime64(date_from, "D")))
+    if limit is not None:
+        start = max(start, n - limit)
+    # every point only depends on the window bars ending at it
+    warm_up = max(2, min(window, n)) - 1
+    begin = max(0, min(start - warm_up, n - warm_up - 1))
+    skip = start - begin
+
+    columns = float_columns({part: columns[part][begin:] for part in ["date", *PRICE_FIELDS]})
+    series = indicator_series(columns, window)
+    result = {"dates": columns["date"][skip:],
+              "prices": _to_json(columns["last_transaction"][skip:])}
+    for name, value in series.items():
+        if isinstance(value, tuple):
+            result[name] = {"values": _to_json(
+                value[0][skip:]), "signals": _to_json(value[1][skip:])}
+        else:
+            result[name] = _to_json(value[skip:])
+    return result
@@ -0,0 +1,287 @@
+import argparse
+import asyncio
+import os
+from collections import deque
+from datetime import timedelta
+import numpy as np
+from motor.motor_asyncio import AsyncIOMotorClient
+from Data.parser import format_dates
+from Data.queries import parse_date
+from Data.repository import get_repository
+from Technical.tech_analysis import (OSCILLATOR_LABELS, OSCILLATOR_THRESHOLDS, ULTIMATE_THRESHOLDS,
+                                     calculate_ema, calculate_momentum, calculate_williams_percent_range,
+                                     classify_signal, compare_moving_averages, get_overall_signal,
+                                     hull_moving_average, ichimoku_signal)
+
+# stock_indicators keeps, per ticker and window, the running state the technical
+# analysis reads: sums over the sliding ranges of bars and monotonic deques for
+# their highs and lows. Adding a bar moves every range by at most one bar, so an
+# update costs O(new bars) whatever the length of the history, and the results
+# match multi_window_columns over the same bars.
+
+MONGO_URI = os.environ.get("MONGODB_URI", "mongodb://localhost:27017")
+INDICATORS_COLLECTION = "stock_indicators"
+WINDOWS = [int(window) for window in os.environ.get("INDICATOR_WINDOWS", "2,7,30").split(",")]
+ULTIMATE_PERIODS = [7, 14, 28]
+MA_WINDOW = 10
+
+# bar layout in the buffer
+LAST, HIGH, LOW, VOLUME = range(4)
+
+
+def _ranges(count, window):
+    """The [start, end) bar ranges, in chronological bar numbers, that each sum of a window covers."""
+    span = min(window, count)
+    start = count - span
+    ranges = {
+        "ma": (count - min(span, MA_WINDOW), count),
+        "weighted": (start, count),
+        "volume": (start, count),
+        # a bar's change is the one from the bar before it
+        "gains": (start + 1, count),
+        "losses": (start + 1, count),
+    }
+    for period in ULTIMATE_PERIODS:
+        # the oldest bars of the window, as multi_window_columns reads them
+        end = start + period if span >= period else start
+        ranges[f"bp{period}"] = ranges[f"tr{period}"] = (start, end)
+    return ranges
+
+
+def _value(kind, bar, previous=None):
+    if kind == "ma":
+        return bar[LAST]
+    if kind == "weighted":
+        return bar[LAST] * bar[VOLUME]
+    if kind == "volume":
+        return bar[VOLUME]
+    # the columns are newest first, so a gain is a bar lower than the one before it
+    if kind == "gains":
+        return max(previous[LAST] - bar[LAST], 0)
+    if kind == "losses":
+        return max(bar[LAST] - previous[LAST], 0)
+    if kind.startswith("bp"):
+        return bar[LAST] - bar[LOW]
+    return bar[HIGH] - bar[LOW]
+
+
+# the deques of the newest bars of a window, kept in the order the extreme wins
+EXTREMES = {
+    "highest_close": (LAST, lambda kept, new: kept <= new),
+    "lowest_close": (LAST, lambda kept, new: kept >= new),
+    "highest_high": (HIGH, lambda kept, new: kept <= new),
+    "lowest_low": (LOW, lambda kept, new: kept >= new),
+}
+
+
+class IndicatorState:
+    """
+    The incremental indicator state of one ticker: the newest bars, enough to
+    drop the oldest one of every range, and per window the [start, end, total]
+    of every sum and the bar numbers of every extreme's deque.
+    """
+
+    def __init__(self, stock_id, windows=WINDOWS):
+        self.stock_id = stock_id
+        self.windows = sorted(windows)
+        self.count = 0
+        self.last_date = None
+        self.bars = deque(maxlen=max(self.windows) + 1)
+        self.sums = {window: {kind: [0, 0, 0] for kind in _ranges(0, window)}
+                     for window in self.windows}
+        self.extremes = {window: {name: deque() for name in EXTREMES}
+                         for window in self.windows}
+
+    def _bar(self, number):
+        return self.bars[number - (self.count - len(self.bars))]
+
+    def _value(self, kind, number):
+        previous = self._bar(number - 1) if kind in ("gains", "losses") else None
+        return _value(kind, self._bar(number), previous)
+
+    def push(self, bar):
+        """Add the next bar, a (last, high, low, volume) tuple of ints."""
+        self.count += 1
+        self.bars.append(tuple(int(x) for x in bar))
+        for window in self.windows:
+            for kind, (start, end) in _ranges(self.count, window).items():
+                entry = self.sums[window][kind]
+                for number in range(max(entry[1], start), end):
+                    entry[2] += self._value(kind, number)
+                for number in range(entry[0], min(entry[1], start)):
+                    entry[2] -= self._value(kind, number)
+                entry[0], entry[1] = start, end
+
+            start = self.count - min(window, self.count)
+            for name, (part, dominated) in EXTREMES.items():
+                kept = self.extremes[window][name]
+                while kept and dominated(self._bar(kept[-1])[part], bar[part]):
+                    kept.pop()
+                kept.append(self.count - 1)
+                while kept[0] < start:
+                    kept.popleft()
+
+    def update(self, columns):
+        """Add the bars of chronological price columns, returning how many there were."""
+        for bar in zip(columns["last_transaction"], columns["max_value"],
+                       columns["min_value"], columns["volume"]):
+            self.push(bar)
+        if len(columns["date"]):
+            self.last_date = format_dates(columns["date"][-1:])[0]
+        return len(columns["date"])
+
+    def result(self, window):
+        """tech_results of the newest bars for one of the state's windows."""
+        span = min(window, self.count)
+        sums = {kind: np.float64(entry[2]) for kind, entry in self.sums[window].items()}
+        extremes = {name: np.float64(self._bar(kept[0])[EXTREMES[name][0]])
+                    for name, kept in self.extremes[window].items()}
+        last = np.array([bar[LAST] for bar in reversed(self.bars)], dtype=float)[:span]
+        result = dict()
+
+        if span > 1 and sums["losses"] != 0:
+            rsi = 100 - (100 / (1 + sums["gains"] / sums["losses"]))
+            result["rsi"] = classify_signal(
+                round(rsi, 3), OSCILLATOR_THRESHOLDS, OSCILLATOR_LABELS)
+        else:
+            result["rsi"] = (0, "neutral")
+
+        result["momentum"] = calculate_momentum(last, span)
+        result["williams_percent_range"] = calculate_williams_percent_range(last, span)
+
+        range_ = extremes["highest_close"] - extremes["lowest_close"]
+        stochastic = 0 if range_ == 0 else round(
+            100 * (last[0] - extremes["lowest_close"]) / range_, 3)
+        result["stochastic_oscillator"] = classify_signal(
+            stochastic, OSCILLATOR_THRESHOLDS, OSCILLATOR_LABELS)
+
+        averages = []
+        for period in ULTIMATE_PERIODS:
+            if span < period:
+                averages.append(0)
+                continue
+            bp_sum, tr_sum = sums[f"bp{period}"], sums[f"tr{period}"]
+            averages.append(bp_sum / tr_sum if tr_sum != 0 else 0)
+        ultimate = 100 * ((4 * averages[0]) + (2 * averages[1]) + averages[2]) / 7
+        result["ultimate_oscillator"] = classify_signal(
+            round(ultimate, 3), ULTIMATE_THRESHOLDS, OSCILLATOR_LABELS)
+
+        ma_window = min(span, MA_WINDOW)
+        result["sma"] = round(sums["ma"] / ma_window, 3)
+        # seeded at the oldest bar of the window, so it is read from the buffer
+        # rather than carried forward as a running average
+        result["ema"] = calculate_ema(last, ma_window)
+        result["hull_moving_average"] = hull_moving_average(last, min(9, span))
+        result["volume_weighted_average_price"] = round(
+            sums["weighted"] / sums["volume"] if sums["volume"] != 0 else 0, 3)
+        result["ma_comparison"] = compare_moving_averages(
+            last[0], result["sma"], result["ema"], result["hull_moving_average"], result["volume_weighted_average_price"])
+
+        base_line = (extremes["highest_high"] + extremes["lowest_low"]) / 2
+        result["ichimoku_base_line"] = ichimoku_signal(last[span - 1], base_line)
+        result["overall_signal"] = get_overall_signal(result)
+        return result
+
+    def to_document(self):
+        # like the API, the analysis needs at least two bars
+        results = {str(window): _plain(self.result(window))
+                   for window in self.windows} if self.count >= 2 else {}
+        return {
+            "_id": self.stock_id,
+            "count": self.count,
+            "last_date": self.last_date,
+            "windows": self.windows,
+            "bars": [list(bar) for bar in self.bars],
+            "sums": {str(window): sums for window, sums in self.sums.items()},
+            "extremes": {str(window): {name: list(kept) for name, kept in extremes.items()}
+                         for window, extremes in self.extremes.items()},
+            "results": results,
+        }
+
+    @classmethod
+    def from_document(cls, document):
+        state = cls(document["_id"], document["windows"])
+        state.count = document["count"]
+        state.last_date = document["last_date"]
+        state.bars.extend(tuple(bar) for bar in document["bars"])
+        state.sums = {int(window): sums for window, sums in document["sums"].items()}
+        state.extremes = {int(window): {name: deque(kept) for name, kept in extremes.items()}
+                          for window, extremes in document["extremes"].items()}
+        return state
+
+
+def _plain(value):
+    """numpy scalars and tuples of a result as the plain values BSON stores."""
+    if isinstance(value, dict):
+        return {key: _plain(x) for key, x in value.items()}
+    if isinstance(value, (tuple, list)):
+        return [_plain(x) for x in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+class IndicatorStore:
+    """Reads the materialized results of a motor stock_indicators collection."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def results(self, stock_id, version, windows):
+        """The stored results of the windows, if all are stored and built from this version of the ticker."""
+        document = await self.collection.find_one(
+            {"_id": stock_id}, {"count": 1, "last_date": 1, "results": 1})
+        if document is None or (document["count"], document["last_date"]) != tuple(version):
+            return None
+        results = document["results"]
+        if any(str(window) not in results for window in windows):
+            return None
+        return {window: results[str(window)] for window in windows}
+
+
+async def update_ticker(repository, collection, ticker, windows=WINDOWS, rebuild=False):
+    """Advance the stored state of a ticker over its new bars, returning how many were added."""
+    version = await repository.version(ticker)
+    if version is None:
+        return 0
+    document = None if rebuild else await collection.find_one({"_id": ticker})
+    state = None
+    if document is not None and document["windows"] == sorted(windows):
+        state = IndicatorState.from_document(document)
+        if (state.count, state.last_date) == tuple(version):
+            return 0
+        columns = await repository.load_columns(
+            ticker, parse_date(state.last_date) + timedelta(days=1))
+        # a rewritten history cannot be continued, so it is replayed in full
+        if columns is None or state.count + len(columns["date"]) != version[0]:
+            state = None
+    if state is None:
+        state = IndicatorState(ticker, windows)
+        columns = await repository.load_columns(ticker)
+    added = state.update(columns)
+    await collection.replace_one({"_id": ticker}, state.to_document(), upsert=True)
+    return added
+
+
+async def update_all(tickers, windows=WINDOWS, rebuild=False):
+    client = AsyncIOMotorClient(MONGO_URI)
+    db = client["stock_data"]
+    repository = get_repository(db)
+    collection = db[INDICATORS_COLLECTION]
+
+    for ticker in tickers or await repository.stock_ids():
+        print(f"{ticker}: {await update_ticker(repository, collection, ticker, windows, rebuild)} new bars")
+
+    client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Advance the materialized technical indicators over the newly scraped bars.")
+    parser.add_argument("tickers", nargs="*",
+                        help="tickers to update, all of them when omitted")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="replay the whole history instead of continuing the stored state")
+    args = parser.parse_args()
+
+    asyncio.run(update_all([t.upper() for t in args.tickers], WINDOWS, args.rebuild))
@@ -0,0 +1,118 @@
+import numpy as np
+from Data.parser import PRICE_FIELDS
+from Technical.indicator_series import (classify, compare_moving_averages_series, ema_series,
+                                        hull_moving_average_series, ichimoku_signals, overall_signal_series)
+from Technical.tech_analysis import (MOMENTUM_LABELS, MOMENTUM_THRESHOLDS, OSCILLATOR_LABELS, OSCILLATOR_THRESHOLDS,
+                                     ULTIMATE_THRESHOLDS, WILLIAMS_THRESHOLDS)
+
+
+# Each batch is a (tickers, window) array of chronological bars, the same bars
+# tech_results sees for a ticker, so every row reproduces its single-ticker result.
+
+
+def screen_batch(last, low, high, volume):
+    """Computes the tech_results indicators for every row of a (tickers, window) batch."""
+    window = last.shape[1]
+    ma_window = min(window, 10)
+    current = last[:, -1]
+    result = dict()
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if window > 1:
+            changes = np.diff(last, axis=1)
+            gains = np.where(changes < 0, -changes, 0).sum(axis=1)
+            losses = np.where(changes > 0, changes, 0).sum(axis=1)
+            rsi = np.where(losses == 0, 0, np.round(
+                100 - (100 / (1 + gains / losses)), 3))
+        else:
+            rsi = np.zeros(len(last))
+        result["rsi"] = (rsi, classify(rsi, OSCILLATOR_THRESHOLDS, OSCILLATOR_LABELS))
+
+        momentum = np.round((current - last[:, 0]) / last[:, 0] * 100, 3)
+        result["momentum"] = (momentum, classify(
+            momentum, MOMENTUM_THRESHOLDS, MOMENTUM_LABELS))
+
+        williams = np.zeros(len(last))
+        result["williams_percent_range"] = (williams, classify(
+            williams, WILLIAMS_THRESHOLDS, OSCILLATOR_LABELS))
+
+        highest, lowest = last.max(axis=1), last.min(axis=1)
+        stochastic = np.where(highest == lowest, 0, np.round(
+            100 * (current - lowest) / (highest - lowest), 3))
+        result["stochastic_oscillator"] = (stochastic, classify(
+            stochastic, OSCILLATOR_THRESHOLDS, OSCILLATOR_LABELS))
+
+        averages = []
+        for period in [7, 14, 28]:
+            if window < period:
+                averages.append(np.zeros(len(last)))
+                continue
+            bp_sum = (last - low)[:, :period].sum(axis=1)
+            tr_sum = (high - low)[:, :period].sum(axis=1)
+            averages.append(np.where(tr_sum != 0, bp_sum / tr_sum, 0))
+        ultimate = np.round(
+            100 * ((4 * averages[0]) + (2 * averages[1]) + averages[2]) / 7, 3)
+        result["ultimate_oscillator"] = (ultimate, classify(
+            ultimate, ULTIMATE_THRESHOLDS, OSCILLATOR_LABELS))
+
+        sma = np.round(last[:, -ma_window:].sum(axis=1) / ma_window, 3)
+        # the series of a batch as long as the window end with the point results
+        ema = ema_series(last, window, ma_window)[:, -1]
+        hma = hull_moving_average_series(last, min(9, window), window)[:, -1]
+        volume_sum = volume.sum(axis=1)
+        vwma = np.round(np.where(volume_sum != 0,
+                                 (last * volume).sum(axis=1) / volume_sum, 0), 3)
+        result["sma"] = sma
+        result["ema"] = ema
+        result["hull_moving_average"] = hma
+        result["volume_weighted_average_price"] = vwma
+        result["ma_comparison"] = compare_moving_averages_series(
+            current, sma, ema, hma, vwma)
+
+    base_line = (high.max(axis=1) + low.min(axis=1)) / 2
+    result["ichimoku_base_line"] = ichimoku_signals(last[:, 0], base_line)
+
+    result["overall_signal"] = overall_signal_series([
+        result["rsi"][1],
+        result["momentum"][1],
+        result["williams_percent_range"][1],
+        result["stochastic_oscillator"][1],
+        result["ultimate_oscillator"][1],
+        compare_moving_averages_series(sma, sma, ema, hma, vwma),
+        result["ichimoku_base_line"][1],
+    ])
+    return result
+
+
+def screener(stocks, window):
+    """
+    Screens the (stock_id, chronological columns) pairs of many tickers at once.
+    Tickers are grouped by how many of their last window bars they have, so each
+    group is one vectorized batch.
+    """
+    groups = dict()
+    for stock_id, columns in stocks:
+        columns = {part: columns[part][-window:] for part in PRICE_FIELDS}
+        length = len(columns["last_transaction"])
+        if length < 2:
+            continue
+        groups.setdefault(length, []).append((stock_id, columns))
+
+    results = []
+    for length, members in groups.items():
+        columns = {part: np.stack([parsed[part] for _, parsed in members]).astype(float)
+                   for part in PRICE_FIELDS}
+        batch = screen_batch(columns["last_transaction"], columns["min_value"],
+                             columns["max_value"], columns["volume"])
+        for i, (stock_id, _) in enumerate(members):
+            row = {"stock_id": stock_id,
+                   "last_transaction": int(columns["last_transaction"][i, -1])}
+            for name, value in batch.items():
+                if isinstance(value, tuple):
+                    row[name] = [float(value[0][i]), value[1][i]]
+                elif value.dtype == object:
+                    row[name] = value[i]
+                else:
+                    row[name] = float(value[i])
+            results.append(row)
+    return results
@@ -1,20 +1,59 @@
 import numpy as np
+from Data.parser import parse_columns, PRICE_FIELDS
+from Monitoring.tracing import span, traced
 
 
 def parse_singular(entry: str):
     return int(entry[:-8].replace('.', ''))
 
 
+@traced("parse_data")
 def parse_data(data):
-    data_copy = []
-    for entry in data:
-        parsed = dict()
-        parsed['date'] = entry['date']
-        for part in ['last_transaction', 'max_value', 'min_value']:
-            parsed[part] = parse_singular(entry[part])
-        parsed["volume"] = int(entry["volume"][:].replace('.', ''))
-        data_copy.append(parsed)
-    return data_copy
+    columns = parse_columns(data)
+    parsed = {part: columns[part][::-1].tolist() for part in PRICE_FIELDS}
+    return [{'date': entry['date'], 'last_transaction': parsed['last_transaction'][i],
+             'max_value': parsed['max_value'][i], 'min_value': parsed['min_value'][i],
+             'volume': parsed['volume'][i]} for i, entry in enumerate(data)]
+
+
+OSCILLATOR_THRESHOLDS = [20, 40, 60, 80]
+OSCILLATOR_LABELS = ["strong_buy", "buy", "neutral", "sell", "strong_sell"]
+MOMENTUM_THRESHOLDS = [-5, -1, 1, 5]
+MOMENTUM_LABELS = ["strong_sell", "sell", "neutral", "buy", "strong_buy"]
+WILLIAMS_THRESHOLDS = [-80, -60, -40, -20]
+ULTIMATE_THRESHOLDS = [30, 45, 55, 70]
+# percent distances of the price from the ichimoku base line
+ICHIMOKU_NEUTRAL_PERCENT = 1
+ICHIMOKU_STRONG_PERCENT = 10
+
+
+def classify_signal(result, thresholds, labels):
+    if result == 0:
+        return result, "neutral"
+    for threshold, label in zip(thresholds, labels):
+        if result <= threshold:
+            return result, label
+    return result, labels[-1]
+
+
+def ichimoku_signal(current_price, base_line):
+    if base_line == 0:
+        return 0, "neutral"
+
+    percent_diff = ((current_price - base_line) / base_line) * 100
+
+    if abs(percent_diff) < ICHIMOKU_NEUTRAL_PERCENT:
+        signal = "neutral"
+    elif percent_diff <= -ICHIMOKU_STRONG_PERCENT:
+        signal = "strong_sell"
+    elif percent_diff < 0:
+        signal = "sell"
+    elif percent_diff <= ICHIMOKU_STRONG_PERCENT:
+        signal = "buy"
+    else:
+        signal = "strong_buy"
+
+    return round(base_line, 3), signal
 
 
 def calculate_relative_strength_index(data, window):
@@ -36,35 +75,13 @@ def calculate_relative_strength_index(data, window):
         rsi = 100 - (100 / (1 + rs))
         result = round(rsi[0], 3)
 
-    if result == 0:
-        return result, "neutral"
-    elif result <= 20:
-        return result, "strong_buy"
-    elif result <= 40:
-        return result, "buy"
-    elif result <= 60:
-        return result, "neutral"
-    elif result <= 80:
-        return result, "sell"
-    else:
-        return result, "strong_sell"
+    return classify_signal(result, OSCILLATOR_THRESHOLDS, OSCILLATOR_LABELS)
 
 
 def calculate_momentum(data, window):
     result = round((data[0]-data[window-1])/data[window-1]*100, 3)
 
-    if result == 0:
-        return result, "neutral"
-    elif result <= -5:
-        return result, "strong_sell"
-    elif result <= -1:
-        return result, "sell"
-    elif result <= 1:
-        return result, "neutral"
-    elif result <= 5:
-        return result, "buy"
-    else:
-        return result, "strong_buy"
+    return classify_signal(result, MOMENTUM_THRESHOLDS, MOMENTUM_LABELS)
 
 
 def calculate_williams_percent_range(data, window):
@@ -77,18 +94,7 @@ def calculate_williams_percent_range(data, window):
         result = round(-100 * (highest_high -
                                data[0]) / (highest_high - lowest_low), 3)
 
-    if result == 0:
-        return result, "neutral"
-    elif result <= -80:
-        return result, "strong_buy"
-    elif result <= -60:
-        return result, "buy"
-    elif result <= -40:
-        return result, "neutral"
-    elif result <= -20:
-        return result, "sell"
-    else:
-        return result, "strong_sell"
+    return classify_signal(result, WILLIAMS_THRESHOLDS, OSCILLATOR_LABELS)
 
 
 def calculate_stochastic_oscillator(data, window):
@@ -100,18 +106,7 @@ def calculate_stochastic_oscillator(data, window):
         result = round(100 * (data[0] - lowest_low) /
                        (highest_high - lowest_low), 3)
 
-    if result == 0:
-        return result, "neutral"
-    elif result <= 20:
-        return result, "strong_buy"
-    elif result <= 40:
-        return result, "buy"
-    elif result <= 60:
-        return result, "neutral"
-    elif result <= 80:
-        return result, "sell"
-    else:
-        return result, "strong_sell"
+    return classify_signal(result, OSCILLATOR_THRESHOLDS, OSCILLATOR_LABELS)
 
 
 def calculate_ultimate_oscillator(data):
@@ -149,18 +144,7 @@ def calculate_ultimate_oscillator(data):
 
     result = round(ultimate_oscillator, 3)
 
-    if result == 0:
-        return result, "neutral"
-    elif result <= 30:
-        return result, "strong_buy"
-    elif result <= 45:
-        return result, "buy"
-    elif result <= 55:
-        return result, "neutral"
-    elif result <= 70:
-        return result, "sell"
-    else:
-        return result, "strong_sell"
+    return classify_signal(result, ULTIMATE_THRESHOLDS, OSCILLATOR_LABELS)
 
 
 def calculate_sma(data, window):
@@ -235,23 +219,7 @@ def ichimoku_base_line(data, period):
 
         current_price = data[0]['last_transaction']
 
-        if base_line == 0:
-            return 0, "neutral"
-
-        percent_diff = ((current_price - base_line) / base_line) * 100
-
-        if abs(percent_diff) < 1:
-            signal = "neutral"
-        elif percent_diff <= -10:
-            signal = "strong_sell"
-        elif percent_diff < 0:
-            signal = "sell"
-        elif percent_diff <= 10:
-            signal = "buy"
-        else:
-            signal = "strong_buy"
-
-        return round(base_line, 3), signal
+        return ichimoku_signal(current_price, base_line)
 
     except (KeyError, IndexError, ZeroDivisionError):
         return 0, "neutral"
@@ -321,6 +289,7 @@ def get_overall_signal(data: dict) -> str:
     return max_signal[0]
 
 
+@traced("tech_analysis.tech_results")
 def tech_results(data, window):
     data = parse_data(data)
     window = min(window, len(data))
@@ -340,8 +309,97 @@ def tech_results(data, window):
         last_transactions, min(9, window))
     result["volume_weighted_average_price"] = volume_weighted_moving_average(
         data, window)
-    result["ma_comparison"] = compare_moving_averages(last_transactions[0], calculate_sma(last_transactions, min(window, 10)), calculate_ema(
-        last_transactions, min(window, 10)), hull_moving_average(last_transactions, min(9, window)), volume_weighted_moving_average(data, window))
+    result["ma_comparison"] = compare_moving_averages(
+        last_transactions[0], result["sma"], result["ema"], result["hull_moving_average"], result["volume_weighted_average_price"])
     result["ichimoku_base_line"] = ichimoku_base_line(data, window)
     result["overall_signal"] = get_overall_signal(result)
     return result
+
+
+def multi_window_results(data, windows):
+    """
+    Computes tech_results for several window sizes in one pass. The bars are
+    parsed once and every window reads its sums from shared prefix sums and
+    its highs and lows from running maxima and minima over the newest bars.
+    """
+    with span("parse_columns"):
+        columns = parse_columns(data[:max(windows)])
+    return multi_window_columns({part: columns[part][::-1] for part in PRICE_FIELDS}, windows)
+
+
+@traced("tech_analysis.indicators")
+def multi_window_columns(columns, windows):
+    """multi_window_results for already parsed, newest-first price columns."""
+    last = np.asarray(columns["last_transaction"][:max(windows)], dtype=float)
+    low = np.asarray(columns["min_value"][:max(windows)], dtype=float)
+    high = np.asarray(columns["max_value"][:max(windows)], dtype=float)
+    volume = np.asarray(columns["volume"][:max(windows)], dtype=float)
+
+    def prefix(values):
+        return np.concatenate(([0.0], np.cumsum(values)))
+
+    changes = np.diff(last)
+    gains = prefix(np.where(changes > 0, changes, 0))
+    losses = prefix(np.where(changes < 0, -changes, 0))
+    prices = prefix(last)
+    weighted_prices = prefix(last * volume)
+    volumes = prefix(volume)
+    buying_pressure = prefix(last - low)
+    true_range = prefix(high - low)
+    highest_close = np.maximum.accumulate(last)
+    lowest_close = np.minimum.accumulate(last)
+    highest_high = np.maximum.accumulate(high)
+    lowest_low = np.minimum.accumulate(low)
+
+    results = dict()
+    for requested in windows:
+        window = min(requested, len(last))
+        result = dict()
+
+        if window > 1 and losses[window - 1] != 0:
+            rsi = 100 - (100 / (1 + gains[window - 1] / losses[window - 1]))
+            result["rsi"] = classify_signal(
+                round(rsi, 3), OSCILLATOR_THRESHOLDS, OSCILLATOR_LABELS)
+        else:
+            result["rsi"] = (0, "neutral")
+
+        result["momentum"] = calculate_momentum(last, window)
+        result["williams_percent_range"] = calculate_williams_percent_range(
+            last, window)
+
+        price_range = highest_close[window - 1] - lowest_close[window - 1]
+        stochastic = 0 if price_range == 0 else round(
+            100 * (last[0] - lowest_close[window - 1]) / price_range, 3)
+        result["stochastic_oscillator"] = classify_signal(
+            stochastic, OSCILLATOR_THRESHOLDS, OSCILLATOR_LABELS)
+
+        averages = []
+        for period in [7, 14, 28]:
+            if window < period:
+                averages.append(0)
+                continue
+            # the oldest bars of the window, as in calculate_ultimate_oscillator
+            bp_sum = buying_pressure[window] - buying_pressure[window - period]
+            tr_sum = true_range[window] - true_range[window - period]
+            averages.append(bp_sum / tr_sum if tr_sum != 0 else 0)
+        ultimate = 100 * ((4 * averages[0]) + (2 * averages[1]) + averages[2]) / 7
+        result["ultimate_oscillator"] = classify_signal(
+            round(ultimate, 3), ULTIMATE_THRESHOLDS, OSCILLATOR_LABELS)
+
+        ma_window = min(window, 10)
+        result["sma"] = round(prices[ma_window] / ma_window, 3)
+        result["ema"] = calculate_ema(last[:window], ma_window)
+        result["hull_moving_average"] = hull_moving_average(
+            last[:window], min(9, window))
+        volume_sum = volumes[window]
+        result["volume_weighted_average_price"] = round(
+            weighted_prices[window] / volume_sum if volume_sum != 0 else 0, 3)
+        result["ma_comparison"] = compare_moving_averages(
+            last[0], result["sma"], result["ema"], result["hull_moving_average"], result["volume_weighted_average_price"])
+
+        base_line = (highest_high[window - 1] + lowest_low[window - 1]) / 2
+        result["ichimoku_base_line"] = ichimoku_signal(
+            last[window - 1], base_line)
+        result["overall_signal"] = get_overall_signal(result)
+        results[requested] = result
+    return results
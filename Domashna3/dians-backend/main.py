@@ -1,129 +1,569 @@
-from fastapi import FastAPI, HTTPException
+import asyncio
+import ipaddress
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.routing import Match
+from brotli_asgi import BrotliMiddleware
+from motor.motor_asyncio import AsyncIOMotorClient
 from pymongo import MongoClient
-from typing import List
-from Technical.tech_analysis import tech_results
-from LSTM.lstm_predictor import predictor
-from Fundamental.fundamental_analysis import get_fundamental_analysis
+from typing import List, Optional
+from Technical.tech_analysis import multi_window_columns
+from Technical.indicator_series import series_results
+from Technical.screener import screener
+from Technical.indicator_state import INDICATORS_COLLECTION, IndicatorStore
+from LSTM.lstm_predictor import budget_predictor, forecaster_for_rows, predictor
+from LSTM.forecast_jobs import ForecastQueue, QueueFull
+from Data.catalog import CATALOG_COLLECTION, StockCatalog
+from Data.chart import FORMATS, downsample, encode_arrow, encode_msgpack
+from Data.price_cache import PriceCache
+from Data.parser import PRICE_FIELDS, format_dates
+from Data.queries import STOCK_FIELDS, parse_date, slice_columns
+from Data.repository import get_repository
+from Data.response_cache import ResponseCache, cache_control, etag_matches, version_etag
+from Fundamental.fundamental_analysis import get_cached_analysis, stream_analysis, service as sentiment_service
+from Monitoring.tracing import (RESPONSE_BYTES, REQUEST_SECONDS, call_traced, metrics, record_all,
+                                server_timing, span, start_profile, stop_profile)
 
 
-app = FastAPI()
+MONGO_URI = os.environ.get("MONGODB_URI", "mongodb://localhost:27017")
+MONGO_MAX_POOL_SIZE = int(os.environ.get("MONGO_MAX_POOL_SIZE", 100))
+MONGO_MIN_POOL_SIZE = int(os.environ.get("MONGO_MIN_POOL_SIZE", 0))
+ANALYSIS_PROCESSES = int(os.environ.get(
+    "ANALYSIS_PROCESSES", os.cpu_count() or 1))
+# when set, /cache/invalidate needs it in the X-Cache-Token header, otherwise
+# it only accepts calls from the API's own host
+CACHE_TOKEN = os.environ.get("CACHE_TOKEN")
+# requests with an X-Profile: 1 header get a Server-Timing breakdown unless this is 0
+PROFILING = os.environ.get("PROFILING", "1") != "0"
 
+analysis_pool = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global analysis_pool
+    # spawn, since forking a process that already imported tensorflow is unsafe
+    analysis_pool = ProcessPoolExecutor(
+        ANALYSIS_PROCESSES, mp_context=multiprocessing.get_context("spawn"))
+    forecast_queue.start()
+    sentiment_service.start()
+    yield
+    sentiment_service.stop()
+    await forecast_queue.stop()
+    analysis_pool.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
+
+# brotli, or gzip for clients without it, for every response but the event streams
+app.add_middleware(BrotliMiddleware, minimum_size=1000,
+                   excluded_handlers=[r"/events$", r"/stream$"])
+
+client = AsyncIOMotorClient(MONGO_URI, maxPoolSize=MONGO_MAX_POOL_SIZE,
+                            minPoolSize=MONGO_MIN_POOL_SIZE)
+repository = get_repository(client["stock_data"])
+price_cache = PriceCache(repository)
+catalog = StockCatalog(client["stock_data"][CATALOG_COLLECTION], repository)
+response_cache = ResponseCache()
+indicator_store = IndicatorStore(client["stock_data"][INDICATORS_COLLECTION])
+# the fundamental analysis batches on its own worker thread, so it stays on a sync client
+fundamental_collection = MongoClient(MONGO_URI)["stock_data"]["stock_fundamental"]
+
+
+# the responses that only change when a ticker gets a new bar
+VERSIONED_ROUTE = re.compile(r"^/(?:stocks/(?P<stock>[^/]+)(?:/chart)?|technical_analysis/(?P<analysis>[^/]+)(?:/series)?)$")
+
+
+@app.middleware("http")
+async def conditional_get(request: Request, call_next):
+    """
+    Tags the versioned responses with an ETag of the ticker's bar count and last
+    date, answers a matching If-None-Match with 304 Not Modified and serves
+    repeat requests from the response cache until the ticker gets a new bar.
+    The version is kept in request.state so the endpoint does not fetch it again.
+    """
+    match = VERSIONED_ROUTE.match(request.url.path)
+    if request.method != "GET" or match is None:
+        return await call_next(request)
+
+    stock_id = (match["stock"] or match["analysis"]).upper()
+    version = await price_cache.version(stock_id)
+    if version is None:
+        return await call_next(request)
+    request.state.stock_version = (stock_id, version)
+
+    etag = version_etag(stock_id, version)
+    headers = {"ETag": etag, "Cache-Control": cache_control()}
+    if etag_matches(request.headers.get("If-None-Match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    # compression runs inside this middleware, so the encoding is part of the key
+    key = (stock_id, request.url.path, request.url.query,
+           request.headers.get("Accept-Encoding", ""))
+    cached = response_cache.get(key, etag)
+    if cached is not None:
+        body, cached_headers = cached
+        return Response(body, headers={**cached_headers, "X-Cache": "HIT"})
+
+    response = await call_next(request)
+    if response.status_code != 200:
+        return response
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    cached_headers = {**{name: value for name, value in response.headers.items()
+                         if name.lower() != "content-length"}, **headers}
+    response_cache.put(key, etag, body, cached_headers)
+    return Response(body, headers={**cached_headers, "X-Cache": "MISS"})
+
+
+def route_path(request: Request):
+    """The path template of the route a request matched, also when a middleware answered it."""
+    route = request.scope.get("route")
+    if route is not None:
+        return route.path
+    for route in app.router.routes:
+        if route.matches(request.scope)[0] == Match.FULL:
+            return route.path
+    return "unmatched"
+
+
+@app.middleware("http")
+async def observe_request(request: Request, call_next):
+    """
+    Records the latency and response size of every request by route, and
+    returns the stages of profiled requests in a Server-Timing header.
+    """
+    profile = PROFILING and request.headers.get("X-Profile") == "1"
+    token = start_profile() if profile else None
+    start = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - start
+
+    route = route_path(request)
+    REQUEST_SECONDS.labels(request.method, route, response.status_code).observe(elapsed)
+    if "content-length" in response.headers:
+        RESPONSE_BYTES.labels(route).observe(int(response.headers["content-length"]))
+    if profile:
+        stages = stop_profile(token) + [("total", elapsed)]
+        response.headers["Server-Timing"] = server_timing(stages)
+    return response
+
+
+# added last so it is the outermost middleware and every response gets its headers
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:3000"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # the frontend reads which model served a forecast and the caching headers
+    expose_headers=["X-Forecast-Model", "ETag", "X-Cache", "Server-Timing"],
 )
 
-MONGO_URI = "mongodb://localhost:27017"
-client = MongoClient(MONGO_URI)
-db = client["stock_data"]
-collection = db["stock_records"]
-fundamental_collection = db["stock_fundamental"]
+
+def known_version(request: Request, stock_id: str):
+    """The version of a ticker that conditional_get already fetched for this request, or None."""
+    known = getattr(request.state, "stock_version", None)
+    if known is None or known[0] != stock_id:
+        return None
+    return known[1]
+
+
+async def run_analysis(function, *args):
+    """Run CPU heavy analysis in the process pool so it does not block the event loop."""
+    with span(f"analysis.{function.__name__}"):
+        result, stages = await asyncio.get_running_loop().run_in_executor(
+            analysis_pool, call_traced, function, *args)
+    record_all(stages)
+    return result
+
+
+def parse_range(date_from: Optional[str], date_to: Optional[str]):
+    try:
+        return (parse_date(date_from) if date_from else None,
+                parse_date(date_to) if date_to else None)
+    except ValueError:
+        raise HTTPException(
+            status_code=400, detail="Dates must be in the dd.mm.yyyy format")
+
+
+async def load_columns(stock_id: str, date_from=None, date_to=None, limit=None, fields=PRICE_FIELDS,
+                       version=None):
+    """
+    Returns the selected price columns of a stock, sliced from the price cache when
+    it holds the stock, otherwise fetched with a server-side selection.
+    """
+    columns, exists = await price_cache.peek(stock_id, version)
+    if not exists:
+        return None
+    if columns is None:
+        with span("mongo.load_columns"):
+            return await repository.load_columns(stock_id, date_from, date_to, limit, fields)
+    return slice_columns(columns, date_from, date_to, limit)
 
 
 @app.get("/")
-def read_root():
+async def read_root():
     return {"message": "Welcome to the Stock API!"}
 
 
+@app.get("/metrics")
+async def get_metrics():
+    """
+    Exposes the request, stage, cache and model load metrics in the Prometheus format.
+    """
+    body, content_type = metrics()
+    return Response(body, media_type=content_type)
+
+
+def is_loopback(host):
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return host == "localhost"
+
+
+@app.post("/cache/invalidate", status_code=204)
+async def invalidate_cache(request: Request, stock_id: Optional[str] = None,
+                           x_cache_token: Optional[str] = Header(None)):
+    """
+    Drops the cached responses and prices of a stock, or of every stock, and
+    reloads the catalog. The scrapers call it after writing new data.
+    """
+    if CACHE_TOKEN and x_cache_token != CACHE_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid cache token")
+    if not CACHE_TOKEN and not is_loopback(request.client.host if request.client else None):
+        raise HTTPException(status_code=403, detail="Set CACHE_TOKEN to invalidate the cache from another host")
+    stock_id = stock_id.upper() if stock_id else None
+    response_cache.invalidate(stock_id)
+    price_cache.invalidate(stock_id)
+    catalog.invalidate()
+    return Response(status_code=204)
+
+
 @app.get("/stocks", response_model=List[str])
-def get_stock_ids():
+async def get_stock_ids(prefix: Optional[str] = None):
     """
-    Fetches all unique stock IDs (_id) from the collection.
+    Fetches all unique stock IDs from the stock catalog, or only the ones
+    starting with prefix.
     """
-    stock_ids = collection.find().distinct("_id")
-    if not stock_ids:
+    if not await catalog.stock_ids():
         raise HTTPException(status_code=404, detail="No stock data found")
-    return stock_ids
+    return await catalog.stock_ids(prefix.upper() if prefix else None)
+
+
+@app.get("/catalog")
+async def get_catalog(prefix: Optional[str] = None):
+    """
+    Fetches the catalog entry of every stock, or of the ones starting with
+    prefix: its last date and price, bar count and whether it has fundamentals.
+    """
+    return await catalog.entries(prefix.upper() if prefix else None)
 
 
 @app.get("/stocks/{stock_id}")
-def get_stock_data(stock_id: str):
+async def get_stock_data(stock_id: str, date_from: Optional[str] = Query(None, alias="from"),
+                   date_to: Optional[str] = Query(None, alias="to"),
+                   limit: Optional[int] = Query(None, ge=1), fields: Optional[str] = None):
     """
-    Fetches the data array for a specific stock ID.
+    Fetches the data array for a specific stock ID, newest first.
+    Bars can be selected with from/to (dd.mm.yyyy) and limit, and the
+    returned fields with a comma separated fields list.
     """
-    stock = collection.find_one({"_id": stock_id.upper()})
-    if not stock:
+    date_from, date_to = parse_range(date_from, date_to)
+    if fields is not None:
+        fields = fields.split(",")
+        if any(field not in STOCK_FIELDS for field in fields):
+            raise HTTPException(
+                status_code=400, detail=f"Fields must be some of {', '.join(STOCK_FIELDS)}")
+    with span("mongo.load_data"):
+        data = await repository.load_data(stock_id.upper(),
+                                          date_from, date_to, limit, fields)
+    if data is None:
         raise HTTPException(status_code=404, detail=f"Stock ID {
                             stock_id} not found")
-    return stock["data"]
+    return data
 
 
-@app.get("/lstm_predict/{stock_id}")
-def get_prediction(stock_id: str):
+def forecast_response(prediction):
+    dates = prediction["dates"] + prediction["forecast_dates"]
+    prices = prediction["prices"] + prediction["forecast"]
+    return {"model": prediction["model"],
+            "forecast": [dates[-min(100, len(dates)):], prices[-min(100, len(prices)):]]}
+
+
+async def run_forecast(stock_id: str, model: Optional[str] = None):
+    columns = await price_cache.get(stock_id)
+    if columns is None or len(columns["date"]) == 0:
+        raise LookupError("No data available for this stock")
+    return forecast_response(await run_analysis(predictor, columns, stock_id, model))
+
+
+forecast_queue = ForecastQueue(run_forecast)
+
+
+async def submit_forecast(stock_id: str, model: Optional[str] = None):
     """
-    Fetches the LSTM prediction for a specific stock ID.    
+    Returns the forecast job of the current data of a stock, shared with any
+    other request for the same data and model. Without a model the one the
+    forecast would pick is named, so requests that do the same work share a job.
     """
-    stock = collection.find_one({"_id": stock_id.upper()})
-    if not stock:
+    version = await price_cache.version(stock_id)
+    if version is None:
         raise HTTPException(status_code=404, detail=f"Stock ID {
                             stock_id} not found")
-    if len(stock["data"]) == 0:
+    if version[0] == 0:
         raise HTTPException(
             status_code=404, detail="No data available for this stock")
-    prediction = predictor(stock["data"])
-    dates = prediction["dates"] + prediction["forecast_dates"]
-    prices = prediction["prices"] + prediction["forecast"]
-    return [dates[-min(100, len(dates)):], prices[-min(100, len(prices)):]]
+    try:
+        return forecast_queue.submit(stock_id, version, model or forecaster_for_rows(version[0]).name)
+    except QueueFull:
+        raise HTTPException(status_code=503, detail="Too many forecasts are queued, try again later",
+                            headers={"Retry-After": "10"})
+
+
+@app.get("/lstm_predict/{stock_id}")
+async def get_prediction(stock_id: str, response: Response, budget_ms: Optional[float] = Query(None, ge=0)):
+    """
+    Fetches the LSTM prediction for a specific stock ID.    
+    With budget_ms the best model expected to answer within that many
+    milliseconds is used instead. The X-Forecast-Model header names the model.
+    """
+    stock_id = stock_id.upper()
+    model = None
+    if budget_ms is not None:
+        columns = await price_cache.get(stock_id)
+        if columns is None:
+            raise HTTPException(status_code=404, detail=f"Stock ID {
+                                stock_id} not found")
+        if len(columns["date"]) == 0:
+            raise HTTPException(
+                status_code=404, detail="No data available for this stock")
+        # the statistical models take about a millisecond, so they skip the queue
+        prediction = await run_analysis(budget_predictor, columns, stock_id, budget_ms)
+        if prediction is not None:
+            result = forecast_response(prediction)
+            response.headers["X-Forecast-Model"] = result["model"]
+            return result["forecast"]
+        model = "lstm"
+
+    job = await submit_forecast(stock_id, model)
+    await job.finished.wait()
+    if job.status == "failed":
+        raise HTTPException(status_code=500, detail=job.error)
+    response.headers["X-Forecast-Model"] = job.result["model"]
+    return job.result["forecast"]
+
+
+@app.post("/lstm_predict/{stock_id}/jobs", status_code=202)
+async def submit_prediction(stock_id: str):
+    """
+    Queues the LSTM prediction for a specific stock ID and returns its job,
+    to be polled at /lstm_jobs/{job_id} or streamed from /lstm_jobs/{job_id}/events.
+    """
+    job = await submit_forecast(stock_id.upper())
+    return JSONResponse(status_code=202, content=job.to_json(),
+                        headers={"Location": f"/lstm_jobs/{job.id}"})
+
+
+@app.get("/lstm_jobs/{job_id}")
+async def get_prediction_job(job_id: str):
+    """
+    Fetches the status of a forecast job, and its result once it is done.
+    """
+    job = forecast_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job.to_json()
+
+
+@app.get("/lstm_jobs/{job_id}/events")
+async def stream_prediction_job(job_id: str):
+    """
+    Streams the status changes of a forecast job as server-sent events.
+    """
+    job = forecast_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return StreamingResponse(job.events(), media_type="text/event-stream")
 
 
 @app.get("/stocks/{stock_id}/chart")
-def get_date_price(stock_id: str):
+async def get_date_price(request: Request, stock_id: str, date_from: Optional[str] = Query(None, alias="from"),
+                   date_to: Optional[str] = Query(None, alias="to"),
+                   limit: Optional[int] = Query(None, ge=1),
+                   max_points: Optional[int] = Query(None, ge=3),
+                   output: str = Query("json", alias="format")):
     """
-    Fetches the date and price for a specific stock ID.
+    Fetches the date and price for a specific stock ID, optionally only
+    between from and to (dd.mm.yyyy) and for the last limit bars.
+    max_points downsamples the series with LTTB for charts, and format
+    returns json, msgpack with raw typed columns or an arrow IPC stream.
     """
-    stock = collection.find_one({"_id": stock_id.upper()})
-    if not stock:
+    if output not in FORMATS:
+        raise HTTPException(
+            status_code=400, detail=f"Format must be one of {', '.join(FORMATS)}")
+    date_from, date_to = parse_range(date_from, date_to)
+    version = known_version(request, stock_id.upper())
+    if date_from is None and date_to is None and limit is None:
+        columns = await price_cache.get(stock_id.upper(), version)
+    else:
+        columns = await load_columns(stock_id.upper(), date_from,
+                               date_to, limit, ["last_transaction"], version)
+    if columns is None:
         raise HTTPException(status_code=404, detail=f"Stock ID {
                             stock_id} not found")
-    dates, prices = [], []
-    for data in stock["data"]:
-        dates.append(data["date"])
-        prices.append(int(data["last_transaction"][:-8].replace('.', '')))
-    return (dates[::-1], prices[::-1])
+    columns = {"date": columns["date"], "last_transaction": columns["last_transaction"]}
+    if max_points is not None:
+        with span("chart.downsample"):
+            columns = downsample(columns, max_points)
+    with span(f"serialize.{output}"):
+        if output == "msgpack":
+            return Response(encode_msgpack(columns), media_type=FORMATS[output])
+        if output == "arrow":
+            return Response(encode_arrow(columns), media_type=FORMATS[output])
+        return JSONResponse([format_dates(columns["date"]), columns["last_transaction"].tolist()])
 
 
 @app.get("/technical_analysis/{stock_id}")
-def get_technical_analysis(stock_id: str):
+async def get_technical_analysis(request: Request, stock_id: str, windows: Optional[str] = None):
     """
     Fetches the technical analysis for a specific stock ID.
+    Without windows the day, week and month periods are returned, otherwise
+    one result per requested window, e.g. ?windows=2,7,30,90,250.
+    Windows kept in stock_indicators are read from there while current.
     """
-    stock = collection.find_one({"_id": stock_id.upper()})
+    if windows is None:
+        periods = {
+            "day": 2,
+            "week": 7,
+            "month": 30
+        }
+    else:
+        try:
+            periods = {window: int(window) for window in windows.split(",")}
+        except ValueError:
+            raise HTTPException(
+                status_code=400, detail="Windows must be comma separated numbers of days")
+        if any(num < 2 for num in periods.values()):
+            raise HTTPException(
+                status_code=400, detail="Windows must be at least 2 days")
 
-    if not stock:
+    version = known_version(request, stock_id.upper()) or await price_cache.version(stock_id.upper())
+    if version is not None:
+        with span("mongo.indicators"):
+            stored = await indicator_store.results(stock_id.upper(), version, list(periods.values()))
+        if stored is not None:
+            return {period: stored[num] for period, num in periods.items()}
+
+    columns = await load_columns(stock_id.upper(), limit=max(periods.values()), version=version)
+
+    if columns is None:
+        raise HTTPException(status_code=404, detail=f"Stock ID {
+                            stock_id} not found")
+
+    if len(columns["date"]) < 2:
+        raise HTTPException(
+            status_code=404, detail="No data available for this stock")
+
+    newest_first = {part: columns[part][::-1] for part in PRICE_FIELDS}
+    results = await run_analysis(multi_window_columns, newest_first, list(periods.values()))
+
+    return {period: results[num] for period, num in periods.items()}
+
+
+@app.get("/technical_analysis/{stock_id}/series")
+async def get_technical_analysis_series(request: Request, stock_id: str, window: int = 30,
+                                        date_from: Optional[str] = Query(None, alias="from"),
+                                        limit: Optional[int] = Query(None, ge=1)):
+    """
+    Fetches every technical indicator and its signal as a time series over the
+    whole history of a specific stock ID, oldest bar first. from (dd.mm.yyyy)
+    and limit return only the bars from that date on and the last limit bars.
+    """
+    date_from, _ = parse_range(date_from, None)
+    columns = await price_cache.get(stock_id.upper(), known_version(request, stock_id.upper()))
+
+    if columns is None:
         raise HTTPException(status_code=404, detail=f"Stock ID {
                             stock_id} not found")
 
-    if len(stock["data"]) < 2:
+    if len(columns["date"]) < 2:
         raise HTTPException(
             status_code=404, detail="No data available for this stock")
 
-    periods = {
-        "day": 2,
-        "week": 7,
-        "month": 30
-    }
+    if window < 2:
+        raise HTTPException(
+            status_code=400, detail="The window must be at least 2 days")
 
-    results = dict()
+    return await run_analysis(series_results, columns, window, date_from, limit)
 
-    for period, num in periods.items():
-        days = min(num, len(stock["data"]))
-        result = tech_results(stock["data"][:days], days)
-        results[period] = result
 
-    return results
+SCREENER_SORT_FIELDS = ["last_transaction", "rsi", "momentum", "stochastic_oscillator", "ultimate_oscillator",
+                        "sma", "ema", "hull_moving_average", "volume_weighted_average_price"]
+
+
+@app.get("/screener")
+async def get_screener(window: int = 30, signal: Optional[str] = None, sort_by: str = "momentum",
+                 descending: bool = True, limit: Optional[int] = None):
+    """
+    Computes the technical analysis of every stock in one batch, filtered by
+    overall signal and sorted by one of the indicators.
+    """
+    if window < 2:
+        raise HTTPException(
+            status_code=400, detail="The window must be at least 2 days")
+    if sort_by not in SCREENER_SORT_FIELDS:
+        raise HTTPException(
+            status_code=400, detail=f"Cannot sort by {sort_by}")
+
+    stocks = [stock async for stock in repository.recent_columns(window)]
+    results = await run_analysis(screener, stocks, window)
+
+    if signal:
+        results = [r for r in results if r["overall_signal"] == signal]
+
+    def sort_key(result):
+        value = result[sort_by]
+        return value[0] if isinstance(value, list) else value
+
+    results.sort(key=sort_key, reverse=descending)
+    return results[:limit] if limit else results
 
 
 @app.get("/fundamental_analysis/{stock_id}")
-def get_fundamental_analysis(stock_id: str):
+def get_fundamental_analysis(stock_id: str, response: Response):
     """
     Fetches the fundamental analysis for a specific stock ID.
+    The result is cached next to the filing and reused until the text changes.
+    """
+    with span("mongo.find_one"):
+        # filings without text only record their document_id
+        stock = fundamental_collection.find_one({"_id": stock_id.upper(), "file": {"$exists": True}})
+    if not stock:
+        raise HTTPException(status_code=404, detail=f"Stock ID {
+                            stock_id} not found")
+    analysis, hit = get_cached_analysis(fundamental_collection, stock)
+    response.headers["X-Cache"] = "HIT" if hit else "MISS"
+    return analysis["sentiment"]
+
+
+@app.get("/fundamental_analysis/{stock_id}/stream")
+def stream_fundamental_analysis(stock_id: str):
+    """
+    Streams the fundamental analysis of a specific stock ID as server-sent events,
+    one per analysed chunk of the filing and a last one with the overall sentiment.
     """
-    stock = fundamental_collection.find_one({"_id": stock_id.upper()})
+    with span("mongo.find_one"):
+        stock = fundamental_collection.find_one({"_id": stock_id.upper(), "file": {"$exists": True}})
     if not stock:
         raise HTTPException(status_code=404, detail=f"Stock ID {
                             stock_id} not found")
-    return get_fundamental_analysis(stock["file"])
\ No newline at end of file
+    return StreamingResponse(stream_analysis(fundamental_collection, stock),
+                             media_type="text/event-stream")
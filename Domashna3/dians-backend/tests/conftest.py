@@ -0,0 +1,114 @@
+import asyncio
+import os
+from datetime import date, timedelta
+import numpy as np
+import pytest
+
+# Synthetic stock_records data in the format the scrapers store, the comparison
+# the indicator tests make against tech_results, the original one-window
+# implementation, and the API on in-memory mongomock collections.
+
+
+def mse_number(value, decimals=True):
+    """An MSE number string, '.' between thousands and ',' before the decimals."""
+    text = f"{value:,.2f}" if decimals else f"{int(value):,}"
+    return text.replace(",", " ").replace(".", ",").replace(" ", ".")
+
+
+def generate_history(bars, seed=0, last_date=date(2024, 12, 31)):
+    """The newest-first data array of a ticker with bars business days of a random walk."""
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0, 0.02, bars)
+    # some days nothing trades and the price stays
+    returns[rng.random(bars) < 0.1] = 0
+    closes = np.round(rng.uniform(100, 30000) * np.exp(np.cumsum(returns)))
+    highs = closes + np.round(np.abs(rng.normal(0, 0.01, bars)) * closes)
+    lows = np.maximum(closes - np.round(np.abs(rng.normal(0, 0.01, bars)) * closes), 1)
+    volumes = rng.poisson(500, bars) * (returns != 0)
+
+    days = []
+    day = last_date
+    while len(days) < bars:
+        if day.weekday() < 5:
+            days.append(day)
+        day -= timedelta(days=1)
+
+    return [{
+        "date": days[bars - 1 - i].strftime("%d.%m.%Y"),
+        "last_transaction": f"{mse_number(closes[i])} ден.",
+        "max_value": f"{mse_number(highs[i])} ден.",
+        "min_value": f"{mse_number(lows[i])} ден.",
+        "average": f"{mse_number(round((highs[i] + lows[i]) / 2))} ден.",
+        "change": mse_number(returns[i] * 100),
+        "volume": mse_number(volumes[i], decimals=False),
+        "best_sales": f"{mse_number(closes[i] * volumes[i])} ден.",
+        "all_sales": f"{mse_number(closes[i] * volumes[i])} ден.",
+    } for i in range(bars)][::-1]
+
+
+@pytest.fixture
+def history():
+    return generate_history
+
+
+def same_results(expected, got, tolerance=1e-3):
+    """
+    Assert that got holds the tech_results entries of expected, as (value, signal)
+    tuples, signals or values. The values are rounded to three decimals, and
+    summing in another order can move the last one.
+    """
+    for key, value in expected.items():
+        if isinstance(value, tuple):
+            assert got[key][1] == value[1], key
+            assert got[key][0] == pytest.approx(float(value[0]), abs=tolerance), key
+        elif isinstance(value, str):
+            assert got[key] == value, key
+        else:
+            assert got[key] == pytest.approx(float(value), abs=tolerance), key
+
+
+@pytest.fixture
+def assert_same_results():
+    return same_results
+
+
+@pytest.fixture(scope="session")
+def _api():
+    # main loads the LSTM and sentiment stacks at import time
+    for module in ["mongomock", "mongomock_motor", "tensorflow", "torch", "transformers"]:
+        pytest.importorskip(module)
+    import mongomock
+    import mongomock_motor
+    import motor.motor_asyncio
+    import pymongo
+    from fastapi.testclient import TestClient
+
+    # main connects at import time, so the clients are replaced before it is imported
+    pymongo.MongoClient = mongomock.MongoClient
+    motor.motor_asyncio.AsyncIOMotorClient = mongomock_motor.AsyncMongoMockClient
+    os.environ.setdefault("ANALYSIS_PROCESSES", "1")
+    import main
+    from Data.catalog import CATALOG_COLLECTION, catalog_entry
+
+    main.sentiment_service.start = lambda: None
+    main.sentiment_service.stop = lambda: None
+    stocks = [{"_id": f"T{i}", "data": generate_history(300, seed=i)} for i in range(3)]
+    db = main.client["stock_data"]
+
+    async def fill():
+        await db["stock_records"].insert_many(stocks)
+        await db[CATALOG_COLLECTION].insert_many(
+            [catalog_entry(stock["_id"], stock["data"][0], len(stock["data"])) for stock in stocks])
+
+    asyncio.run(fill())
+    with TestClient(main.app) as client:
+        yield main, client, [stock["_id"] for stock in stocks]
+
+
+@pytest.fixture
+def api(_api):
+    """The API on in-memory collections with three tickers, as (main, client, stock_ids), with empty caches."""
+    main = _api[0]
+    main.response_cache.invalidate()
+    main.price_cache.invalidate()
+    return _api
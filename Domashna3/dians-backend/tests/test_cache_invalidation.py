@@ -0,0 +1,13 @@
+def test_invalidate_needs_the_token_or_the_api_host(api, monkeypatch):
+    main, client, stock_ids = api
+    # TestClient connects from "testclient", which is not a loopback address
+    assert client.post("/cache/invalidate").status_code == 403
+    monkeypatch.setattr(main, "CACHE_TOKEN", "secret")
+    assert client.post("/cache/invalidate").status_code == 403
+    assert client.post("/cache/invalidate", headers={"X-Cache-Token": "secret"}).status_code == 204
+
+
+def test_loopback_hosts(api):
+    main = api[0]
+    assert main.is_loopback("127.0.0.1") and main.is_loopback("::1") and main.is_loopback("localhost")
+    assert not main.is_loopback("10.0.0.5") and not main.is_loopback("testclient") and not main.is_loopback(None)
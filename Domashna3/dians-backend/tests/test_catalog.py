@@ -0,0 +1,119 @@
+import asyncio
+from datetime import datetime
+import mongomock
+import mongomock_motor
+from pymongo import ReplaceOne
+from Data.catalog import CATALOG_COLLECTION, StockCatalog, catalog_entry, rebuild_catalog
+
+STOCK_IDS = ["ADIN", "ALK", "ALKB", "KMB", "TEL", "TTK"]
+
+
+class FakeRepository:
+
+    def __init__(self, stock_ids):
+        self.ids = stock_ids
+
+    async def stock_ids(self):
+        return self.ids
+
+
+class RecordingCollection:
+    """Records the bulk writes made to it."""
+
+    def __init__(self):
+        self.operations = []
+
+    def bulk_write(self, operations, ordered=True):
+        self.operations.extend(operations)
+
+
+def run(test, entries, repository_ids=(), ttl=60):
+    collection = mongomock_motor.AsyncMongoMockClient()["stock_data"][CATALOG_COLLECTION]
+
+    async def main():
+        if entries:
+            await collection.insert_many(entries)
+        await test(collection, StockCatalog(collection, FakeRepository(list(repository_ids)), ttl))
+
+    asyncio.run(main())
+
+
+def entry(stock_id, bars=10):
+    return catalog_entry(stock_id, {"date": "31.12.2024", "last_transaction": "1.234,50 ден."}, bars)
+
+
+def test_catalog_entry():
+    assert entry("ALK", 300) == {"_id": "ALK", "bars": 300, "has_fundamentals": False,
+                                 "last_date": datetime(2024, 12, 31), "last_price": 1234.5}
+    assert catalog_entry("NEW", None, 0, True) == {"_id": "NEW", "bars": 0, "has_fundamentals": True}
+
+
+def test_prefix_search():
+    async def test(collection, catalog):
+        assert await catalog.stock_ids() == STOCK_IDS
+        assert await catalog.stock_ids("") == STOCK_IDS
+        assert await catalog.stock_ids("ALK") == ["ALK", "ALKB"]
+        assert await catalog.stock_ids("A") == ["ADIN", "ALK", "ALKB"]
+        assert await catalog.stock_ids("TTK") == ["TTK"]
+        assert await catalog.stock_ids("T") == ["TEL", "TTK"]
+        assert await catalog.stock_ids("B") == []
+        assert await catalog.stock_ids("ZZZ") == []
+        assert await catalog.stock_ids("ALKBX") == []
+
+    run(test, [entry(stock_id) for stock_id in reversed(STOCK_IDS)])
+
+
+def test_entries():
+    async def test(collection, catalog):
+        assert await catalog.entries("KMB") == [{"stock_id": "KMB", "last_date": "31.12.2024", "last_price": 1234.5,
+                                                 "bars": 7, "has_fundamentals": False}]
+        assert [e["stock_id"] for e in await catalog.entries("AL")] == ["ALK", "ALKB"]
+
+    run(test, [entry(stock_id, 7) for stock_id in STOCK_IDS])
+
+
+def test_catalog_is_kept_until_invalidated():
+    async def test(collection, catalog):
+        assert await catalog.stock_ids() == ["ALK"]
+        await collection.insert_one(entry("KMB"))
+        assert await catalog.stock_ids() == ["ALK"]
+        catalog.invalidate()
+        assert await catalog.stock_ids() == ["ALK", "KMB"]
+
+    run(test, [entry("ALK")])
+
+
+def test_catalog_is_reloaded_after_the_ttl():
+    async def test(collection, catalog):
+        assert await catalog.stock_ids() == ["ALK"]
+        await collection.insert_one(entry("KMB"))
+        assert await catalog.stock_ids() == ["ALK", "KMB"]
+
+    run(test, [entry("ALK")], ttl=0)
+
+
+def test_repository_ids_until_the_catalog_is_built():
+    async def test(collection, catalog):
+        assert await catalog.stock_ids() == ["ALK", "KMB"]
+        assert await catalog.entries("K") == [{"stock_id": "KMB"}]
+
+    run(test, [], repository_ids=["KMB", "ALK"])
+
+
+def test_rebuild_catalog(history):
+    client = mongomock.MongoClient()
+    alk, kmb = history(30, seed=1), history(5, seed=2)
+    client["stock_data"]["stock_records"].insert_many([{"_id": "ALK", "data": alk}, {"_id": "KMB", "data": kmb},
+                                                       {"_id": "NEW", "data": []}])
+    client["stock_data"]["stock_fundamental"].insert_many([{"_id": "ALK", "document_id": "1", "file": "Текст"},
+                                                           {"_id": "KMB", "document_id": "2"}])
+    catalog = RecordingCollection()
+    db = {"stock_records": client["stock_data"]["stock_records"],
+          "stock_fundamental": client["stock_data"]["stock_fundamental"], CATALOG_COLLECTION: catalog}
+
+    assert rebuild_catalog(db) == 3
+    assert catalog.operations == [
+        ReplaceOne({"_id": "ALK"}, catalog_entry("ALK", alk[0], 30, True), upsert=True),
+        ReplaceOne({"_id": "KMB"}, catalog_entry("KMB", kmb[0], 5, False), upsert=True),
+        ReplaceOne({"_id": "NEW"}, catalog_entry("NEW", None, 0, False), upsert=True),
+    ]
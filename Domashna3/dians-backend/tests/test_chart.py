@@ -0,0 +1,53 @@
+import io
+import msgpack
+import numpy as np
+import pyarrow as pa
+from Data.chart import lttb
+
+
+def test_lttb_keeps_the_ends_and_the_spikes():
+    y = np.zeros(1000)
+    y[437] = 100
+    y[800] = -50
+    indices = lttb(np.arange(1000), y, 20)
+    assert len(indices) == 20
+    assert indices[0] == 0 and indices[-1] == 999
+    assert np.all(np.diff(indices) > 0)
+    assert {437, 800} <= set(indices.tolist())
+
+
+def test_lttb_keeps_short_series_whole():
+    assert lttb(np.arange(10), np.arange(10), 10).tolist() == list(range(10))
+    assert lttb(np.arange(10), np.arange(10), 50).tolist() == list(range(10))
+
+
+def test_chart_max_points(api):
+    main, client, stock_ids = api
+    dates, prices = client.get(f"/stocks/{stock_ids[0]}/chart").json()
+    sampled_dates, sampled_prices = client.get(f"/stocks/{stock_ids[0]}/chart?max_points=50").json()
+    assert len(sampled_dates) == 50
+    assert (sampled_dates[0], sampled_dates[-1]) == (dates[0], dates[-1])
+    assert dict(zip(sampled_dates, sampled_prices)).items() <= dict(zip(dates, prices)).items()
+
+
+def test_chart_binary_formats_match_json(api):
+    main, client, stock_ids = api
+    url = f"/stocks/{stock_ids[1]}/chart?max_points=100"
+    dates, prices = client.get(url).json()
+
+    response = client.get(f"{url}&format=msgpack")
+    assert response.headers["Content-Type"] == "application/msgpack"
+    columns = msgpack.unpackb(response.content)
+    assert np.frombuffer(columns["last_transaction"]["data"], "<i8").tolist() == prices
+    days = np.frombuffer(columns["date"]["data"], "<i4").astype("datetime64[D]")
+    assert [day.strftime("%d.%m.%Y") for day in days.tolist()] == dates
+
+    table = pa.ipc.open_stream(io.BytesIO(client.get(f"{url}&format=arrow").content)).read_all()
+    assert table.column("last_transaction").to_pylist() == prices
+    assert [day.strftime("%d.%m.%Y") for day in table.column("date").to_pylist()] == dates
+
+
+def test_chart_rejects_unknown_formats(api):
+    main, client, stock_ids = api
+    assert client.get(f"/stocks/{stock_ids[0]}/chart?format=csv").status_code == 400
+    assert client.get(f"/stocks/{stock_ids[0]}/chart?max_points=2").status_code == 422
@@ -0,0 +1,21 @@
+from LSTM.forecast_jobs import ForecastJob
+
+
+def test_plain_and_budget_requests_share_the_lstm_job(api, monkeypatch):
+    main, client, stock_ids = api
+    submitted = []
+
+    def submit(stock_id, version, model=None):
+        submitted.append((stock_id, version, model))
+        job = ForecastJob(stock_id, version, model)
+        job.status, job.result = "done", {"model": model, "forecast": [[], []]}
+        job.finished.set()
+        return job
+
+    monkeypatch.setattr(main.forecast_queue, "submit", submit)
+    assert client.post(f"/lstm_predict/{stock_ids[0]}/jobs").status_code == 202
+    # a budget that fits training the LSTM picks it too
+    response = client.get(f"/lstm_predict/{stock_ids[0]}?budget_ms=1000000")
+    assert response.headers["X-Forecast-Model"] == "lstm"
+    assert len(submitted) == 2 and submitted[0] == submitted[1]
+    assert submitted[0][2] == "lstm"
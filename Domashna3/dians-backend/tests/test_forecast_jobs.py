@@ -0,0 +1,75 @@
+import asyncio
+import pytest
+from LSTM.forecast_jobs import ForecastQueue, QueueFull
+
+
+def run_queue(test, **kwargs):
+    """Run test(queue, calls) on a started ForecastQueue whose forecasts wait for a release event."""
+    calls = []
+
+    async def main():
+        release = asyncio.Event()
+
+        async def forecast(stock_id, model):
+            calls.append((stock_id, model))
+            await release.wait()
+            if stock_id == "FAIL":
+                raise RuntimeError("no data")
+            return {"stock_id": stock_id}
+
+        queue = ForecastQueue(forecast, **kwargs)
+        queue.start()
+        try:
+            await test(queue, release)
+        finally:
+            await queue.stop()
+
+    asyncio.run(main())
+    return calls
+
+
+def test_requests_for_the_same_version_share_one_job():
+    async def test(queue, release):
+        jobs = [queue.submit("ALK", (100, "2024-12-31")) for _ in range(5)]
+        assert all(job is jobs[0] for job in jobs)
+        release.set()
+        await jobs[0].finished.wait()
+        assert jobs[0].to_json()["result"] == {"stock_id": "ALK"}
+        # the finished job is still served until the data changes
+        assert queue.submit("ALK", (100, "2024-12-31")) is jobs[0]
+        newer = queue.submit("ALK", (101, "2025-01-02"))
+        assert newer is not jobs[0]
+        await newer.finished.wait()
+
+    assert run_queue(test) == [("ALK", None), ("ALK", None)]
+
+
+def test_models_get_their_own_jobs():
+    async def test(queue, release):
+        assert queue.submit("ALK", (100, "2024-12-31"), "ar") is not queue.submit("ALK", (100, "2024-12-31"))
+        release.set()
+
+    run_queue(test)
+
+
+def test_failed_jobs_are_retried():
+    async def test(queue, release):
+        job = queue.submit("FAIL", (1, "2024-12-31"))
+        release.set()
+        await job.finished.wait()
+        assert job.to_json() == {"job_id": job.id, "stock_id": "FAIL", "status": "failed", "error": "no data"}
+        assert queue.submit("FAIL", (1, "2024-12-31")) is not job
+
+    run_queue(test)
+
+
+def test_full_queue_refuses_new_jobs():
+    async def test(queue, release):
+        first = queue.submit("A", (1, "2024-12-31"))
+        queue.submit("B", (1, "2024-12-31"))
+        with pytest.raises(QueueFull):
+            queue.submit("C", (1, "2024-12-31"))
+        # a job that is already queued is still shared
+        assert queue.submit("A", (1, "2024-12-31")) is first
+
+    assert run_queue(test, workers=0, max_queue=2) == []
@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+import pytest
+from LSTM.forecasters import AR_MS, AutoregressiveForecaster, LastPriceForecaster
+
+
+def frame(prices):
+    return pd.DataFrame({"last_transaction": prices},
+                        index=pd.date_range("2024-01-01", periods=len(prices)))
+
+
+def columns(rows):
+    prices = 1000 + np.cumsum(np.random.default_rng(rows).normal(0, 10, rows))
+    return {"date": np.datetime64("2024-01-01") + np.arange(rows).astype("timedelta64[D]"),
+            "last_transaction": prices.astype(np.int64)}
+
+
+def ar_series(length, coefficients, intercept, start):
+    values = list(start)
+    while len(values) < length:
+        values.append(np.dot(coefficients, values[-len(coefficients):]) + intercept)
+    return values
+
+
+@pytest.fixture
+def lstm_predictor(monkeypatch):
+    pytest.importorskip("tensorflow")
+    from LSTM import lstm_predictor
+
+    # no ticker has a model in the registry
+    monkeypatch.setattr(lstm_predictor.model_registry, "load_metadata", lambda ticker: None)
+    return lstm_predictor
+
+
+def test_ar_continues_a_known_series():
+    # p[t] = 0.3 p[t-2] + 0.6 p[t-1] + 100, without noise
+    series = ar_series(80, [0.3, 0.6], 100, [1000, 1200])
+    forecast = AutoregressiveForecaster(order=2).forecast(frame(series[:70]), num_prediction=10)
+    assert forecast[0] == int(series[69])
+    assert forecast[1:] == pytest.approx([int(x) for x in series[70:]], abs=1)
+
+
+def test_ar_continues_a_trend():
+    prices = [100 + 3 * i for i in range(60)]
+    forecast = AutoregressiveForecaster().forecast(frame(prices), num_prediction=5)
+    assert forecast == pytest.approx([277 + 3 * i for i in range(6)], abs=1)
+
+
+def test_ar_fits_only_the_recent_history():
+    # a level shift older than the history does not move the forecast
+    prices = [5000] * 100 + [100 + 3 * i for i in range(60)]
+    forecast = AutoregressiveForecaster(history=60).forecast(frame(prices), num_prediction=5)
+    assert forecast == pytest.approx([277 + 3 * i for i in range(6)], abs=1)
+
+
+def test_last_price_forecaster():
+    assert LastPriceForecaster().forecast(frame([5, 7, 9]), num_prediction=3) == [9, 9, 9, 9]
+
+
+def test_min_rows():
+    assert AutoregressiveForecaster(order=5).min_rows == 11
+    assert AutoregressiveForecaster(order=2).min_rows == 5
+    assert LastPriceForecaster().min_rows == 1
+
+
+@pytest.mark.parametrize("rows, expected", [(1, "last_price"), (10, "last_price"), (11, "ar"),
+                                            (49, "ar"), (50, "lstm"), (300, "lstm")])
+def test_select_forecaster_without_a_budget(lstm_predictor, rows, expected):
+    data = lstm_predictor.prepare_data(columns(rows))
+    assert lstm_predictor.select_forecaster(data, "ALK").name == expected
+
+
+@pytest.mark.parametrize("budget_ms, expected", [(0, "last_price"), (AR_MS, "ar"),
+                                                 (1000, "ar"), (10 ** 6, "lstm")])
+def test_select_forecaster_within_a_budget(lstm_predictor, budget_ms, expected):
+    data = lstm_predictor.prepare_data(columns(300))
+    assert lstm_predictor.select_forecaster(data, "ALK", budget_ms).name == expected
+
+
+def test_a_precomputed_lstm_forecast_fits_a_small_budget(lstm_predictor, monkeypatch):
+    data = lstm_predictor.prepare_data(columns(300))
+    metadata = {"last_date": data.index[-1].strftime("%d.%m.%Y"), "forecast": [1] * 10}
+    monkeypatch.setattr(lstm_predictor.model_registry, "load_metadata", lambda ticker: metadata)
+    assert lstm_predictor.select_forecaster(data, "ALK", lstm_predictor.LSTM_CACHED_MS).name == "lstm"
+
+
+def test_predictor_falls_back_when_there_are_too_few_rows(lstm_predictor):
+    assert lstm_predictor.predictor(columns(20), "ALK", "lstm")["model"] == "ar"
+    assert lstm_predictor.predictor(columns(5), "ALK", "ar")["model"] == "last_price"
+
+
+def test_budget_predictor(lstm_predictor):
+    prediction = lstm_predictor.budget_predictor(columns(300), "ALK", 1000)
+    assert prediction["model"] == "ar"
+    assert len(prediction["forecast"]) == lstm_predictor.NUM_PREDICTION + 1
+    # the LSTM is left to the forecast queue
+    assert lstm_predictor.budget_predictor(columns(300), "ALK", 10 ** 6) is None
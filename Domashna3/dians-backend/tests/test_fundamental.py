@@ -0,0 +1,79 @@
+import hashlib
+import time
+import pytest
+
+# the module imports the model libraries, none of these tests loads a model
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+from Fundamental.fundamental_analysis import SENTIMENT_MAP, SentimentService, sentences, split_chunks, summarize
+
+FILING = ("Друштвото оствари добивка од 1.234.567,00 ден. во 2024 година. Приходите пораснаа! "
+          "Дали ќе има дивиденда?\nТабела 1\n\n  Ред   со   празни   места  ")
+
+
+def test_sentences():
+    assert list(sentences(FILING)) == [
+        "Друштвото оствари добивка од 1.234.567,00 ден.", "во 2024 година.", "Приходите пораснаа!",
+        "Дали ќе има дивиденда?", "Табела 1", "  Ред   со   празни   места  "]
+
+
+# the longest word has 12 characters
+@pytest.mark.parametrize("max_chars", [12, 25, 60, 400])
+def test_split_chunks_keep_every_word_within_max_chars(max_chars):
+    chunks = list(split_chunks(FILING, max_chars))
+    assert all(0 < len(chunk) <= max_chars for chunk in chunks)
+    assert " ".join(chunks).split() == FILING.split()
+
+
+def test_split_chunks_group_whole_sentences():
+    assert list(split_chunks("Едно. Две. Три. Четири.", 11)) == ["Едно. Две.", "Три.", "Четири."]
+    assert list(split_chunks(FILING)) == [" ".join(FILING.split())]
+    assert list(split_chunks("")) == []
+    assert list(split_chunks(" \n\n ")) == []
+
+
+def test_split_chunks_cut_overlong_words():
+    assert list(split_chunks("a" * 25 + " b", 10)) == ["a" * 10, "a" * 10, "a" * 5 + " b"]
+
+
+def test_summarize_weights_chunks_by_length():
+    very_positive = [0, 0, 0, 0.1, 0.9]
+    negative = [0.1, 0.8, 0.1, 0, 0]
+    results = [{"chars": 100, "translation": "Profit grew.", "sentiment": ["Very Positive"], "scores": very_positive},
+               {"chars": 300, "translation": "Losses.", "sentiment": ["Negative"], "scores": negative}]
+    summary = summarize("Текст", results)
+    assert summary == {"hash": hashlib.sha256("Текст".encode("utf-8")).hexdigest(),
+                       "translation": "Profit grew. Losses.", "sentiment": ["Negative"],
+                       "chunks": ["Very Positive", "Negative"]}
+
+
+def test_summarize_an_empty_filing():
+    summary = summarize("", [])
+    assert summary["sentiment"] == [SENTIMENT_MAP[2]]
+    assert summary["translation"] == "" and summary["chunks"] == []
+
+
+def test_collect_batch_stops_at_max_batch_size():
+    service = SentimentService(max_batch_size=3, max_wait_ms=1000)
+    for item in ["b", "c", "d"]:
+        service._queue.put(item)
+    assert service._collect_batch("a") == ["a", "b", "c"]
+    assert service._queue.get_nowait() == "d"
+
+
+def test_collect_batch_waits_at_most_max_wait():
+    service = SentimentService(max_batch_size=8, max_wait_ms=50)
+    service._queue.put("b")
+    start = time.monotonic()
+    assert service._collect_batch("a") == ["a", "b"]
+    assert 0.04 <= time.monotonic() - start < 1
+
+
+def test_collect_batch_leaves_the_stop_signal():
+    service = SentimentService(max_batch_size=8, max_wait_ms=1000)
+    service._queue.put("b")
+    service._queue.put(None)
+    service._queue.put("c")
+    assert service._collect_batch("a") == ["a", "b"]
+    assert service._queue.get_nowait() == "c"
+    assert service._queue.get_nowait() is None
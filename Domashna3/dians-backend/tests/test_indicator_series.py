@@ -0,0 +1,39 @@
+import pytest
+from Data.parser import parse_columns
+from Technical.indicator_series import series_results
+from Technical.tech_analysis import tech_results
+
+BARS = 120
+
+
+def point(series, t):
+    """The tech_results-shaped entries of a series at bar t."""
+    return {key: (value["values"][t], value["signals"][t]) if isinstance(value, dict) else value[t]
+            for key, value in series.items() if key not in ("dates", "prices")}
+
+
+@pytest.mark.parametrize("window", [2, 3, 7, 14, 30])
+def test_series_match_tech_results(window, history, assert_same_results):
+    data = history(BARS, seed=window)
+    series = series_results(parse_columns(data), window)
+    for t in range(window - 1, BARS):
+        newest = BARS - 1 - t
+        assert_same_results(tech_results(data[newest:newest + window], window), point(series, t))
+
+
+@pytest.mark.parametrize("limit", [1, 10, 90, BARS + 10])
+def test_limit_keeps_the_last_bars(limit, history):
+    columns = parse_columns(history(BARS, seed=1))
+    full = series_results(columns, 30)
+    limited = series_results(columns, 30, limit=limit)
+    assert limited == {key: {part: values[-limit:] for part, values in value.items()}
+                       if isinstance(value, dict) else value[-limit:] for key, value in full.items()}
+
+
+def test_date_from_keeps_the_bars_from_that_date(history):
+    columns = parse_columns(history(BARS, seed=2))
+    full = series_results(columns, 7)
+    start = 50
+    since = series_results(columns, 7, date_from=columns["date"][start].astype(object))
+    assert since["dates"] == full["dates"][start:]
+    assert since["rsi"] == {part: values[start:] for part, values in full["rsi"].items()}
@@ -0,0 +1,23 @@
+import json
+import pytest
+from Data.parser import PRICE_FIELDS, parse_columns
+from Technical.indicator_state import IndicatorState
+from Technical.tech_analysis import multi_window_columns
+
+WINDOWS = [2, 7, 30, 45]
+BARS = 150
+
+
+@pytest.mark.parametrize("step", [1, 3, 10])
+def test_incremental_state_matches_multi_window_columns(step, history, assert_same_results):
+    columns = parse_columns(history(BARS, seed=step))
+    state = IndicatorState("T", WINDOWS)
+    for end in range(step, BARS + 1, step):
+        state.update({part: columns[part][end - step:end] for part in ["date", *PRICE_FIELDS]})
+        # every run of the updater starts from the stored document
+        state = IndicatorState.from_document(json.loads(json.dumps(state.to_document())))
+        if end < 2:
+            continue
+        expected = multi_window_columns({part: columns[part][:end][::-1] for part in PRICE_FIELDS}, WINDOWS)
+        for window in WINDOWS:
+            assert_same_results(expected[window], state.result(window))
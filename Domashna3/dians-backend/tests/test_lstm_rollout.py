@@ -0,0 +1,45 @@
+import gc
+import weakref
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("tensorflow")
+from keras.api.layers import LSTM, Dense
+from keras.api.models import Sequential
+from LSTM import lstm_predictor
+
+
+def registry_model(seed):
+    """An untrained model with the architecture train_model builds."""
+    model = Sequential([LSTM(100, activation="relu", return_sequences=True),
+                        LSTM(50, activation="relu"), Dense(1, activation="linear")])
+    model.build((None, lstm_predictor.LAG, 1))
+    rng = np.random.default_rng(seed)
+    model.set_weights([rng.normal(0, 0.2, weight.shape) for weight in model.get_weights()])
+    return model
+
+
+def entry(seed):
+    prices = 1000 + np.cumsum(np.random.default_rng(seed).normal(0, 10, 60))
+    data = pd.DataFrame({"last_transaction": prices}, index=pd.date_range("2024-01-01", periods=60))
+    metadata = {"lag": lstm_predictor.LAG, "scaler": {"min": float(prices.min()), "max": float(prices.max())}}
+    return registry_model(seed), metadata, data
+
+
+def test_batched_forecast_matches_each_model():
+    entries = [entry(seed) for seed in range(3)]
+    for (model, metadata, data), values in zip(entries, lstm_predictor.forecast_batch(entries)):
+        window = lstm_predictor.scale(data["last_transaction"].to_numpy()[-metadata["lag"]:], metadata["scaler"])
+        steps = lstm_predictor._eager_rollout(model, window[None, :], lstm_predictor.NUM_PREDICTION)[0]
+        expected = lstm_predictor.unscale(np.append(window[-1], steps), metadata["scaler"])
+        assert values == pytest.approx(expected, abs=1)
+
+
+def test_forecast_keeps_no_model_alive():
+    model, metadata, data = entry(0)
+    lstm_predictor.forecast(model, metadata, data)
+    collected = weakref.ref(model)
+    del model
+    gc.collect()
+    assert collected() is None
@@ -0,0 +1,48 @@
+from datetime import datetime
+import mongomock
+import pytest
+from Data.migrate import migrate_ticker, to_bars
+from Data.queries import STOCK_FIELDS
+from Data.repository import BARS_COLLECTION
+
+BAR = {"date": "31.12.2024", "last_transaction": "1.234,50 ден.", "max_value": "1.240,00 ден.",
+       "min_value": "1.230,00 ден.", "average": "1.235,25 ден.", "change": "-0,54",
+       "volume": "12.345", "best_sales": "15.240.202,50 ден.", "all_sales": "0,00 ден."}
+
+
+def test_to_bars():
+    assert to_bars("ALK", [BAR]) == [{
+        "ticker": "ALK", "date": datetime(2024, 12, 31), "last_transaction": 1234.5,
+        "max_value": 1240.0, "min_value": 1230.0, "average": 1235.25, "change": -0.54,
+        "volume": 12345, "best_sales": 15240202.5, "all_sales": 0.0}]
+    assert to_bars("ALK", []) == []
+
+
+def test_to_bars_keeps_every_bar(history):
+    data = history(50)
+    bars = to_bars("ALK", data)
+    assert [bar["date"].strftime("%d.%m.%Y") for bar in bars] == [entry["date"] for entry in data]
+    assert all(bar.keys() == {"ticker", *STOCK_FIELDS} for bar in bars)
+
+
+@pytest.mark.parametrize("field, value", [("last_transaction", "n/a ден."), ("volume", "1,5"), ("change", "")])
+def test_to_bars_rejects_malformed_numbers(field, value):
+    with pytest.raises(ValueError):
+        to_bars("ALK", [BAR, {**BAR, field: value}])
+
+
+def test_migrate_ticker_replaces_the_tickers_bars(history):
+    db = mongomock.MongoClient()["stock_data"]
+    assert migrate_ticker(db, {"_id": "ALK", "data": history(30)}) == 30
+    assert migrate_ticker(db, {"_id": "KMB", "data": history(10)}) == 10
+    assert migrate_ticker(db, {"_id": "ALK", "data": history(40)}) == 40
+    assert db[BARS_COLLECTION].count_documents({"ticker": "ALK"}) == 40
+    assert db[BARS_COLLECTION].count_documents({"ticker": "KMB"}) == 10
+
+
+def test_malformed_tickers_keep_their_bars(history):
+    db = mongomock.MongoClient()["stock_data"]
+    migrate_ticker(db, {"_id": "ALK", "data": history(30)})
+    with pytest.raises(ValueError):
+        migrate_ticker(db, {"_id": "ALK", "data": [BAR, {**BAR, "volume": "n/a"}]})
+    assert db[BARS_COLLECTION].count_documents({"ticker": "ALK"}) == 30
@@ -0,0 +1,81 @@
+from datetime import date
+import numpy as np
+import pytest
+from Data.parser import (format_dates, format_decimal, format_price, format_volume, parse_columns, parse_dates,
+                         parse_decimals, parse_prices, parse_volumes)
+from Technical.tech_analysis import parse_singular
+
+PRICES = ["0,00 ден.", "7,50 ден.", "999,99 ден.", "1.234,00 ден.", "21.500,40 ден.", "1.234.567,89 ден.",
+          "-0,54 ден.", "-1.234,56 ден."]
+
+
+def test_parse_prices_match_parse_singular():
+    assert parse_prices(PRICES).tolist() == [parse_singular(price) for price in PRICES]
+    assert parse_prices(PRICES).dtype == np.int64
+
+
+def test_parse_prices_match_parse_singular_on_history(history):
+    data = history(300, seed=3)
+    for field in ["last_transaction", "max_value", "min_value"]:
+        values = [entry[field] for entry in data]
+        assert parse_prices(values).tolist() == [parse_singular(value) for value in values]
+
+
+def test_parse_volumes_with_thousand_separators_and_zero():
+    assert parse_volumes(["0", "7", "1.234", "12.345.678"]).tolist() == [0, 7, 1234, 12345678]
+
+
+def test_parse_decimals_keep_the_sign_and_decimals():
+    values = ["-0,54", "0,00", "3,10", "-12,75", "1.234,50"]
+    assert parse_decimals(values).tolist() == [-0.54, 0.0, 3.1, -12.75, 1234.5]
+
+
+def test_parse_decimals_on_history_changes(history):
+    data = history(300, seed=4)
+    changes = parse_decimals([entry["change"] for entry in data])
+    assert (changes < 0).any() and (changes == 0).any()
+    assert [format_decimal(change) for change in changes] == [entry["change"] for entry in data]
+
+
+def test_format_round_trips():
+    assert format_price(1234.5) == "1.234,50 ден."
+    assert parse_decimals([format_price(-1234567.25)]).tolist() == [-1234567.25]
+    assert format_volume(0) == "0"
+    assert parse_volumes([format_volume(v) for v in [0, 999, 1000, 12345678]]).tolist() == [0, 999, 1000, 12345678]
+
+
+def test_parse_dates():
+    values = ["01.01.1970", "29.02.2024", "31.12.2024", "15.07.2003"]
+    expected = [date(1970, 1, 1), date(2024, 2, 29), date(2024, 12, 31), date(2003, 7, 15)]
+    assert parse_dates(values).tolist() == expected
+    assert format_dates(parse_dates(values)) == values
+
+
+def test_empty_columns():
+    assert parse_prices([]).dtype == np.int64
+    assert parse_volumes([]).dtype == np.int64
+    assert parse_dates([]).dtype == np.dtype("datetime64[D]")
+
+
+@pytest.mark.parametrize("values", [
+    ["1.234,00 ден.", "abc ден."],
+    ["1.234,00 ден.", ""],
+    ["12,5,0 ден."],
+])
+def test_malformed_prices_are_rejected(values):
+    with pytest.raises(ValueError):
+        parse_prices(values)
+
+
+@pytest.mark.parametrize("values", [["1.234", "n/a"], ["", "5"], ["1,5"]])
+def test_malformed_volumes_are_rejected(values):
+    with pytest.raises(ValueError):
+        parse_volumes(values)
+
+
+def test_parse_columns_is_chronological(history):
+    data = history(20, seed=1)
+    columns = parse_columns(data)
+    assert np.all(np.diff(columns["date"]) > np.timedelta64(0, "D"))
+    assert columns["last_transaction"][-1] == parse_singular(data[0]["last_transaction"])
+    assert columns["volume"].tolist() == [int(entry["volume"].replace(".", "")) for entry in data[::-1]]
@@ -0,0 +1,119 @@
+import asyncio
+import numpy as np
+from Data.price_cache import PriceCache, columns_size
+
+
+class FakeRepository:
+    """Tickers with a version and columns of bars int64 values each, counting the loads."""
+
+    def __init__(self, **bars):
+        self.bars = bars
+        self.loads = []
+
+    async def version(self, stock_id):
+        if stock_id not in self.bars:
+            return None
+        return self.bars[stock_id], "31.12.2024"
+
+    async def load_columns(self, stock_id):
+        self.loads.append(stock_id)
+        if stock_id not in self.bars:
+            return None
+        return {"close": np.arange(self.bars[stock_id], dtype=np.int64)}
+
+
+def test_entries_are_served_until_the_version_changes():
+    repository = FakeRepository(ALK=10)
+    cache = PriceCache(repository)
+
+    async def test():
+        columns = await cache.get("ALK")
+        assert await cache.get("ALK") is columns
+        assert repository.loads == ["ALK"]
+
+        repository.bars["ALK"] = 11
+        reloaded = await cache.get("ALK")
+        assert len(reloaded["close"]) == 11
+        assert repository.loads == ["ALK", "ALK"]
+
+    asyncio.run(test())
+
+
+def test_least_recently_used_entries_are_evicted_by_size():
+    repository = FakeRepository(A=10, B=10, C=10)
+    cache = PriceCache(repository, max_bytes=2 * 10 * 8)
+
+    async def test():
+        await cache.get("A")
+        await cache.get("B")
+        await cache.get("A")
+        await cache.get("C")
+        assert cache.size == 2 * 10 * 8
+        assert (await cache.peek("A"))[0] is not None
+        assert (await cache.peek("B"))[0] is None
+        assert (await cache.peek("C"))[0] is not None
+
+    asyncio.run(test())
+
+
+def test_entries_larger_than_the_cache_are_not_kept():
+    repository = FakeRepository(BIG=100, SMALL=1)
+    cache = PriceCache(repository, max_bytes=80)
+
+    async def test():
+        await cache.get("SMALL")
+        assert len((await cache.get("BIG"))["close"]) == 100
+        assert cache.size == columns_size({"close": np.zeros(1, dtype=np.int64)})
+        assert (await cache.peek("BIG"))[0] is None
+        assert (await cache.peek("SMALL"))[0] is not None
+
+    asyncio.run(test())
+
+
+def test_peek_never_loads():
+    repository = FakeRepository(ALK=10)
+    cache = PriceCache(repository)
+
+    async def test():
+        assert await cache.peek("ALK") == (None, True)
+        assert await cache.peek("MISSING") == (None, False)
+        assert repository.loads == []
+
+        columns = await cache.get("ALK")
+        assert await cache.peek("ALK") == (columns, True)
+        repository.bars["ALK"] = 12
+        assert await cache.peek("ALK") == (None, True)
+
+    asyncio.run(test())
+
+
+def test_invalidate():
+    repository = FakeRepository(A=10, B=10)
+    cache = PriceCache(repository)
+
+    async def test():
+        await cache.get("A")
+        await cache.get("B")
+        cache.invalidate("A")
+        assert (await cache.peek("A"))[0] is None
+        assert (await cache.peek("B"))[0] is not None
+        assert cache.size == 10 * 8
+
+        cache.invalidate()
+        assert (await cache.peek("B"))[0] is None
+        assert cache.size == 0
+
+    asyncio.run(test())
+
+
+def test_missing_tickers_are_dropped():
+    repository = FakeRepository(ALK=10)
+    cache = PriceCache(repository)
+
+    async def test():
+        await cache.get("ALK")
+        del repository.bars["ALK"]
+        assert await cache.get("ALK") is None
+        assert cache.size == 0
+
+    asyncio.run(test())
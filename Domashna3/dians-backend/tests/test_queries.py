@@ -0,0 +1,90 @@
+import asyncio
+import json
+from datetime import date, datetime
+import mongomock
+import mongomock_motor
+import numpy as np
+import pytest
+from Data.parser import parse_columns
+from Data.queries import data_pipeline, fetch_data, parse_date, slice_columns
+
+SELECTIONS = [
+    (None, None, None),
+    (None, None, 5),
+    (None, None, 0),
+    ("15.01.2025", None, None),
+    (None, "15.01.2025", 10),
+    ("28.11.2024", "03.02.2025", None),
+    ("28.11.2024", "03.02.2025", 7),
+    ("01.03.2025", "01.02.2025", None),
+]
+
+
+def run_pipeline(collection, pipeline):
+    # mongomock lacks $substrBytes but has its older alias $substr, the same on ASCII dates
+    return list(collection.aggregate(json.loads(json.dumps(pipeline).replace("$substrBytes", "$substr"))))
+
+
+def select(data, date_from, date_to, limit):
+    """The bars of the newest-first data the pipeline should return."""
+    bars = [bar for bar in data
+            if (date_from is None or parse_date(bar["date"]) >= date_from)
+            and (date_to is None or parse_date(bar["date"]) <= date_to)]
+    return bars if limit is None else bars[:limit]
+
+
+@pytest.fixture
+def data(history):
+    # crosses a year, so comparing dd.mm.yyyy strings as they are would go wrong
+    return history(120, last_date=date(2025, 3, 31))
+
+
+def test_parse_date():
+    assert parse_date("05.02.2025") == datetime(2025, 2, 5)
+    with pytest.raises(ValueError):
+        parse_date("2025-02-05")
+
+
+@pytest.mark.parametrize("date_from, date_to, limit", SELECTIONS)
+def test_data_pipeline_selects_bars(data, date_from, date_to, limit):
+    date_from = date_from and parse_date(date_from)
+    date_to = date_to and parse_date(date_to)
+    collection = mongomock.MongoClient()["stock_data"]["stock_records"]
+    collection.insert_one({"_id": "ALK", "data": data})
+
+    stocks = run_pipeline(collection, data_pipeline("ALK", date_from, date_to, limit))
+    assert stocks[0]["data"] == select(data, date_from, date_to, limit)
+    assert run_pipeline(collection, data_pipeline("MISSING", date_from, date_to, limit)) == []
+
+
+def test_data_pipeline_selects_fields(data):
+    collection = mongomock.MongoClient()["stock_data"]["stock_records"]
+    collection.insert_one({"_id": "ALK", "data": data})
+    stocks = run_pipeline(collection, data_pipeline("ALK", limit=3, fields=["date", "volume"]))
+    assert stocks[0]["data"] == [{"date": bar["date"], "volume": bar["volume"]} for bar in data[:3]]
+
+
+@pytest.mark.parametrize("date_from, date_to, limit", SELECTIONS)
+def test_slice_columns_selects_the_same_bars(data, date_from, date_to, limit):
+    date_from = date_from and parse_date(date_from)
+    date_to = date_to and parse_date(date_to)
+    columns = slice_columns(parse_columns(data), date_from, date_to, limit)
+    expected = parse_columns(select(data, date_from, date_to, limit))
+    assert columns.keys() == expected.keys()
+    for name, column in expected.items():
+        assert np.array_equal(columns[name], column), name
+
+
+def test_fetch_data(data):
+    collection = mongomock_motor.AsyncMongoMockClient()["stock_data"]["stock_records"]
+
+    async def test():
+        await collection.insert_one({"_id": "ALK", "data": data})
+        assert await fetch_data(collection, "ALK") == data
+        assert await fetch_data(collection, "ALK", limit=4) == data[:4]
+        assert await fetch_data(collection, "ALK", limit=2, fields=["change"]) == [
+            {"change": bar["change"]} for bar in data[:2]]
+        assert await fetch_data(collection, "MISSING") is None
+        assert await fetch_data(collection, "MISSING", limit=2, fields=["change"]) is None
+
+    asyncio.run(test())
@@ -0,0 +1,146 @@
+import asyncio
+from datetime import datetime
+import mongomock_motor
+import numpy as np
+import pytest
+from Data.catalog import CATALOG_COLLECTION, catalog_entry
+from Data.migrate import to_bars
+from Data.parser import PRICE_FIELDS, parse_columns
+from Data.repository import (BARS_COLLECTION, BarStockRepository, CutoverStockRepository,
+                             DocumentStockRepository, get_repository)
+
+# The bar layout has to return the same MSE strings and columns as stock_records
+# from the numbers migrate.py converted them into. mongomock lacks $substrBytes
+# and $topN, so the date ranges of DocumentStockRepository are left to
+# test_queries and BarStockRepository.recent_columns is not covered.
+
+SELECTIONS = [
+    dict(),
+    dict(limit=10),
+    dict(date_from=datetime(2024, 11, 1)),
+    dict(date_from=datetime(2024, 11, 1), date_to=datetime(2024, 11, 30), limit=5),
+    dict(date_to=datetime(2023, 1, 1)),
+]
+
+
+def select(data, date_from=None, date_to=None, limit=None):
+    """The newest-first bars of data a selection returns."""
+    bars = [bar for bar in data
+            if (date_from is None or datetime.strptime(bar["date"], "%d.%m.%Y") >= date_from)
+            and (date_to is None or datetime.strptime(bar["date"], "%d.%m.%Y") <= date_to)]
+    return bars if limit is None else bars[:limit]
+
+
+def run(test, stocks, migrated=(), catalog=True):
+    """Run test(db) on a database with stocks in stock_records and the migrated ones copied to stock_bars."""
+    db = mongomock_motor.AsyncMongoMockClient()["stock_data"]
+
+    async def main():
+        await db["stock_records"].insert_many([{"_id": stock_id, "data": data} for stock_id, data in stocks.items()])
+        for stock_id in migrated:
+            await db[BARS_COLLECTION].insert_many(to_bars(stock_id, stocks[stock_id]))
+            if catalog:
+                await db[CATALOG_COLLECTION].insert_one(
+                    catalog_entry(stock_id, stocks[stock_id][0], len(stocks[stock_id])))
+        await test(db)
+
+    asyncio.run(main())
+
+
+def assert_same_columns(expected, got):
+    assert expected.keys() == got.keys()
+    for name, column in expected.items():
+        assert np.array_equal(column, got[name]), name
+
+
+@pytest.mark.parametrize("catalog", [True, False])
+def test_bars_match_documents(history, catalog):
+    data = history(300, seed=5)
+
+    async def test(db):
+        documents = DocumentStockRepository(db["stock_records"])
+        bars = BarStockRepository(db[BARS_COLLECTION], db[CATALOG_COLLECTION])
+        assert await bars.stock_ids() == ["ALK"]
+        assert await bars.version("ALK") == await documents.version("ALK") == (300, data[0]["date"])
+        assert await bars.load_data("ALK") == await documents.load_data("ALK") == data
+        assert_same_columns(await documents.load_columns("ALK"), await bars.load_columns("ALK"))
+        for selection in SELECTIONS:
+            expected = select(data, **selection)
+            assert await bars.load_data("ALK", fields=["date", "change", "volume"], **selection) == [
+                {field: bar[field] for field in ["date", "change", "volume"]} for bar in expected]
+            assert_same_columns(parse_columns(expected), await bars.load_columns("ALK", **selection))
+
+    run(test, {"ALK": data}, migrated=["ALK"], catalog=catalog)
+
+
+def test_bar_version_reads_the_catalog(history):
+    data = history(20)
+
+    async def test(db):
+        bars = BarStockRepository(db[BARS_COLLECTION], db[CATALOG_COLLECTION])
+        await db[CATALOG_COLLECTION].update_one({"_id": "ALK"}, {"$set": {"bars": 21}})
+        assert await bars.version("ALK") == (21, data[0]["date"])
+
+    run(test, {"ALK": data}, migrated=["ALK"])
+
+
+def test_missing_tickers(history):
+    async def test(db):
+        for repository in [DocumentStockRepository(db["stock_records"]),
+                           BarStockRepository(db[BARS_COLLECTION], db[CATALOG_COLLECTION])]:
+            assert await repository.version("MISSING") is None
+            assert await repository.load_data("MISSING") is None
+            assert await repository.load_columns("MISSING") is None
+
+    run(test, {"ALK": history(20)}, migrated=["ALK"])
+
+
+def test_bars_of_an_empty_range(history):
+    async def test(db):
+        bars = BarStockRepository(db[BARS_COLLECTION], db[CATALOG_COLLECTION])
+        # a ticker with no bars in the range still exists
+        assert await bars.load_data("ALK", date_to=datetime(2000, 1, 1)) == []
+        assert len((await bars.load_columns("ALK", date_to=datetime(2000, 1, 1)))["date"]) == 0
+
+    run(test, {"ALK": history(20)}, migrated=["ALK"])
+
+
+def test_document_recent_columns(history):
+    stocks = {f"T{i}": history(30, seed=i) for i in range(3)}
+
+    async def test(db):
+        recent = {stock_id: columns async for stock_id, columns
+                  in DocumentStockRepository(db["stock_records"]).recent_columns(10)}
+        assert recent.keys() == stocks.keys()
+        for stock_id, columns in recent.items():
+            assert len(columns["date"]) == 10
+            assert columns.keys() == {"date", *PRICE_FIELDS}
+
+    run(test, stocks)
+
+
+def test_cutover_prefers_migrated_tickers(history):
+    # MIG has more bars in stock_bars than stock_records still holds
+    stocks = {"MIG": history(40, seed=1), "OLD": history(30, seed=2)}
+
+    async def test(db):
+        await db["stock_records"].update_one({"_id": "MIG"}, {"$set": {"data": stocks["MIG"][:25]}})
+        cutover = get_repository(db, "cutover")
+        assert isinstance(cutover, CutoverStockRepository)
+        assert await cutover.stock_ids() == ["MIG", "OLD"]
+        assert await cutover.version("MIG") == (40, stocks["MIG"][0]["date"])
+        assert await cutover.version("OLD") == (30, stocks["OLD"][0]["date"])
+        assert await cutover.load_data("MIG") == stocks["MIG"]
+        assert await cutover.load_data("OLD") == stocks["OLD"]
+        assert len((await cutover.load_columns("MIG"))["date"]) == 40
+        assert await cutover.load_data("MISSING") is None
+
+    run(test, stocks, migrated=["MIG"])
+
+
+def test_get_repository():
+    db = mongomock_motor.AsyncMongoMockClient()["stock_data"]
+    assert isinstance(get_repository(db, "documents"), DocumentStockRepository)
+    assert isinstance(get_repository(db, "bars"), BarStockRepository)
+    with pytest.raises(ValueError):
+        get_repository(db, "files")
@@ -0,0 +1,57 @@
+import asyncio
+from Data.response_cache import etag_matches, version_etag
+
+ETAG = version_etag("ALK", (300, "31.12.2024"))
+
+
+def test_etag_matches_weakly():
+    assert etag_matches(ETAG, ETAG)
+    assert etag_matches(ETAG.removeprefix("W/"), ETAG)
+    assert etag_matches(f'W/"other", {ETAG}', ETAG)
+    assert etag_matches("*", ETAG)
+    assert not etag_matches('W/"ALK-299-30.12.2024"', ETAG)
+    assert not etag_matches(None, ETAG)
+
+
+def test_conditional_get(api):
+    main, client, stock_ids = api
+    url = f"/stocks/{stock_ids[0]}/chart"
+
+    first = client.get(url)
+    assert first.status_code == 200
+    assert first.headers["X-Cache"] == "MISS"
+    etag = first.headers["ETag"]
+
+    repeat = client.get(url)
+    assert repeat.headers["X-Cache"] == "HIT"
+    assert repeat.headers["ETag"] == etag
+    assert repeat.content == first.content
+
+    not_modified = client.get(url, headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.headers["ETag"] == etag
+    assert not_modified.content == b""
+
+
+def test_new_bar_changes_the_etag(api):
+    main, client, stock_ids = api
+    stock_id = stock_ids[-1]
+    url = f"/technical_analysis/{stock_id}"
+    before = client.get(url)
+
+    records = main.client["stock_data"]["stock_records"]
+    stock = asyncio.run(records.find_one({"_id": stock_id}))
+    bar = {**stock["data"][0], "date": "01.01.2025"}
+    asyncio.run(records.update_one({"_id": stock_id}, {"$set": {"data": [bar, *stock["data"]]}}))
+
+    after = client.get(url, headers={"If-None-Match": before.headers["ETag"]})
+    assert after.status_code == 200
+    assert after.headers["X-Cache"] == "MISS"
+    assert after.headers["ETag"] != before.headers["ETag"]
+
+
+def test_unknown_ticker_is_not_tagged(api):
+    main, client, stock_ids = api
+    response = client.get("/stocks/NOPE/chart")
+    assert response.status_code == 404
+    assert "ETag" not in response.headers
@@ -0,0 +1,123 @@
+import os
+import tempfile
+import docx
+import pytest
+from pymongo import UpdateOne
+from Fundamental import scraper
+from Fundamental.filings import text_hash
+
+FILING_ID = "123456"
+MSE_PAGE = f'<div id="seiNetIssuerLatestNews"><a href="https://seinet.com.mk/document/{FILING_ID}">Известување</a></div>'
+
+
+class FakeResponse:
+
+    def __init__(self, text="", data=None, chunks=(), status_code=200, headers=None):
+        self.text = text
+        self.data = data
+        self.chunks = chunks
+        self.status_code = status_code
+        self.headers = headers or dict()
+
+    def json(self):
+        return self.data
+
+    def iter_content(self, chunk_size):
+        yield from self.chunks
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeClient:
+    """Serves fixed responses by URL and records the requested URLs."""
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.urls = []
+
+    def get(self, url, stream=False):
+        self.urls.append(url)
+        return self.responses[url]
+
+
+def seller_client(seller, filing):
+    return FakeClient({
+        f"https://www.mse.mk/mk/symbol/{seller}": FakeResponse(MSE_PAGE),
+        f"https://api.seinet.com.mk/public/documents/single/{FILING_ID}": FakeResponse(data={"data": filing}),
+    })
+
+
+def test_rate_limiter_spaces_requests_per_host(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(scraper.time, "sleep", sleeps.append)
+    limiter = scraper.RateLimiter(per_second=10)
+    for url in ["https://www.mse.mk/a", "https://www.mse.mk/b", "https://api.seinet.com.mk/c", "https://www.mse.mk/d"]:
+        limiter.wait(url)
+    assert sleeps == pytest.approx([0, 0.1, 0, 0.2], abs=0.02)
+
+
+def test_unchanged_filings_are_skipped():
+    client = seller_client("ALK", {"content": "<p>Добивка</p>"})
+    assert scraper.scrape_seller(client, "ALK", FILING_ID) == (None, False)
+    assert client.urls == ["https://www.mse.mk/mk/symbol/ALK"]
+
+
+def test_changed_filings_are_saved():
+    client = seller_client("ALK", {"content": "<p>Добивка</p>", "attachments": []})
+    operation, has_text = scraper.scrape_seller(client, "ALK", "111111", analyze=lambda text: {"text": text})
+    assert has_text
+    assert operation == UpdateOne({"_id": "ALK"}, {"$set": {
+        "_id": "ALK", "document_id": FILING_ID, "file": "Добивка", "file_hash": text_hash("Добивка"),
+        "analysis": {"text": "Добивка"}}}, upsert=True)
+
+
+def test_filings_without_text_are_remembered():
+    operation, has_text = scraper.scrape_seller(seller_client("ALK", {"content": ""}), "ALK", None)
+    assert not has_text
+    assert operation == UpdateOne({"_id": "ALK"}, {"$set": {"document_id": FILING_ID}}, upsert=True)
+
+
+def test_sellers_without_filings():
+    client = FakeClient({"https://www.mse.mk/mk/symbol/ALK": FakeResponse("<div></div>")})
+    assert scraper.scrape_seller(client, "ALK", None) == (None, False)
+
+
+def test_download_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    client = FakeClient({"https://files/a": FakeResponse(chunks=[b"abc", b"def"])})
+    path = scraper.download_file("https://files/a", client, max_bytes=6)
+    with open(path, "rb") as f:
+        assert f.read() == b"abcdef"
+
+
+@pytest.mark.parametrize("response", [
+    FakeResponse(chunks=[b"abcd", b"efgh"]),
+    FakeResponse(chunks=[b"abcd"], headers={"Content-Length": "100"}),
+    FakeResponse(status_code=404),
+])
+def test_download_file_leaves_no_file_behind(tmp_path, monkeypatch, response):
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    with pytest.raises(Exception):
+        scraper.download_file("https://files/a", FakeClient({"https://files/a": response}), max_bytes=6)
+    assert os.listdir(tmp_path) == []
+
+
+def test_extraction_pool_restarts_after_a_timeout(tmp_path):
+    document = docx.Document()
+    document.add_paragraph("Годишен извештај")
+    path = str(tmp_path / "filing.docx")
+    document.save(path)
+
+    # no worker process starts this fast
+    pool = scraper.ExtractionPool(processes=1, timeout=0.001)
+    try:
+        with pytest.raises(Exception, match="longer than"):
+            pool.extract(path, "docx")
+        pool.timeout = 60
+        assert pool.extract(path, "docx") == "Годишен извештај\n"
+    finally:
+        pool.close()
@@ -0,0 +1,19 @@
+import pytest
+from Data.parser import parse_columns
+from Technical.screener import screener
+from Technical.tech_analysis import tech_results
+
+LENGTHS = [1, 2, 5, 7, 12, 29, 30, 31, 300]
+
+
+@pytest.mark.parametrize("window", [2, 7, 14, 30])
+def test_screener_matches_tech_results(window, history, assert_same_results):
+    histories = {f"T{i}": history(bars, seed=i) for i, bars in enumerate(LENGTHS)}
+    rows = {row["stock_id"]: row for row in screener(
+        [(stock_id, parse_columns(data)) for stock_id, data in histories.items()], window)}
+
+    # a single bar has no change to analyse
+    assert set(rows) == {stock_id for stock_id, data in histories.items() if len(data) > 1}
+    for stock_id, row in rows.items():
+        data = histories[stock_id][:window]
+        assert_same_results(tech_results(data, len(data)), row)
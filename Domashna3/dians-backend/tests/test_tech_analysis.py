@@ -0,0 +1,14 @@
+import pytest
+from Technical.tech_analysis import multi_window_results, tech_results
+
+WINDOWS = [2, 7, 30, 90, 250]
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("bars", [2, 5, 12, 45, 300])
+def test_multi_window_results_match_tech_results(seed, bars, history, assert_same_results):
+    data = history(bars, seed)
+    results = multi_window_results(data, WINDOWS)
+    for window in WINDOWS:
+        window_bars = min(window, bars)
+        assert_same_results(tech_results(data[:window_bars], window_bars), results[window])
@@ -0,0 +1,83 @@
+import asyncio
+import re
+from prometheus_client import REGISTRY
+from Monitoring.tracing import call_traced, server_timing, span, start_profile, stop_profile, traced
+
+SERVER_TIMING = re.compile(r"^[\w.]+;dur=\d+\.\d\d$")
+
+
+@traced("test.sync")
+def sync_stage():
+    with span("test.inner"):
+        return 1
+
+
+@traced("test.async")
+async def async_stage():
+    return 2
+
+
+def stage_count(stage):
+    return REGISTRY.get_sample_value("stage_duration_seconds_count", {"stage": stage}) or 0
+
+
+def cache_count(cache, result):
+    return REGISTRY.get_sample_value("cache_requests_total", {"cache": cache, "result": result}) or 0
+
+
+def test_spans_are_collected_while_profiling():
+    before = stage_count("test.sync")
+    sync_stage()
+    token = start_profile()
+    assert sync_stage() == 1
+    assert asyncio.run(async_stage()) == 2
+    stages = stop_profile(token)
+    assert [name for name, _ in stages] == ["test.inner", "test.sync", "test.async"]
+    assert all(seconds >= 0 for _, seconds in stages)
+    # every span is observed, profiled or not
+    assert stage_count("test.sync") == before + 2
+
+
+def test_call_traced_returns_the_spans():
+    result, stages = call_traced(sync_stage)
+    assert result == 1
+    assert [name for name, _ in stages] == ["test.inner", "test.sync"]
+
+
+def test_server_timing():
+    assert server_timing([("mongo.version", 0.0012345), ("total", 0.5)]) == "mongo.version;dur=1.23, total;dur=500.00"
+    assert server_timing([]) == ""
+
+
+def test_profiled_requests_get_a_server_timing_breakdown(api):
+    main, client, stock_ids = api
+    url = f"/technical_analysis/{stock_ids[0]}"
+    assert "Server-Timing" not in client.get(url).headers
+
+    main.response_cache.invalidate()
+    main.price_cache.invalidate()
+    response = client.get(url, headers={"X-Profile": "1"})
+    assert response.status_code == 200
+    stages = response.headers["Server-Timing"].split(", ")
+    assert all(SERVER_TIMING.match(stage) for stage in stages)
+    names = [stage.split(";")[0] for stage in stages]
+    assert {"mongo.version", "mongo.load_columns"} <= set(names)
+    assert names[-1] == "total"
+
+
+def test_metrics(api):
+    main, client, stock_ids = api
+    hits = cache_count("price", "hit")
+    client.get(f"/stocks/{stock_ids[0]}/chart")
+    # another response from the same columns
+    client.get(f"/stocks/{stock_ids[0]}/chart?max_points=50")
+    assert cache_count("price", "hit") == hits + 1
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["Content-Type"].startswith("text/plain")
+    body = response.text
+    # requests are labelled by their route, not by ticker
+    assert 'http_request_duration_seconds_count{method="GET",route="/stocks/{stock_id}/chart",status="200"}' in body
+    assert 'cache_requests_total{cache="price",result="hit"}' in body
+    assert 'stage_duration_seconds_bucket{le="0.0005",stage="mongo.version"}' in body
+    assert stock_ids[0] not in body
@@ -0,0 +1,80 @@
+import { LineChart } from "@mui/x-charts/LineChart";
+import { useEffect, useState } from "react";
+
+interface TechnicalChartProps {
+  selectedStock: string;
+  selectedPeriod: string;
+}
+
+const periodWindows: Record<string, number> = {
+  day: 2,
+  week: 7,
+  month: 30,
+};
+
+const MAX_POINTS = 100;
+
+const TechnicalChart: React.FC<TechnicalChartProps> = ({
+  selectedStock,
+  selectedPeriod,
+}) => {
+  const [dates, setDates] = useState<string[]>([]);
+  const [prices, setPrices] = useState<(number | null)[]>([]);
+  const [sma, setSma] = useState<(number | null)[]>([]);
+  const [ema, setEma] = useState<(number | null)[]>([]);
+  const [vwma, setVwma] = useState<(number | null)[]>([]);
+  const [loading, setLoading] = useState(true);
+
+  useEffect(() => {
+    if (!selectedStock || !selectedPeriod) return;
+
+    const fetchSeries = async () => {
+      try {
+        setLoading(true);
+        const window = periodWindows[selectedPeriod.toLowerCase()] ?? 30;
+        const response = await fetch(
+          `http://localhost:8000/technical_analysis/${selectedStock}/series?window=${window}&limit=${MAX_POINTS}`
+        );
+        const data = await response.json();
+
+        setDates(data["dates"]);
+        setPrices(data["prices"]);
+        setSma(data["sma"]);
+        setEma(data["ema"]);
+        setVwma(data["volume_weighted_average_price"]);
+      } catch (error) {
+        console.error("Error fetching technical series:", error);
+      } finally {
+        setLoading(false);
+      }
+    };
+
+    fetchSeries();
+  }, [selectedStock, selectedPeriod]);
+
+  return loading ? (
+    <p>Loading...</p>
+  ) : (
+    <LineChart
+      series={[
+        { data: prices, label: "price", showMark: false },
+        { data: sma, label: "SMA", showMark: false },
+        { data: ema, label: "EMA", showMark: false },
+        { data: vwma, label: "VWMA", showMark: false },
+      ]}
+      xAxis={[{ scaleType: "point", data: dates }]}
+      width={1000}
+      height={400}
+      sx={{
+        "& .MuiChartsAxis-line ": {
+          stroke: "white",
+        },
+        "&  .MuiChartsAxis-tickLabel": {
+          fill: "white",
+        },
+      }}
+    />
+  );
+};
+
+export default TechnicalChart;
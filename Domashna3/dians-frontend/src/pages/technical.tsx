@@ -4,6 +4,7 @@ import Item from "../components/item";
 import Column from "../components/column";
 import CircularProgress from "@mui/material/CircularProgress";
 import TechnicalParameters from "../content/technical";
+import TechnicalChart from "../content/technical_chart";
 import Row from "../components/row";
 
 const LazyColumnContainer = lazy(
@@ -69,6 +70,11 @@ const TechnicalAnalysis = () => {
             <TechnicalParameters selectedStock={selectedStock} selectedPeriod={selectedPeriod} />
           </Item>
         </Column>
+        <Column>
+          <Item>
+            <TechnicalChart selectedStock={selectedStock} selectedPeriod={selectedPeriod} />
+          </Item>
+        </Column>
       </LazyColumnContainer>
     </Suspense>
   );